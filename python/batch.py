@@ -2,18 +2,21 @@
 
 import sys
 import os
+import time
 import getpass
 from os.path import isfile, join, dirname
 from PyQt4 import QtGui, QtCore
 
 import queuetable
-import jobview
 import jobedit
-import queues as qeditor
-from batchd.client import Client, InsufficientRightsException
+import refresh
+from batchd.client import Client, InsufficientRightsException, DEFAULT_PAGE_SIZE
+from batchd.search import job_matches
 
 APPDIR = dirname(sys.argv[0])
 
+JOB_STATUSES = ["all", "new", "waiting", "processing", "done", "failed", "postponed"]
+
 def labelled(label, constructor, parent=None):
     result = QtGui.QWidget(parent)
     layout = QtGui.QHBoxLayout()
@@ -79,7 +82,7 @@ class LoginBox(QtGui.QDialog):
         self.reject()
 
 class GUI(QtGui.QMainWindow):
-    def __init__(self, client):
+    def __init__(self, client, profiler=None):
         QtGui.QMainWindow.__init__(self)
 
         self.url = client.manager_url
@@ -99,13 +102,23 @@ class GUI(QtGui.QMainWindow):
         hbox.addWidget(lbl)
         self.queue_popup = QtGui.QComboBox(wrapper)
         hbox.addWidget(self.queue_popup, stretch=1)
+        lbl = QtGui.QLabel("Status:", wrapper)
+        hbox.addWidget(lbl)
+        self.status_popup = QtGui.QComboBox(wrapper)
+        for status in JOB_STATUSES:
+            self.status_popup.addItem(status.capitalize(), status)
+        hbox.addWidget(self.status_popup)
 
         self._fill_queues()
         self.queue_popup.currentIndexChanged.connect(self._on_select_queue)
+        self.status_popup.currentIndexChanged.connect(self._on_select_status)
         self.layout.addWidget(wrapper)
 
         queue_buttons = QtGui.QToolBar(self)
         queue_buttons.addAction(get_icon("list-add.svg"), "New queue", self._on_add_queue)
+        queue_buttons.addAction(get_icon("quickview.svg"), "Overview", self._on_overview)
+        if profiler is not None:
+            queue_buttons.addAction(get_icon("quickview.svg"), "Profiling", self._on_profiling)
         self.enable_queue = QtGui.QAction(get_icon("checkbox.svg"), "Enable", self)
         self.enable_queue.setCheckable(True)
         self.enable_queue.toggled.connect(self._on_queue_toggle)
@@ -117,24 +130,19 @@ class GUI(QtGui.QMainWindow):
 
         buttons = QtGui.QToolBar(self)
         buttons.addAction(get_icon("quickview.svg"), "View", self._on_view)
-        buttons.addAction(get_icon("edit-delete.svg"), "Delete", self._on_delete)
+        self.delete_action = buttons.addAction(get_icon("edit-delete.svg"), "Delete", self._on_delete)
+        self.delete_matching_action = buttons.addAction(get_icon("edit-delete.svg"), "Delete matching",
+                                                        self._on_delete_matching)
         self.layout.addWidget(buttons)
 
         self.qtable = queuetable.Table(parent=self)
+        self.filter_bar = queuetable.FilterBar(self.qtable.proxy, self)
+        self.filter_bar.setChoicesLoader('host_name', lambda: [(h, h) for h in self.client.get_hosts()])
+        self.layout.addWidget(self.filter_bar)
         self.layout.addWidget(self.qtable)
 
         wrapper, self.type_popup = labelled("Job type:", QtGui.QComboBox, self)
-        self.types = types = self.client.get_job_types()
-        self.type_by_name = {}
-        for t in types:
-            name = t['name']
-            title = t.get('title', name)
-            if not title:
-                title = name
-            item = QtGui.QStandardItem(name)
-            item.setData(title, QtCore.Qt.DisplayRole)
-            self.type_popup.model().appendRow(item)
-            self.type_by_name[name] = t
+        self._fill_types(self.client.get_job_types())
         self.type_popup.currentIndexChanged.connect(self._on_select_type)
         self.layout.addWidget(wrapper)
 
@@ -144,13 +152,52 @@ class GUI(QtGui.QMainWindow):
 
         self.param_widgets = {}
         self.form = None
+        self.forms = jobedit.FormCache()
+        self.overview = None
+        self.profiler = profiler
+        self.profile_panel = None
+        self.bulk_thread = None
+
+        self.poller = refresh.Poller(self.client, self, self._jobs_limit, self.types)
+        self.poller.refreshed.connect(self._on_refreshed)
+        self.poller.failed.connect(self._on_refresh_failed)
+        self.poller.typesChanged.connect(self._on_types_changed)
+
+        self.page_loader = refresh.PageLoader(self.client, DEFAULT_PAGE_SIZE, self)
+        self.qtable.model.moreRequested.connect(self.page_loader.load)
+        self.page_loader.loaded.connect(self.qtable.model.appendPage)
+        self.page_loader.failed.connect(self._on_page_failed)
 
         self._on_select_type(0)
         self._on_select_queue(0)
 
-        timer = QtCore.QTimer(self)
-        timer.timeout.connect(self._on_timer)
-        timer.start(5*1000)
+    def _fill_types(self, types):
+        self.types = types
+        self.type_by_name = {}
+        self.type_popup.model().clear()
+        for t in types:
+            name = t['name']
+            title = t.get('title', name)
+            if not title:
+                title = name
+            item = QtGui.QStandardItem(name)
+            item.setData(title, QtCore.Qt.DisplayRole)
+            self.type_popup.model().appendRow(item)
+            self.type_by_name[name] = t
+        self.filter_bar.setChoices('type', [(t['name'], t.get('title') or t['name']) for t in types])
+
+    def _on_types_changed(self, types):
+        current = self.types[self.type_popup.currentIndex()] if self.types else None
+        self.type_popup.blockSignals(True)
+        self._fill_types(types)
+        names = [t['name'] for t in types]
+        idx = names.index(current['name']) if current and current['name'] in names else 0
+        self.type_popup.setCurrentIndex(idx)
+        self.type_popup.blockSignals(False)
+        self.forms.retain(types)
+        # keep entered values unless the form of current type was dropped
+        if types and (current is None or jobedit.schema_hash(types[idx]) != jobedit.schema_hash(current)):
+            self._on_select_type(idx)
 
     def _fill_queues(self):
         self.queue_popup.clear()
@@ -163,7 +210,9 @@ class GUI(QtGui.QMainWindow):
     def _on_view(self):
         job = self.qtable.currentJob()
         jobtype = self.type_by_name[job['type']]
-        dlg = jobview.JobView(job, jobtype, parent=self)
+        # dialog modules are imported on first use to keep startup fast
+        import jobview
+        dlg = jobview.JobView(job, jobtype, self.client, parent=self, forms=self.forms)
         dlg.exec_()
 
     def _on_queue_toggle(self):
@@ -172,56 +221,145 @@ class GUI(QtGui.QMainWindow):
 
     def _on_delete(self):
         buttons = QtGui.QMessageBox.Yes | QtGui.QMessageBox.No
-        job = self.qtable.currentJob()
-        job_id = job['id']
-        ok = QtGui.QMessageBox.question(self, "Delete?",
-                                        "Are you really sure you want to delete job #{}?".format(job_id),
-                                        buttons)
-        if ok == QtGui.QMessageBox.Yes:
-            print "Deleting!"
-            self.client.delete_job(job_id)
-            self._refresh_queue()
+        jobs = self.qtable.selectedJobs()
+        if not jobs:
+            return
+        if len(jobs) == 1:
+            question = "Are you really sure you want to delete job #{}?".format(jobs[0]['id'])
         else:
-            print "do not delete"
+            question = "Are you really sure you want to delete {} selected jobs?".format(len(jobs))
+        ok = QtGui.QMessageBox.question(self, "Delete?", question, buttons)
+        if ok == QtGui.QMessageBox.Yes:
+            job_ids = [job['id'] for job in jobs]
+            self._run_bulk_delete(lambda: job_ids)
+
+    def _on_delete_matching(self):
+        queue_name = self.queues[self.queue_popup.currentIndex()]['name']
+        status = JOB_STATUSES[self.status_popup.currentIndex()]
+        proxy = self.qtable.proxy
+        filters = dict(proxy.filters)
+        query = proxy.query
+        conditions = [u"{} = {}".format(name, value) for name, value in sorted(filters.items())]
+        if query:
+            conditions.append(u"parameters match \"{}\"".format(query))
+        question = u"Are you really sure you want to delete all {} jobs in queue {}".format(status, queue_name)
+        if conditions:
+            question += u" with " + u", ".join(conditions)
+        question += u"?"
+        buttons = QtGui.QMessageBox.Yes | QtGui.QMessageBox.No
+        ok = QtGui.QMessageBox.question(self, "Delete?", question, buttons)
+        if ok != QtGui.QMessageBox.Yes:
+            return
+        predicate = None
+        if query:
+            predicate = lambda job: job_matches(job, query)
+        self._run_bulk_delete(lambda: self.client.select_jobs(queue_name, status, filters, predicate))
+
+    def _run_bulk_delete(self, select):
+        import bulk
+        thread = bulk.BulkThread(self.client, self.client.delete_job, select, self)
+        thread.done.connect(self._on_bulk_done)
+        thread.error.connect(self._on_bulk_error)
+        bulk.BulkProgress(thread, "Deleting jobs...", self)
+        self.bulk_thread = thread
+        self.delete_action.setEnabled(False)
+        self.delete_matching_action.setEnabled(False)
+        thread.start()
+
+    def _on_bulk_done(self, result):
+        import bulk
+        self._bulk_finished()
+        if not result.ok or result.missing:
+            QtGui.QMessageBox.warning(self, "Delete", bulk.summary(result))
+
+    def _on_bulk_error(self, error):
+        self._bulk_finished()
+        QtGui.QMessageBox.warning(self, "Delete", "Can't select jobs: {}".format(error))
+
+    def _bulk_finished(self):
+        self.bulk_thread = None
+        self.delete_action.setEnabled(True)
+        self.delete_matching_action.setEnabled(True)
+        self._refresh_queue()
 
     def _on_select_type(self, idx):
         jobtype = self.types[idx]
-        self.param_widgets = {}
-        form = jobedit.create_form(jobtype['params'], self.param_widgets, self)
+        form, self.param_widgets = self.forms.form(jobtype, self)
 
         if self.form:
             self.form.hide()
             self.layout.removeWidget(self.form)
-            del self.form
         self.form = form
         self.layout.insertWidget(5, form)
         self.form.show()
 
     def _on_add_queue(self):
+        import queues as qeditor
         dlg = qeditor.QueueEditor(self)
         dlg.exec_()
         self._fill_queues()
 
-    def _on_select_queue(self, idx):
-        self._refresh_queue(idx)
-
-    def _on_timer(self):
-        self._refresh_queue()
+    def _on_profiling(self):
+        if self.profile_panel is None:
+            import profiling
+            self.profile_panel = profiling.ProfilePanel(self.profiler, self)
+        self.profile_panel.show()
+        self.profile_panel.raise_()
 
-    def _refresh_queue(self, idx=None):
-        if idx is None:
-            idx = self.queue_popup.currentIndex()
+    def _on_overview(self):
+        if self.overview is None:
+            import overview
+            self.overview = overview.OverviewWindow(self.client, self)
+        self.overview.show()
+        self.overview.raise_()
 
+    def _on_select_queue(self, idx):
+        if idx < 0 or len(self.queues) == 0:
+            return
+        queue_name = self.queues[idx]['name']
+        status = JOB_STATUSES[self.status_popup.currentIndex()]
+        # the first page comes with the poller's refresh
+        self.qtable.clear()
+        self.page_loader.setQueue(queue_name, status)
+        self.poller.setQueue(queue_name, status)
+
+    def _on_select_status(self, idx):
+        self._on_select_queue(self.queue_popup.currentIndex())
+
+    def showEvent(self, event):
+        QtGui.QMainWindow.showEvent(self, event)
+        self.poller.refresh()
+
+    def changeEvent(self, event):
+        QtGui.QMainWindow.changeEvent(self, event)
+        if event.type() == QtCore.QEvent.WindowStateChange and not self.isMinimized():
+            self.poller.refresh()
+
+    def _refresh_queue(self):
         if len(self.queues) == 0:
             print("No queues.")
             return
 
+        self.poller.refresh()
+
+    def _jobs_limit(self):
+        # refresh all jobs that are loaded into the table already
+        return max(len(self.qtable.model.jobs), DEFAULT_PAGE_SIZE)
+
+    def _on_refresh_failed(self, queue_name, error):
+        print("Can't refresh queue {}: {}".format(queue_name, error))
+
+    def _on_page_failed(self, queue_name, error):
+        print("Can't load jobs of queue {}: {}".format(queue_name, error))
+        self.qtable.model.loadFailed()
+
+    def _on_refreshed(self, queue_name, stats, jobs, complete):
+        idx = self.queue_popup.currentIndex()
         queue = self.queues[idx]
         schedule = queue['schedule_name']
         host = queue['host_name']
         if not host:
             host = "*"
-        stats = self.client.get_queue_stats(queue['name'])
         new = stats.get('new', 0)
         processing = stats.get('processing', 0)
         done = stats.get('done', 0)
@@ -230,8 +368,16 @@ class GUI(QtGui.QMainWindow):
         self.queue_info.setText(info)
         self.enable_queue.setChecked(queue['enabled'])
 
-        jobs = self.client.get_jobs(queue['name'])
+        model = self.qtable.model
+        if not complete:
+            # keep jobs which were loaded while refresh was in progress
+            last_id = jobs[-1]['id']
+            jobs = jobs + [job for job in model.jobs if job['id'] > last_id]
+        model.more = not complete
+        start = time.time()
         self.qtable.setJobs(jobs)
+        if self.profiler is not None:
+            self.profiler.refreshed(queue_name, jobs, time.time() - start)
 
     def _on_ok(self):
         queue_idx = self.queue_popup.currentIndex()
@@ -260,7 +406,12 @@ if __name__ == "__main__":
         auth_ok = True
 
     if auth_ok:
-        gui = GUI(client)
+        profiler = None
+        if "--profile" in sys.argv:
+            import profiling
+            profiler = profiling.Profiler()
+            profiler.install(client, GUI)
+        gui = GUI(client, profiler)
         gui.show()
         sys.exit(app.exec_())
 
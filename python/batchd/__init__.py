@@ -11,10 +11,14 @@ bl_info = {
         "category": "Object"
         }
 
-import bpy
 import importlib
 
-from . import blenderclient
+# batchd.client is also used by the Qt client and scripts outside of Blender
+try:
+    import bpy
+    from . import blenderclient
+except ImportError:
+    bpy = None
 
 def register():
     blenderclient.register()
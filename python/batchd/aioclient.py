@@ -0,0 +1,214 @@
+
+import ssl
+import json
+import time
+import random
+import asyncio
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE=True
+except ImportError:
+    AIOHTTP_AVAILABLE=False
+
+from batchd.client import (ClientBase, DEFAULT_POOL_SIZE, CircuitOpenException,
+        DeadlineExceededException, ManagerUnavailableException, is_retryable)
+from batchd.job import Job
+
+DEFAULT_CONCURRENCY = 100
+DEFAULT_TIMEOUT = 30
+
+async def _retry(policy, func, retryable, deadline=None):
+    """
+    Asynchronous counterpart of RetryPolicy.run: await func(attempt, timeout)
+    with the same backoff and deadline handling, without blocking the loop.
+    """
+    start = time.time()
+    attempt = 0
+    while True:
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - (time.time() - start)
+        try:
+            return await func(attempt, timeout)
+        except Exception as e:
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, policy.base_delay)
+            else:
+                attempt += 1
+                if attempt >= policy.attempts or not retryable(e):
+                    raise
+                delay = policy.backoff(attempt)
+            if deadline is not None and time.time() - start + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+
+class AsyncClient(ClientBase):
+    """
+    Non-blocking asyncio counterpart of batchd.client.Client.
+
+    At most `concurrency` requests are in flight at once; further calls wait
+    for a free slot. Each request is limited by `timeout` seconds. Failures
+    are retried, counted by the circuit breaker and limited by the deadline
+    as in Client (see retry_policy, circuit_breaker and deadline), except
+    that POST requests are not retried, as the manager could have acted on
+    a request whose response was lost.
+    Usage:
+
+        async with AsyncClient.from_config() as client:
+            queues = await client.get_queues()
+    """
+    def __init__(self, manager_url = None, username=None, password=None, pool_size=DEFAULT_POOL_SIZE,
+                 concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp python module is not available, can't use AsyncClient")
+        ClientBase.__init__(self, manager_url, username, password, pool_size)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._semaphore = None
+        self._session = None
+
+    @classmethod
+    def from_config(cls, config=None):
+        settings = super(AsyncClient, cls).from_config(config)
+        settings.concurrency = settings.config.get('concurrency', DEFAULT_CONCURRENCY)
+        settings.timeout = settings.config.get('timeout', DEFAULT_TIMEOUT)
+        return settings
+
+    def _ssl_context(self):
+        if self.ca_certificate:
+            context = ssl.create_default_context(cafile=self.ca_certificate)
+        elif self.client_certificate:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        else:
+            return False
+        if self.client_certificate:
+            context.load_cert_chain(*self.client_certificate)
+        return context
+
+    @property
+    def session(self):
+        if self._session is None:
+            auth = None
+            if self.username is not None:
+                auth = aiohttp.BasicAuth(self.username, self.password or "")
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=self._ssl_context())
+            self._session = aiohttp.ClientSession(connector=connector, auth=auth)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _send(self, method, path, attempt, timeout, data=None):
+        """
+        Make one attempt of a request, like Client._send; returns status
+        code and body text.
+        """
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceededException("Deadline of request to {} exceeded".format(self.manager_url))
+        breaker = self.circuit_breaker
+        if not breaker.allow():
+            retry_in = breaker.retry_in
+            raise CircuitOpenException("Manager {} is unavailable, next try in {:.0f}s".format(
+                    self.manager_url, retry_in), retry_in)
+        # the call allowed by the breaker must be reported to it in any case
+        resolved = False
+        try:
+            if timeout is None or timeout > self.timeout:
+                timeout = self.timeout
+            session = self.session
+            headers = {}
+            trace_id = self._trace(headers)
+            request_bytes = len(data) if data else 0
+            async with self._semaphore:
+                start = time.time()
+                try:
+                    async with session.request(method, self.manager_url + path, data=data, headers=headers,
+                                               timeout=aiohttp.ClientTimeout(total=timeout)) as rs:
+                        body = await rs.read()
+                except Exception as e:
+                    self._emit(method, path, latency=time.time() - start, request_bytes=request_bytes,
+                               retries=attempt, trace_id=trace_id, error=e)
+                    if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                        raise ManagerUnavailableException("Can't reach manager {}: {}".format(self.manager_url, e))
+                    raise
+                self._emit(method, path, status=rs.status, latency=time.time() - start, request_bytes=request_bytes,
+                           response_bytes=len(body), retries=attempt, trace_id=trace_id)
+            text = body.decode(rs.get_encoding())
+            if rs.status >= 500:
+                self._check_status(rs.status, text)
+            resolved = True
+            breaker.success()
+            return rs.status, text
+        finally:
+            if not resolved:
+                breaker.failure()
+
+    async def _request(self, method, path, data=None, retry=True, deadline=None):
+        """
+        Send request to the manager and return the body text. With
+        retry=True, retryable failures (see is_retryable) are retried
+        according to retry_policy, within `deadline` seconds (self.deadline
+        by default).
+        """
+        if deadline is None:
+            deadline = self.deadline
+        if retry:
+            status, text = await _retry(self.retry_policy,
+                                        lambda attempt, timeout: self._send(method, path, attempt, timeout, data),
+                                        is_retryable, deadline)
+        else:
+            status, text = await self._send(method, path, 0, deadline, data)
+        self._check_status(status, text)
+        return text
+
+    async def _get_json(self, path):
+        text = await self._request("GET", path)
+        return json.loads(text)
+
+    async def get_job_types(self):
+        return await self._get_json("/type")
+
+    async def get_queues(self):
+        return await self._get_json("/queue")
+
+    async def do_enqueue(self, qname, typename, params):
+        rq = dict(queue = qname, type=typename, params=params)
+        text = await self._request("POST", "/queue/" + qname, data=json.dumps(rq), retry=False)
+        return json.loads(text)
+
+    async def get_queue_stats(self, qname):
+        return await self._get_json("/stats/" + qname)
+
+    async def get_all_stats(self):
+        return await self._get_json("/stats")
+
+    async def query_metrics(self, prefix, last=None, since=None):
+        query = "&".join("{}={}".format(k, v) for k, v in self._metrics_params(last, since).items())
+        return await self._get_json("/monitor/" + prefix + "/query?" + query)
+
+    async def get_jobs(self, qname, status="all"):
+        jobs = await self._get_json("/queue/" + qname + "/jobs?status=" + status)
+        return [Job.from_dict(job) for job in jobs]
+
+    async def delete_job(self, jobid):
+        await self._request("DELETE", "/job/" + str(jobid))
+
+    async def get_schedules(self):
+        return await self._get_json("/schedule")
+
+    async def new_queue(self, queue):
+        await self._request("POST", "/queue", data=json.dumps(queue), retry=False)
+
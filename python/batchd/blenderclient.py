@@ -1,8 +1,24 @@
+import math
+
 import bpy
 from bpy.types import WindowManager, AddonPreferences
-from bpy.props import StringProperty, EnumProperty
+from bpy.props import StringProperty, EnumProperty, IntProperty
 
 from batchd import client
+from batchd.times import parse_time
+
+# Number of jobs per render host to aim at, so that faster hosts can take more
+CHUNKS_PER_HOST = 4
+# Minimal estimated render time of one job, in seconds; blender startup and
+# scene loading overhead is not worth it for shorter jobs
+MIN_CHUNK_SECONDS = 60
+# Number of done jobs to estimate per-frame render time from
+HISTORY_SIZE = 20
+# Maximal number of done jobs looked through for the estimate; it is made
+# in Blender's UI thread, so it must not download the whole queue history
+SCAN_LIMIT = 1000
+# Parameters a job type must have to render a part of the frame range
+FRAME_PARAMS = ('frame', 'frame_end', 'frame_step')
 
 batchd_client = None
 batchd_queues = []
@@ -22,37 +38,115 @@ def get_batchd_client(context):
     return batchd_client
 
 def queues_from_batchd(self, context):
+    # Blender requires the returned list to stay referenced,
+    # so it is kept in module global; actual caching is done by client.
     global batchd_queues
 
-    if len(batchd_queues) > 0 or context is None:
+    if context is None:
         return batchd_queues
 
     c = get_batchd_client(context)
+    queues = []
     for queue in c.get_queues():
         name = queue.get('name', None)
         title = queue.get('title', name)
-        batchd_queues.append((name, title, title))
+        queues.append((name, title, title))
 
+    if queues != batchd_queues:
+        batchd_queues = queues
     return batchd_queues
 
 def types_from_batchd(self, context):
     global batchd_types
 
-    if len(batchd_types) > 0 or context is None:
-        print("types: {}, context: {}".format(batchd_types, context))
+    if context is None:
         return batchd_types
 
     c = get_batchd_client(context)
+    types = []
     for type in c.get_job_types():
         name = type.get('name')
         title = type.get('title', name)
         if not title:
             title = name
-        batchd_types.append((name, title, title))
+        types.append((name, title, title))
 
-    print(batchd_types)
+    if types != batchd_types:
+        batchd_types = types
     return batchd_types
 
+def split_frames(start, end, step, chunk_size):
+    """
+    Split frame range into list of (first, last) frame pairs,
+    each containing up to chunk_size frames.
+    """
+    frames = list(range(start, end+1, step))
+    return [(frames[i], frames[min(i+chunk_size, len(frames))-1]) for i in range(0, len(frames), chunk_size)]
+
+def supports_frame_range(jobtype):
+    """
+    Whether jobs of the type render only frames from `frame` to `frame_end`
+    with `frame_step` (see sample-configs/jobtypes/blender.yaml).
+    """
+    names = set(param['name'] for param in jobtype.get('params') or [])
+    return all(name in names for name in FRAME_PARAMS)
+
+def _frame_time(job, job_type_name):
+    params = job.get('params') or {}
+    if job.get('type') != job_type_name or not job.get('result_time') or 'frame_end' not in params:
+        return None
+    step = int(params.get('frame_step') or 1)
+    if step <= 0:
+        return None
+    frames = (int(params['frame_end']) - int(params['frame'])) // step + 1
+    if frames <= 0:
+        return None
+    seconds = (parse_time(job['result_time']) - parse_time(job['create_time'])).total_seconds()
+    return seconds / frames
+
+def estimate_frame_time(c, queue_name, job_type_name):
+    """
+    Estimate render time of one frame, in seconds, from up to HISTORY_SIZE
+    done jobs of this type among the first SCAN_LIMIT done jobs of the
+    queue. The time between job creation and result includes waiting in
+    the queue, so the minimum is taken.
+    Returns None if there is no history or it can not be obtained.
+    """
+    times = []
+    try:
+        jobs = c.iter_jobs(queue_name, status="done")
+        try:
+            for n, job in enumerate(jobs):
+                if n >= SCAN_LIMIT or len(times) >= HISTORY_SIZE:
+                    break
+                try:
+                    frame_time = _frame_time(job, job_type_name)
+                except (ValueError, TypeError):
+                    continue
+                if frame_time is not None:
+                    times.append(frame_time)
+        finally:
+            jobs.close()
+    except Exception as e:
+        print("Can't estimate frame render time: {}".format(e))
+        return None
+    if not times:
+        return None
+    return min(times)
+
+def auto_chunk_size(n_frames, n_hosts, frame_time=None):
+    """
+    Choose number of frames per job, so that each host gets several jobs,
+    but (if per-frame render time is known) each job is not too short.
+    """
+    n_hosts = max(n_hosts, 1)
+    chunk_size = int(math.ceil(n_frames / float(n_hosts * CHUNKS_PER_HOST)))
+    if frame_time:
+        chunk_size = max(chunk_size, int(math.ceil(MIN_CHUNK_SECONDS / frame_time)))
+    # but all hosts should be busy anyway
+    chunk_size = min(chunk_size, int(math.ceil(n_frames / float(n_hosts))))
+    return max(chunk_size, 1)
+
 class SettingsPanel(bpy.types.AddonPreferences):
     bl_label = "Batchd settings"
     bl_idname = __package__
@@ -65,6 +159,8 @@ class SettingsPanel(bpy.types.AddonPreferences):
     job_type_name = EnumProperty(name="batchd job type", items = types_from_batchd)
     username = StringProperty(name="batchd user name")
     password = StringProperty(name="batchd password", subtype="PASSWORD")
+    chunk_size = IntProperty(name="Frames per job", default=0, min=0,
+            description="Number of frames rendered by one job; 0 means choose automatically")
 
     def draw(self, context):
         layout = self.layout
@@ -74,6 +170,7 @@ class SettingsPanel(bpy.types.AddonPreferences):
         layout.prop(self, "password")
         layout.prop(self, "batchd_queue")
         layout.prop(self, "job_type_name")
+        layout.prop(self, "chunk_size")
 
 class EnqueuePanel(bpy.types.Panel):
     bl_label = "Submit to batchd"
@@ -99,12 +196,37 @@ class EnqueueOperator(bpy.types.Operator):
         current_file = bpy.data.filepath
         target_file = bpy.path.abspath(bpy.context.scene.render.filepath)
 
-        job_type_name = get_preferences().job_type_name
-        queue_name = get_preferences().batchd_queue
+        prefs = get_preferences()
+        job_type_name = prefs.job_type_name
+        queue_name = prefs.batchd_queue
+        scene = bpy.context.scene
+        start, end, step = scene.frame_start, scene.frame_end, scene.frame_step
 
         c = get_batchd_client(context)
-        params = dict(input=current_file, output=target_file, frame="1")
-        c.do_enqueue(queue_name, job_type_name, params)
+        jobtype = dict((t['name'], t) for t in c.get_job_types()).get(job_type_name, {})
+        if not supports_frame_range(jobtype):
+            # each job of such type renders the whole scene
+            c.do_enqueue(queue_name, job_type_name, dict(input=current_file, output=target_file))
+            self.report({'INFO'}, "Submitted 1 job; job type {} has no frame range parameters".format(job_type_name))
+            return {'FINISHED'}
+
+        chunk_size = prefs.chunk_size
+        if not chunk_size:
+            n_frames = len(range(start, end+1, step))
+            chunk_size = auto_chunk_size(n_frames, len(c.get_hosts()),
+                            estimate_frame_time(c, queue_name, job_type_name))
+
+        def chunk_params():
+            for first, last in split_frames(start, end, step, chunk_size):
+                yield dict(input=current_file, output=target_file,
+                           frame=str(first), frame_end=str(last), frame_step=str(step))
+
+        results = c.enqueue_many(queue_name, job_type_name, chunk_params())
+        failed = [r for r in results if not r.ok]
+        if failed:
+            self.report({'ERROR'}, "Failed to submit {} of {} jobs: {}".format(len(failed), len(results), failed[0].error))
+            return {'CANCELLED'}
+        self.report({'INFO'}, "Submitted {} jobs of {} frames each".format(len(results), chunk_size))
 
         return {'FINISHED'}
 
@@ -0,0 +1,114 @@
+
+import time
+import json
+import hashlib
+import threading
+
+class _Entry(object):
+    def __init__(self, value, digest, etag, last_modified, expires):
+        self.value = value
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class MetadataCache(object):
+    """
+    Cache of rarely changing GET responses (job types, queues, schedules).
+
+    Each key (request path) has its own TTL in `ttls`; keys not listed there
+    use `default_ttl`. When an entry expires, it is revalidated with
+    If-None-Match / If-Modified-Since if the manager provided ETag or
+    Last-Modified; otherwise a hash of the body is compared, so that an
+    unchanged response is not decoded again. Concurrent requests for the
+    same key share one in-flight fetch.
+
+    Cached values are shared between callers and must not be modified.
+    """
+    def __init__(self, ttls=None, default_ttl=0):
+        self.ttls = dict(ttls) if ttls else {}
+        self.default_ttl = default_ttl
+        self._entries = {}
+        self._in_flight = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def ttl(self, key):
+        return self.ttls.get(key, self.default_ttl)
+
+    def get(self, key, fetch):
+        """
+        Return cached value for key, calling fetch(headers) if it is missing
+        or expired. fetch must return a (status_code, headers, text) tuple;
+        status code 304 means that the cached value is still valid.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.time():
+                return entry.value
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+            generation = self._generation
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._fetch(key, entry, fetch, generation)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
+
+    def _fetch(self, key, entry, fetch, generation):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        status_code, rs_headers, text = fetch(headers)
+        expires = time.time() + self.ttl(key)
+        if status_code == 304 and entry is not None:
+            entry.expires = expires
+            return entry.value
+
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        if entry is not None and entry.digest == digest:
+            value = entry.value
+        else:
+            value = json.loads(text)
+        new_entry = _Entry(value, digest, rs_headers.get('ETag'), rs_headers.get('Last-Modified'), expires)
+        with self._lock:
+            # do not store a response which may predate invalidate()
+            if generation == self._generation:
+                self._entries[key] = new_entry
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Drop cached value for key, or all cached values if key is None.
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
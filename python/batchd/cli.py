@@ -0,0 +1,34 @@
+
+"""
+Helpers shared by command-line tools (enqueue.py, batchd.top).
+"""
+
+import getpass
+
+from batchd.client import Client, YAML_AVAILABLE
+
+def add_client_arguments(parser):
+    """
+    Add options for connecting to the manager, used by make_client().
+    """
+    parser.add_argument('-m', '--manager-url', help="batchd manager URL")
+    parser.add_argument('-u', '--user', help="batchd user name")
+    parser.add_argument('-p', '--password', help="batchd password")
+
+def make_client(args):
+    """
+    Create Client from client config, if any, and command-line options.
+    """
+    cfg = None
+    if YAML_AVAILABLE:
+        cfg = Client.load_config()
+    if cfg:
+        client = Client.from_config(cfg)
+    else:
+        cfg = {}
+        client = Client()
+    if args.manager_url:
+        client.manager_url = args.manager_url
+    client.username = args.user or cfg.get('username', None) or getpass.getuser()
+    client.password = args.password or cfg.get('password', None)
+    return client
@@ -1,64 +1,334 @@
 
 import os
 from os.path import isfile, join, dirname
-import requests
+import time
+import calendar
+import threading
+import weakref
 import json
 
-try:
+from batchd.parallel import imap_unordered
+from batchd.jsonstream import iter_response_array, spool_object, DEFAULT_CHUNK_SIZE
+from batchd.cache import MetadataCache
+from batchd.instrument import Instrumentation, RequestEvent
+from batchd.resilience import RetryPolicy, CircuitBreaker
+from batchd.job import Job, IDEMPOTENCY_MARKER, split_idempotency_key
+
+# requests and yaml take most of the import time of this module, so they are
+# imported only when first needed; short-lived scripts which fail early or
+# only print --help never pay for them.
+
+def _module_available(name):
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        import imp
+        try:
+            imp.find_module(name)
+            return True
+        except ImportError:
+            return False
+    return find_spec(name) is not None
+
+YAML_AVAILABLE = _module_available("yaml")
+
+CONFIG_PATHS = [join("~", ".config", "batchd", "client.yaml"), join("/etc", "batchd", "client.yaml")]
+
+# Parsed client config, per process: path -> dict
+_config_cache = {}
+_config_lock = threading.Lock()
+
+def _parse_config(path):
     import yaml
-    YAML_AVAILABLE=True
-except ImportError:
-    YAML_AVAILABLE=False
+    # C implementation of the loader is much faster, but is not always compiled in
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=loader) or {}
+
+class ManagerException(Exception):
+    """
+    Error reported by the manager, or failure to reach it.
+    status_code is the HTTP status, or None if there was no response.
+    """
+    def __init__(self, message, status_code=None):
+        Exception.__init__(self, message)
+        self.status_code = status_code
+
+class InsufficientRightsException(ManagerException):
+    pass
+
+class NotFoundException(ManagerException):
+    pass
+
+class ServerException(ManagerException):
+    """
+    Internal error of the manager (HTTP 5xx), which may go away on retry.
+    """
+    pass
 
-class InsufficientRightsException(Exception):
+class ManagerUnavailableException(ManagerException):
+    """
+    Connection to the manager failed or timed out.
+    """
     pass
 
-class Client(object):
-    def __init__(self, manager_url = None, username=None, password=None):
+class CircuitOpenException(ManagerUnavailableException):
+    """
+    Request was not sent, because recent requests to the manager failed.
+    retry_after is the number of seconds until a request may be sent again;
+    RetryPolicy waits for it instead of counting an attempt.
+    """
+    def __init__(self, message, retry_after=0.0):
+        ManagerUnavailableException.__init__(self, message)
+        self.retry_after = retry_after
+
+class DeadlineExceededException(ManagerUnavailableException):
+    """
+    Request was not sent, because the deadline of the call has passed.
+    """
+    pass
+
+def is_retryable(error):
+    return isinstance(error, (ServerException, ManagerUnavailableException)) and \
+            not isinstance(error, DeadlineExceededException)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_PAGE_SIZE = 500
+
+# Seconds to wait for connection and for each read from the manager
+DEFAULT_TIMEOUT = 30
+
+# Seconds one call may take with all its retries, enough to wait out
+# a restart of the manager
+DEFAULT_DEADLINE = 120
+
+# Seconds to cache rarely changing metadata for, per request path
+DEFAULT_CACHE_TTLS = {"/type": 300, "/queue": 30, "/schedule": 300, "/host": 300}
+
+class EnqueueResult(object):
+    """
+    Outcome of one job submission made by Client.enqueue_many:
+    index of the job in the input sequence, either job_id or error, and
+    request latency in seconds. manager_url is set for jobs submitted by
+    batchd.federation.FederatedClient.
+    """
+    def __init__(self, index, job, job_id=None, error=None, latency=None, manager_url=None):
+        self.index = index
+        self.job = job
+        self.job_id = job_id
+        self.error = error
+        self.latency = latency
+        self.manager_url = manager_url
+
+    @property
+    def params(self):
+        return self.job.get('params', {})
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "<EnqueueResult #{}: job {}>".format(self.index, self.job_id)
+        else:
+            return "<EnqueueResult #{}: {}>".format(self.index, self.error)
+
+class _KeyScan(object):
+    """
+    One scan of a queue for idempotency keys, shared by retrying submissions.
+    """
+    def __init__(self, started, after):
+        self.started = started
+        self.after = after
+        self.keys = {}
+        self.error = None
+        self.event = threading.Event()
+
+    def covers(self, since, after):
+        # a failed scan is not reused, so that retries scan again
+        return self.error is None and self.started >= since and \
+                (self.after is None or (after is not None and self.after <= after))
+
+class Throughput(object):
+    """
+    Running counters of a bulk operation, passed to progress callbacks.
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.done = 0
+        self.failed = 0
+
+    def add(self, ok):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    @property
+    def total(self):
+        return self.done + self.failed
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        if elapsed <= 0:
+            return 0.0
+        return self.total / elapsed
+
+    def __str__(self):
+        return "{} done, {} failed, {:.1f} req/s".format(self.done, self.failed, self.rate)
+
+class BulkResult(object):
+    """
+    Per-job outcome of a bulk operation (see Client.delete_jobs):
+    `done` - IDs of jobs the operation succeeded for;
+    `missing` - IDs of jobs which do not exist (e.g. are deleted already);
+    `failed` - dictionary {job ID: exception} for other errors.
+    """
+    def __init__(self):
+        self.done = []
+        self.missing = []
+        self.failed = {}
+
+    def add(self, job_id, error):
+        if error is None:
+            self.done.append(job_id)
+        elif isinstance(error, NotFoundException):
+            self.missing.append(job_id)
+        else:
+            self.failed[job_id] = error
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def __str__(self):
+        return "{} done, {} missing, {} failed".format(len(self.done), len(self.missing), len(self.failed))
+
+class Transport(object):
+    """
+    Pooled keep-alive HTTP transport.
+
+    All requests go through a single HTTPAdapter, so TCP connections (and
+    TLS sessions) to the manager are reused between calls. Each thread
+    gets its own requests.Session mounted on that shared adapter, which
+    keeps the transport safe to use from several threads at once. Sessions
+    are only referenced weakly besides the thread, so those of finished
+    threads are released.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        from requests.adapters import HTTPAdapter
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = weakref.WeakSet()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.add(session)
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions), weakref.WeakSet()
+        for session in sessions:
+            session.close()
+        self._adapter.close()
+
+class ClientBase(object):
+    """
+    Settings, config loading and error mapping shared by
+    Client and batchd.aioclient.AsyncClient.
+    """
+    def __init__(self, manager_url = None, username=None, password=None, pool_size=DEFAULT_POOL_SIZE):
         self._manager_url = manager_url
         self.username = username
         self.password = password
         self.key = None
         self.certificate = None
         self.ca_certificate = None
+        self.pool_size = pool_size
+        # Name of HTTP header to send unique request ID in, so that
+        # requests can be found in manager logs; None to not send it.
+        self.trace_header = None
+        self.instrumentation = Instrumentation()
+        self.timeout = DEFAULT_TIMEOUT
+        # Seconds one call may take with all its retries; None for no limit
+        self.deadline = DEFAULT_DEADLINE
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
+        # Offset of the manager's local time zone from UTC, in seconds; None
+        # if it is the same as this host's
+        self.manager_utc_offset = None
 
     @classmethod
     def from_config(cls, config=None):
         if config is None:
             config = cls.load_config()
 
-        settings = Client()
+        settings = cls()
         settings.certificate = config.get('certificate', None)
         settings.key = config.get('key', None)
         settings.ca_certificate = config.get('ca_certificate', None)
+        settings.pool_size = config.get('pool_size', DEFAULT_POOL_SIZE)
+        settings.trace_header = config.get('trace_header', None)
+        settings.timeout = config.get('timeout', DEFAULT_TIMEOUT)
+        settings.deadline = config.get('deadline', DEFAULT_DEADLINE)
+        settings.retry_policy = RetryPolicy(**(config.get('retry', None) or {}))
+        settings.circuit_breaker = CircuitBreaker(**(config.get('circuit_breaker', None) or {}))
+        settings.manager_utc_offset = config.get('manager_utc_offset', None)
         settings.config = config
         return settings
 
     @classmethod
-    def load_config(cls):
+    def load_config(cls, reload=False):
+        """
+        Return client config from ~/.config/batchd/client.yaml or
+        /etc/batchd/client.yaml, or empty dict if there is none.
+        The file is parsed once per process, unless reload is True;
+        callers should not modify returned dictionary.
+        """
         if not YAML_AVAILABLE:
             raise RuntimeError("YAML python module is not available, can't load batchd client config from file")
-        home = os.environ['HOME']
-        homecfg = join(home, ".config", "batchd", "client.yaml")
-        cfgfile = None
-        if isfile(homecfg):
-            cfgfile = open(homecfg, 'r')
-        else:
-            etc = join("/etc", "batchd", "client.yaml")
-            if isfile(etc):
-                cfgfile = open(etc, 'r')
-        if cfgfile:
-            return yaml.load(cfgfile)
+        path = None
+        for candidate in CONFIG_PATHS:
+            candidate = os.path.expanduser(candidate)
+            if isfile(candidate):
+                path = candidate
+                break
+        if path is None:
+            return {}
+        with _config_lock:
+            if reload or path not in _config_cache:
+                _config_cache[path] = _parse_config(path)
+            return _config_cache[path]
 
     @classmethod
     def obtain_manager_url(cls):
         env = os.environ.get('BATCH_MANAGER_URL', None)
         if env:
             return env
-        cfg = cls.load_config()
-        url = cfg['manager_url']
-        if url:
-            return url
+        if YAML_AVAILABLE:
+            url = cls.load_config().get('manager_url', None)
+            if url:
+                return url
         return 'http://localhost:9681'
     
     @property
@@ -67,6 +337,10 @@ class Client(object):
             self._manager_url = self.obtain_manager_url()
         return self._manager_url
 
+    @manager_url.setter
+    def manager_url(self, url):
+        self._manager_url = url
+
     @property
     def need_password(self):
         if self.key and self.certificate:
@@ -92,51 +366,556 @@ class Client(object):
         else:
             return False
 
+    def _trace(self, headers):
+        if self.trace_header:
+            import uuid
+            trace_id = uuid.uuid4().hex
+            headers[self.trace_header] = trace_id
+            return trace_id
+        return None
+
+    def _emit(self, method, path, **kwargs):
+        self.instrumentation.emit(RequestEvent(method, path, **kwargs))
+
+    def _manager_time(self, dt):
+        """
+        Format naive UTC datetime as local time of the manager, in which it
+        reads time parameters such as ?from= of monitoring queries.
+        """
+        seconds = calendar.timegm(dt.utctimetuple())
+        if self.manager_utc_offset is None:
+            local = time.localtime(seconds)
+        else:
+            local = time.gmtime(seconds + self.manager_utc_offset)
+        return time.strftime("%Y-%m-%dT%H:%M:%S", local)
+
+    def _metrics_params(self, last, since):
+        if since is not None:
+            return {'from': self._manager_time(since)}
+        return dict(last=int(last))
+
+    def _check_status(self, status_code, text):
+        if status_code == 200:
+            return
+        if status_code in (401, 403):
+            raise InsufficientRightsException(text, status_code)
+        if status_code == 404:
+            raise NotFoundException(text, status_code)
+        if status_code >= 500:
+            raise ServerException(text, status_code)
+        raise ManagerException(text, status_code)
+
+class Client(ClientBase):
+    def __init__(self, manager_url = None, username=None, password=None, pool_size=DEFAULT_POOL_SIZE):
+        ClientBase.__init__(self, manager_url, username, password, pool_size)
+        self._transport = None
+        self._transport_lock = threading.Lock()
+        self.cache = MetadataCache(DEFAULT_CACHE_TTLS)
+        # queue name -> greatest ID of job enqueued by this client
+        self._last_job_ids = {}
+        # queue name -> last _KeyScan
+        self._key_scans = {}
+        self._key_scans_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config=None):
+        settings = super(Client, cls).from_config(config)
+        settings.cache.ttls.update(settings.config.get('cache_ttl', None) or {})
+        return settings
+
+    @property
+    def transport(self):
+        if self._transport is None:
+            with self._transport_lock:
+                if self._transport is None:
+                    self._transport = Transport(self.pool_size)
+        return self._transport
+
+    def close(self):
+        with self._transport_lock:
+            transport, self._transport = self._transport, None
+        if transport is not None:
+            transport.close()
+
+    def _send(self, method, path, attempt, timeout, **kwargs):
+        """
+        Make one attempt of a request. Connection failures and 5xx
+        responses are raised as exceptions and counted by the circuit breaker.
+        """
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceededException("Deadline of request to {} exceeded".format(self.manager_url))
+        breaker = self.circuit_breaker
+        if not breaker.allow():
+            retry_in = breaker.retry_in
+            raise CircuitOpenException("Manager {} is unavailable, next try in {:.0f}s".format(
+                    self.manager_url, retry_in), retry_in)
+        # the call allowed by the breaker must be reported to it in any case
+        resolved = False
+        try:
+            headers = dict(kwargs.pop('headers', None) or {})
+            trace_id = self._trace(headers)
+            data = kwargs.get('data', None)
+            request_bytes = len(data) if data else 0
+            if timeout is None or timeout > self.timeout:
+                timeout = self.timeout
+            start = time.time()
+            try:
+                rs = self.transport.request(method, self.manager_url + path,
+                                auth=self.credentials, verify=self.verify, cert=self.client_certificate,
+                                headers=headers, timeout=timeout, **kwargs)
+            except Exception as e:
+                self._emit(method, path, latency=time.time() - start, request_bytes=request_bytes,
+                           retries=attempt, trace_id=trace_id, error=e)
+                import requests
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                    raise ManagerUnavailableException("Can't reach manager {}: {}".format(self.manager_url, e))
+                raise
+            if kwargs.get('stream', False):
+                # body is not read yet
+                length = rs.headers.get('Content-Length', None)
+                response_bytes = int(length) if length is not None else None
+            else:
+                response_bytes = len(rs.content)
+            self._emit(method, path, status=rs.status_code, latency=time.time() - start,
+                       request_bytes=request_bytes, response_bytes=response_bytes, retries=attempt, trace_id=trace_id)
+            if rs.status_code >= 500:
+                try:
+                    self._handle_status(rs)
+                finally:
+                    rs.close()
+            resolved = True
+            breaker.success()
+            return rs
+        finally:
+            if not resolved:
+                breaker.failure()
+
+    def _request(self, method, path, retry=True, deadline=None, **kwargs):
+        """
+        Send request to the manager. With retry=True, retryable failures
+        (see is_retryable) are retried according to retry_policy, within
+        `deadline` seconds (self.deadline by default).
+        """
+        if deadline is None:
+            deadline = self.deadline
+        if not retry:
+            return self._send(method, path, 0, deadline, **kwargs)
+        return self.retry_policy.run(lambda attempt, timeout: self._send(method, path, attempt, timeout, **kwargs),
+                                     is_retryable, deadline)
+
     def _handle_status(self, rs):
-        if rs.status_code in (401, 403):
-            raise InsufficientRightsException(rs.text)
+        # the body of a streamed response must not be read here
         if rs.status_code != 200:
-            raise Exception(rs.text)
+            self._check_status(rs.status_code, rs.text)
+
+    def _cached_get(self, path):
+        def fetch(headers):
+            rs = self._request("GET", path, headers=headers)
+            if rs.status_code == 304:
+                return rs.status_code, rs.headers, None
+            self._handle_status(rs)
+            return rs.status_code, rs.headers, rs.text
+
+        return self.cache.get(path, fetch)
+
+    def invalidate(self, path=None):
+        """
+        Drop cached metadata for request path (e.g. "/queue"), or all of it.
+        """
+        self.cache.invalidate(path)
 
     def get_job_types(self):
-        rs = requests.get(self.manager_url + "/type", auth=self.credentials, verify=self.verify, cert=self.client_certificate)
-        self._handle_status(rs)
-        return json.loads(rs.text)
+        return self._cached_get("/type")
 
     def get_queues(self):
-        rs = requests.get(self.manager_url + "/queue", auth=self.credentials, verify=self.verify, cert=self.client_certificate)
-        self._handle_status(rs)
-        return json.loads(rs.text)
+        return self._cached_get("/queue")
+
+    def enqueue_job(self, job, idempotency_key=None, check_existing=False):
+        """
+        Put a job, described by dictionary with at least queue, type and
+        params keys, into its queue. Returns ID of created job.
+
+        Failed submissions are retried. So that a retry never creates
+        a duplicate job, the job carries an idempotency key (random, unless
+        given) in its notes, which is not shown in notes of jobs read back
+        (see batchd.job.Job), and before a retry which follows a request that
+        may have reached the manager, the queue is checked for a job with
+        that key. Submissions retrying at the same time share one scan of
+        the queue (see recent_keys).
+
+        With check_existing=True the queue is checked before the first
+        attempt too, e.g. when resuming a submission which may have been
+        interrupted; all such checks share one scan.
+        """
+        import uuid
+        qname = job['queue']
+        if idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex
+        job = dict(job)
+        # key of a job read back, which is being submitted again
+        job.pop('idempotency_key', None)
+        marker = IDEMPOTENCY_MARKER + idempotency_key
+        job['notes'] = job['notes'] + "\n" + marker if job.get('notes') else marker
+        data = json.dumps(job)
+        # a job created by a failed attempt has greater ID than any job known now
+        after = self._last_job_ids.get(qname, None)
+        # time when last request which may have created the job failed;
+        # any earlier scan will do for a submission made by another process
+        failed = [0.0] if check_existing else []
+
+        def attempt(n, timeout):
+            if failed:
+                existing = self.recent_keys(qname, after, failed[-1]).get(idempotency_key)
+                if existing is not None:
+                    return existing
+            try:
+                rs = self._send("POST", "/queue/" + qname, n, timeout, data=data)
+                self._handle_status(rs)
+                return json.loads(rs.text)
+            except (CircuitOpenException, DeadlineExceededException):
+                # the request was not sent
+                raise
+            except Exception:
+                failed.append(time.time())
+                raise
+
+        job_id = self.retry_policy.run(attempt, is_retryable, self.deadline)
+        with self._transport_lock:
+            if job_id > self._last_job_ids.get(qname, 0):
+                self._last_job_ids[qname] = job_id
+        return job_id
+
+    def recent_keys(self, qname, after, since):
+        """
+        Return dictionary {idempotency key: job ID} of jobs of named queue
+        with ID greater than `after`, from a scan of the queue started not
+        earlier than `since` (time.time() value). A scan which satisfies
+        these conditions is reused, and concurrent callers wait for the
+        scan in progress, so that the manager, which sends the whole queue
+        for each scan, gets one scan per wave of retries and not one per
+        retried job.
+        """
+        with self._key_scans_lock:
+            scan = self._key_scans.get(qname)
+            leader = scan is None or not scan.covers(since, after)
+            if leader:
+                scan = self._key_scans[qname] = _KeyScan(time.time(), after)
+
+        if not leader:
+            scan.event.wait()
+            if scan.error is not None:
+                raise scan.error
+            return scan.keys
+
+        try:
+            params = dict(status="all")
+            if after is not None:
+                params['after'] = after
+            items = self._iter_array("/queue/" + qname + "/jobs", retry=False, params=params)
+            try:
+                for job in items:
+                    if after is not None and job['id'] <= after:
+                        continue
+                    key = split_idempotency_key(job.get('notes', None))[1]
+                    if key is not None:
+                        scan.keys[key] = job['id']
+            finally:
+                items.close()
+        except Exception as e:
+            scan.error = e
+            raise
+        finally:
+            scan.event.set()
+        return scan.keys
+
+    def find_job_by_key(self, qname, idempotency_key, after=None):
+        """
+        Return job of named queue, with ID greater than `after`, which was
+        enqueued with given idempotency key, or None.
+        """
+        marker = IDEMPOTENCY_MARKER + idempotency_key
+        params = dict(status="all")
+        if after is not None:
+            params['after'] = after
+        items = self._iter_array("/queue/" + qname + "/jobs", retry=False, params=params)
+        try:
+            for job in items:
+                if after is not None and job['id'] <= after:
+                    continue
+                notes = job.get('notes', None)
+                if notes and marker in notes:
+                    return Job.from_dict(job)
+        finally:
+            items.close()
+        return None
 
     def do_enqueue(self, qname, typename, params):
-        rq = dict(queue = qname, type=typename, params=params)
-        rs = requests.post(self.manager_url+ "/queue/" + qname, data=json.dumps(rq), auth=self.credentials, verify=self.verify, cert=self.client_certificate)
-        self._handle_status(rs)
-        print(rs.text)
+        return self.enqueue_job(dict(queue = qname, type=typename, params=params))
+
+    def iter_enqueue_jobs(self, jobs, concurrency=None, progress=None, key=None, check_existing=False):
+        """
+        Submit job dictionaries (see enqueue_job) from iterable, which is
+        consumed lazily. Yields EnqueueResult objects in order of completion.
+        If progress is provided, it is called with a Throughput after each
+        submission. If key is provided, key(index, job) returns idempotency
+        key of job number index; check_existing is passed to enqueue_job.
+        """
+        if concurrency is None:
+            concurrency = self.pool_size
+        stats = Throughput()
+
+        def submit(item):
+            index, job = item
+            start = time.time()
+            try:
+                idempotency_key = key(index, job) if key is not None else None
+                job_id, error = self.enqueue_job(job, idempotency_key, check_existing), None
+            except Exception as e:
+                job_id, error = None, e
+            return EnqueueResult(index, job, job_id, error, time.time() - start)
+
+        for item, result, error in imap_unordered(submit, enumerate(jobs), concurrency):
+            stats.add(result.ok)
+            if progress is not None:
+                progress(stats)
+            yield result
+
+    def iter_enqueue_many(self, qname, typename, params_iter, concurrency=None, progress=None):
+        """
+        Submit one job of given type into named queue per item of params_iter.
+        See iter_enqueue_jobs.
+        """
+        jobs = (dict(queue = qname, type=typename, params=params) for params in params_iter)
+        return self.iter_enqueue_jobs(jobs, concurrency, progress)
+
+    def enqueue_many(self, qname, typename, params_iter, concurrency=None, progress=None):
+        """
+        Same as iter_enqueue_many, but returns list of EnqueueResult
+        in the order of params_iter.
+        """
+        results = list(self.iter_enqueue_many(qname, typename, params_iter, concurrency, progress))
+        results.sort(key=lambda r: r.index)
+        return results
 
     def get_queue_stats(self, qname):
-        rs = requests.get(self.manager_url + "/stats/" + qname, auth=self.credentials, verify=self.verify, cert=self.client_certificate)
+        rs = self._request("GET", "/stats/" + qname)
+        self._handle_status(rs)
+        return json.loads(rs.text)
+
+    def get_all_stats(self):
+        """
+        Return job counts of all queues in one request, as dictionary
+        {queue name: {status: count}}.
+        """
+        rs = self._request("GET", "/stats")
         self._handle_status(rs)
         return json.loads(rs.text)
 
-    def get_jobs(self, qname):
-        rs = requests.get(self.manager_url + "/queue/" + qname + "/jobs?status=all", auth=self.credentials, verify=self.verify, cert=self.client_certificate)
+    def query_metrics(self, prefix, last=None, since=None):
+        """
+        Return monitoring samples of metrics with names starting with prefix
+        (e.g. "batchd.host"), recorded during `last` seconds or since naive
+        UTC datetime `since` (a second precision), as list of dictionaries
+        with name, time, kind, value, text etc. keys.
+        """
+        rs = self._request("GET", "/monitor/" + prefix + "/query", params=self._metrics_params(last, since))
         self._handle_status(rs)
         return json.loads(rs.text)
 
+    def get_jobs(self, qname, status="all"):
+        rs = self._request("GET", "/queue/" + qname + "/jobs", params=dict(status=status))
+        self._handle_status(rs)
+        return [Job.from_dict(job) for job in json.loads(rs.text)]
+
+    def _iter_array(self, path, **kwargs):
+        rs = self._request("GET", path, stream=True, **kwargs)
+        try:
+            self._handle_status(rs)
+        except Exception:
+            rs.close()
+            raise
+        return iter_response_array(rs)
+
+    def _iter_jobs(self, path, after=None, **kwargs):
+        items = self._iter_array(path, **kwargs)
+        try:
+            for item in items:
+                if after is not None and item['id'] <= after:
+                    continue
+                yield Job.from_dict(item)
+        finally:
+            items.close()
+
+    def iter_jobs(self, qname, status="all", after=None):
+        """
+        Iterate over jobs (batchd.job.Job) in named queue, decoding them from
+        the response one by one instead of loading the whole list in memory.
+        With `after`, only jobs with greater id are yielded, in one request;
+        a manager which does not support ?after= still sends the whole
+        list, and earlier jobs are skipped while streaming it.
+        """
+        params = dict(status=status)
+        if after is not None:
+            params['after'] = after
+        return self._iter_jobs("/queue/" + qname + "/jobs", after, params=params)
+
+    def get_jobs_page(self, qname, status="all", after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Return up to `limit` jobs of named queue with id greater than `after`.
+        The manager is asked for the page with ?after=&limit= parameters;
+        if it ignores them, they are applied while streaming the response,
+        which is closed as soon as the page is complete.
+        """
+        params = dict(status=status, limit=limit)
+        if after is not None:
+            params['after'] = after
+        items = self._iter_jobs("/queue/" + qname + "/jobs", after, params=params)
+        page = []
+        try:
+            for job in items:
+                page.append(job)
+                if len(page) == limit:
+                    break
+        finally:
+            items.close()
+        return page
+
+    def iter_job_pages(self, qname, status="all", after=None, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterate over pages (lists) of jobs in named queue, fetching each page
+        only when it is requested.
+        """
+        while True:
+            page = self.get_jobs_page(qname, status, after, page_size)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = page[-1]['id']
+
+    def iter_all_jobs(self, status="all"):
+        """
+        Same as iter_jobs, but for jobs of all queues (/jobs).
+        """
+        return self._iter_jobs("/jobs", params=dict(status=status))
+
+    def download_job(self, job_id, outputs):
+        """
+        Fetch job record (/job/:id), which includes stdout and stderr of its
+        last execution. These are written to files given by `outputs`, as in
+        download_last_result, and the rest of the record is returned.
+        Raises NotFoundException if there is no such job.
+        """
+        rs = self._request("GET", "/job/" + str(job_id), stream=True)
+        try:
+            self._handle_status(rs)
+            record = spool_object(rs.iter_content(DEFAULT_CHUNK_SIZE), outputs)
+        finally:
+            rs.close()
+        notes, key = split_idempotency_key(record.get('notes', None))
+        if key is not None:
+            record['notes'] = notes
+            record['idempotency_key'] = key
+        return record
+
+    def download_last_result(self, job_id, outputs):
+        """
+        Fetch results of last execution of the job (/job/:id/results/last).
+        Its stdout and/or stderr are not loaded in memory, but written in
+        UTF-8 to binary files given by `outputs` dictionary, e.g.
+        {'stdout': f}, while the response is streamed. Returns dictionary
+        with the remaining fields of results.
+        """
+        rs = self._request("GET", "/job/" + str(job_id) + "/results/last", stream=True)
+        try:
+            self._handle_status(rs)
+            return spool_object(rs.iter_content(DEFAULT_CHUNK_SIZE), outputs)
+        finally:
+            rs.close()
+
     def delete_job(self, jobid):
-        rs = requests.delete(self.manager_url + "/job/" + str(jobid), auth=self.credentials, verify=self.verify, cert=self.client_certificate)
+        def attempt(n, timeout):
+            rs = self._send("DELETE", "/job/" + str(jobid), n, timeout)
+            if n > 0 and rs.status_code == 404:
+                # deleted by previous attempt
+                return
+            self._handle_status(rs)
+
+        self.retry_policy.run(attempt, is_retryable, self.deadline)
+
+    def update_job(self, jobid, **changes):
+        """
+        Change job fields (PUT /job/:id): status, host_name, notes,
+        start_time or queue_name. Status names are capitalized, e.g. "New".
+        """
+        rs = self._request("PUT", "/job/" + str(jobid), data=json.dumps(changes))
         self._handle_status(rs)
-        print(rs)
+
+    def select_jobs(self, qname, status="all", filters=None, predicate=None):
+        """
+        Return list of IDs of jobs of named queue with given status, whose
+        fields are equal to values of filters dictionary (e.g.
+        {'type': 'blender', 'host_name': 'render1'}) and, if predicate is
+        given, for which predicate(job) is true.
+        """
+        if filters is None:
+            filters = {}
+        return [job['id'] for job in self.iter_jobs(qname, status)
+                if all(job.get(name) == value for name, value in filters.items())
+                and (predicate is None or predicate(job))]
+
+    def iter_bulk(self, func, job_ids, concurrency=None, progress=None):
+        """
+        Call func(job_id) for each ID from iterable, which is consumed
+        lazily, with no more than `concurrency` requests in flight. Yields
+        (job_id, error) tuples in order of completion. If progress is
+        provided, it is called with a Throughput after each job.
+        """
+        if concurrency is None:
+            concurrency = self.pool_size
+        stats = Throughput()
+        for job_id, result, error in imap_unordered(func, job_ids, concurrency):
+            stats.add(error is None)
+            if progress is not None:
+                progress(stats)
+            yield job_id, error
+
+    def _bulk(self, func, job_ids, concurrency, progress):
+        result = BulkResult()
+        for job_id, error in self.iter_bulk(func, job_ids, concurrency, progress):
+            result.add(job_id, error)
+        return result
+
+    def delete_jobs(self, job_ids, concurrency=None, progress=None):
+        """
+        Delete jobs by IDs from iterable. Returns BulkResult.
+        """
+        return self._bulk(self.delete_job, job_ids, concurrency, progress)
+
+    def delete_jobs_where(self, qname, status="all", filters=None, predicate=None, concurrency=None, progress=None):
+        """
+        Delete jobs of named queue selected as by select_jobs. Returns BulkResult.
+        """
+        job_ids = self.select_jobs(qname, status, filters, predicate)
+        return self.delete_jobs(job_ids, concurrency, progress)
+
+    def set_jobs_status(self, job_ids, status, concurrency=None, progress=None):
+        """
+        Set status of jobs by IDs from iterable, e.g. "new" to run
+        failed jobs again. Returns BulkResult.
+        """
+        status = status.capitalize()
+        return self._bulk(lambda job_id: self.update_job(job_id, status=status), job_ids, concurrency, progress)
+
+    def get_hosts(self):
+        return self._cached_get("/host")
 
     def get_schedules(self):
-        rs = requests.get(self.manager_url + "/schedule", auth=self.credentials, verify=self.verify, cert=self.client_certificate)
-        self._handle_status(rs)
-        return json.loads(rs.text)
+        return self._cached_get("/schedule")
 
     def new_queue(self, queue):
-        rs = requests.post(self.manager_url + "/queue", data=json.dumps(queue), auth=self.credentials, verify=self.verify, cert=self.client_certificate)
+        rs = self._request("POST", "/queue", retry=False, data=json.dumps(queue))
+        self.invalidate("/queue")
         self._handle_status(rs)
-        print(rs.text)
 
 
@@ -0,0 +1,266 @@
+
+import time
+import threading
+
+from batchd.client import Client, EnqueueResult, Throughput, ManagerException
+from batchd.parallel import imap_unordered
+
+# Seconds for which stats used for routing are considered fresh
+DEFAULT_STATS_TTL = 10
+
+# Job statuses which count as backlog of a queue
+BACKLOG_STATUSES = ("new", "waiting", "processing")
+
+class NoManagerException(ManagerException):
+    pass
+
+class FederatedClient(object):
+    """
+    Client for several batchd managers at once.
+
+    Read methods query all managers in parallel and merge the results;
+    each returned queue and job dictionary gets a 'manager' key with URL
+    of the manager it came from, since job IDs are only unique within one
+    manager. Managers which fail to answer are skipped, and their errors
+    are kept in `errors` (manager URL -> exception) until the next call;
+    the call fails only if no manager answered.
+
+    New jobs are routed to the manager whose queue of the same name has the
+    shallowest backlog (new, waiting and processing jobs), according to
+    /stats fetched from all managers at most every `stats_ttl` seconds plus
+    the jobs routed there since.
+    """
+    def __init__(self, clients, stats_ttl=DEFAULT_STATS_TTL):
+        if not clients:
+            raise ValueError("At least one manager is required")
+        self.clients = list(clients)
+        self.by_url = dict((client.manager_url, client) for client in self.clients)
+        self.stats_ttl = stats_ttl
+        self.errors = {}
+        self._stats = {}
+        self._stats_time = None
+        self._routed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config=None):
+        """
+        Create clients from `managers` list of client config: each item is
+        either manager URL or a dictionary of settings (manager_url,
+        username, certificate, ...) overriding top-level ones.
+        """
+        if config is None:
+            config = Client.load_config()
+        clients = []
+        for item in config.get('managers', None) or [config.get('manager_url', None)]:
+            if not isinstance(item, dict):
+                item = dict(manager_url=item)
+            settings = dict(config)
+            settings.update(item)
+            client = Client.from_config(settings)
+            if settings.get('manager_url', None):
+                client.manager_url = settings['manager_url']
+            client.username = settings.get('username', None)
+            client.password = settings.get('password', None)
+            clients.append(client)
+        return cls(clients, config.get('stats_ttl', DEFAULT_STATS_TTL))
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+    def _map(self, func, clients=None):
+        """
+        Call func(client) for each client in parallel, returning list of
+        (client, result) pairs for those which succeeded.
+        """
+        if clients is None:
+            clients = self.clients
+        results = []
+        errors = {}
+        for client, result, error in imap_unordered(func, clients, max(len(clients), 1)):
+            if error is None:
+                results.append((client, result))
+            else:
+                errors[client.manager_url] = error
+        self.errors = errors
+        if clients and not results:
+            raise NoManagerException("No manager answered: {}".format(
+                    "; ".join("{}: {}".format(url, e) for url, e in sorted(errors.items()))))
+        # keep the order of managers
+        order = dict((client.manager_url, n) for n, client in enumerate(self.clients))
+        results.sort(key=lambda r: order[r[0].manager_url])
+        return results
+
+    @staticmethod
+    def _tagged(client, items):
+        result = []
+        for item in items:
+            if isinstance(item, dict):
+                # shared with client's cache, must not be modified
+                item = dict(item)
+            item['manager'] = client.manager_url
+            result.append(item)
+        return result
+
+    def get_queues(self):
+        result = []
+        for client, queues in self._map(lambda c: c.get_queues()):
+            result.extend(self._tagged(client, queues))
+        return result
+
+    def get_job_types(self):
+        """
+        Job types of all managers; for types defined on several managers,
+        the definition of the first one is returned.
+        """
+        seen = set()
+        result = []
+        for client, types in self._map(lambda c: c.get_job_types()):
+            for jobtype in types:
+                if jobtype['name'] not in seen:
+                    seen.add(jobtype['name'])
+                    result.append(jobtype)
+        return result
+
+    def get_hosts(self):
+        result = []
+        for client, hosts in self._map(lambda c: c.get_hosts()):
+            result.extend(h for h in hosts if h not in result)
+        return result
+
+    def get_jobs(self, qname, status="all"):
+        """
+        Jobs of queues named qname on all managers, ordered by creation time.
+        """
+        result = []
+        for client, jobs in self._map(lambda c: c.get_jobs(qname, status), self._clients_with_queue(qname)):
+            result.extend(self._tagged(client, jobs))
+        result.sort(key=lambda job: job.get('create_time') or "")
+        return result
+
+    def _clients_with_queue(self, qname):
+        stats = self._fresh_stats()
+        return [client for client in self.clients if qname in stats.get(client.manager_url, {})]
+
+    def get_stats_by_manager(self):
+        """
+        Return {manager URL: {queue name: {status: count}}}.
+        """
+        return dict((client.manager_url, stats) for client, stats in self._map(lambda c: c.get_all_stats()))
+
+    def get_all_stats(self):
+        """
+        Job counts per queue name, summed over all managers.
+        """
+        return _sum_stats(self.get_stats_by_manager().values())
+
+    def get_queue_stats(self, qname):
+        return self.get_all_stats().get(qname, {})
+
+    def delete_job(self, manager_url, job_id):
+        self.by_url[manager_url].delete_job(job_id)
+
+    def refresh_stats(self):
+        stats = self.get_stats_by_manager()
+        with self._lock:
+            self._stats = stats
+            self._stats_time = time.time()
+            self._routed = {}
+        return stats
+
+    def _fresh_stats(self):
+        with self._lock:
+            fresh = self._stats_time is not None and time.time() - self._stats_time < self.stats_ttl
+            stats = self._stats
+        if not fresh:
+            stats = self.refresh_stats()
+        return stats
+
+    def backlog(self, manager_url, qname):
+        """
+        Estimated number of unfinished jobs in queue on manager,
+        or None if the manager has no such queue.
+        """
+        counts = self._fresh_stats().get(manager_url, {}).get(qname, None)
+        if counts is None:
+            return None
+        with self._lock:
+            routed = self._routed.get((manager_url, qname), 0)
+        return sum(counts.get(status, 0) for status in BACKLOG_STATUSES) + routed
+
+    def route(self, qname):
+        """
+        Choose client for a new job in queue qname, and count the job in
+        backlog of its manager.
+        """
+        stats = self._fresh_stats()
+        with self._lock:
+            best = None
+            best_backlog = None
+            for client in self.clients:
+                counts = stats.get(client.manager_url, {}).get(qname, None)
+                if counts is None:
+                    continue
+                backlog = sum(counts.get(status, 0) for status in BACKLOG_STATUSES)
+                backlog += self._routed.get((client.manager_url, qname), 0)
+                if best is None or backlog < best_backlog:
+                    best, best_backlog = client, backlog
+            if best is None:
+                raise NoManagerException("No manager has queue {}".format(qname))
+            key = (best.manager_url, qname)
+            self._routed[key] = self._routed.get(key, 0) + 1
+        return best
+
+    def enqueue_job(self, job):
+        """
+        Put job into its queue on the least loaded manager.
+        Returns (manager URL, job ID).
+        """
+        client = self.route(job['queue'])
+        return client.manager_url, client.enqueue_job(job)
+
+    def do_enqueue(self, qname, typename, params):
+        return self.enqueue_job(dict(queue = qname, type=typename, params=params))
+
+    def iter_enqueue_jobs(self, jobs, concurrency=None, progress=None):
+        """
+        Same as Client.iter_enqueue_jobs, but each job is routed separately;
+        EnqueueResult.manager_url tells where it went.
+        """
+        if concurrency is None:
+            concurrency = sum(client.pool_size for client in self.clients)
+        stats = Throughput()
+
+        def submit(item):
+            index, job = item
+            start = time.time()
+            manager_url, job_id, error = None, None, None
+            try:
+                client = self.route(job['queue'])
+                manager_url = client.manager_url
+                job_id = client.enqueue_job(job)
+            except Exception as e:
+                error = e
+            return EnqueueResult(index, job, job_id, error, time.time() - start, manager_url)
+
+        for item, result, error in imap_unordered(submit, enumerate(jobs), concurrency):
+            stats.add(result.ok)
+            if progress is not None:
+                progress(stats)
+            yield result
+
+    def enqueue_many(self, qname, typename, params_iter, concurrency=None, progress=None):
+        jobs = (dict(queue = qname, type=typename, params=params) for params in params_iter)
+        results = list(self.iter_enqueue_jobs(jobs, concurrency, progress))
+        results.sort(key=lambda r: r.index)
+        return results
+
+def _sum_stats(all_stats):
+    result = {}
+    for stats in all_stats:
+        for qname, counts in stats.items():
+            total = result.setdefault(qname, {})
+            for status, n in counts.items():
+                total[status] = total.get(status, 0) + n
+    return result
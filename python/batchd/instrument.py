@@ -0,0 +1,189 @@
+
+import bisect
+import threading
+
+# Upper bounds of latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+# Name of placeholder for path segment following a collection name
+PLACEHOLDERS = {
+    'queue': ':name',
+    'stats': ':name',
+    'type': ':name',
+    'schedule': ':name',
+    'user': ':name',
+    'job': ':id',
+    'monitor': ':prefix'
+}
+
+def endpoint_template(path):
+    """
+    Turn request path into endpoint name as in REST.API,
+    e.g. /queue/render/jobs -> /queue/:name/jobs.
+    """
+    segments = path.split("?")[0].strip("/").split("/")
+    if not segments or not segments[0]:
+        return "/"
+    head = segments[0]
+    if len(segments) > 1 and head in PLACEHOLDERS:
+        if not (head == 'monitor' and segments[1] in ('current', 'jobs')):
+            segments[1] = PLACEHOLDERS[head]
+    return "/" + "/".join(segments)
+
+class RequestEvent(object):
+    """
+    Information about one request made by client, passed to hooks.
+    response_bytes is None when it is not known (e.g. for streamed responses
+    without Content-Length).
+    """
+    def __init__(self, method, path, status=None, latency=None, request_bytes=0, response_bytes=None,
+                 retries=0, trace_id=None, error=None):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint_template(path)
+        self.status = status
+        self.latency = latency
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.retries = retries
+        self.trace_id = trace_id
+        self.error = error
+
+    def as_dict(self):
+        return dict(method=self.method, path=self.path, endpoint=self.endpoint, status=self.status,
+                    latency=self.latency, request_bytes=self.request_bytes, response_bytes=self.response_bytes,
+                    retries=self.retries, trace_id=self.trace_id,
+                    error=None if self.error is None else str(self.error))
+
+class _Series(object):
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, event):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, event.latency)] += 1
+        self.count += 1
+        self.latency_sum += event.latency
+        self.request_bytes += event.request_bytes or 0
+        self.response_bytes += event.response_bytes or 0
+        self.retries += event.retries
+        if event.error is not None:
+            self.errors += 1
+        if event.status is not None:
+            self.statuses[event.status] = self.statuses.get(event.status, 0) + 1
+
+    def percentile(self, p):
+        """
+        Estimate percentile (0 < p < 1) of latency by linear interpolation
+        within histogram bucket.
+        """
+        if self.count == 0:
+            return None
+        rank = p * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            if n and seen + n >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return lower
+
+class LatencyStats(object):
+    """
+    Hook collecting latency histograms and byte counters per endpoint and method.
+    """
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.endpoint, event.method)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.add(event)
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def to_json(self):
+        """
+        Summary of collected statistics as JSON-compatible list of dictionaries.
+        """
+        result = []
+        with self._lock:
+            for (endpoint, method), series in sorted(self._series.items()):
+                result.append(dict(endpoint=endpoint, method=method, count=series.count,
+                                   errors=series.errors, retries=series.retries,
+                                   statuses=dict((str(k), v) for k, v in series.statuses.items()),
+                                   request_bytes=series.request_bytes, response_bytes=series.response_bytes,
+                                   latency_sum=series.latency_sum,
+                                   p50=series.percentile(0.5), p95=series.percentile(0.95),
+                                   p99=series.percentile(0.99)))
+        return result
+
+    def to_prometheus(self, prefix="batchd_client"):
+        """
+        Collected statistics in Prometheus text exposition format.
+        """
+        lines = [
+            "# TYPE {}_request_duration_seconds histogram".format(prefix),
+        ]
+        counters = []
+        with self._lock:
+            for (endpoint, method), series in sorted(self._series.items()):
+                labels = 'endpoint="{}",method="{}"'.format(endpoint, method)
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, series.buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append('{}_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(prefix, labels, le, cumulative))
+                lines.append('{}_request_duration_seconds_sum{{{}}} {}'.format(prefix, labels, series.latency_sum))
+                lines.append('{}_request_duration_seconds_count{{{}}} {}'.format(prefix, labels, series.count))
+                counters.append((labels, series))
+        for name, attr in [("request_bytes", "request_bytes"), ("response_bytes", "response_bytes"),
+                           ("retries", "retries"), ("errors", "errors")]:
+            lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+            for labels, series in counters:
+                lines.append('{}_{}_total{{{}}} {}'.format(prefix, name, labels, getattr(series, attr)))
+        lines.append("# TYPE {}_responses_total counter".format(prefix))
+        for labels, series in counters:
+            for status, n in sorted(series.statuses.items()):
+                lines.append('{}_responses_total{{{},status="{}"}} {}'.format(prefix, labels, status, n))
+        return "\n".join(lines) + "\n"
+
+class Instrumentation(object):
+    """
+    Dispatcher of RequestEvent objects to hooks. Hooks are callables taking
+    one event; they are called in the thread which made the request, and
+    exceptions raised by them are ignored. Built-in LatencyStats hook is
+    available as `stats`.
+    """
+    def __init__(self):
+        self.stats = LatencyStats()
+        self.hooks = [self.stats]
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def emit(self, event):
+        for hook in list(self.hooks):
+            try:
+                hook(event)
+            except Exception:
+                pass
+
@@ -0,0 +1,230 @@
+
+import json
+import zlib
+
+# Fields kept as plain attributes
+FIELDS = ("id", "seq", "queue", "type", "status", "host_name", "user_name", "exit_code", "try_count",
+          "create_time", "start_time", "result_time", "notes")
+
+# Fields whose few distinct values are shared between all jobs
+INTERNED = frozenset(["queue", "type", "status", "host_name", "user_name"])
+
+# Fields stored in encoded form and decoded on access
+LAZY = ("params", "stdout", "stderr")
+
+_KNOWN = frozenset(FIELDS + LAZY)
+
+# Job output shorter than this is not compressed
+COMPRESS_THRESHOLD = 256
+
+# Prefix of the line of job notes which carries the idempotency key given
+# to the job by batchd.client.Client.enqueue_job
+IDEMPOTENCY_MARKER = "batchd-idempotency-key:"
+
+_strings = {}
+
+def intern_value(value):
+    """
+    Return the shared copy of string value (any other value is returned as is).
+    """
+    if value is None:
+        return None
+    return _strings.setdefault(value, value)
+
+_encode_params = json.JSONEncoder(separators=(',', ':'), sort_keys=True).encode
+
+class ReadOnlyDict(dict):
+    """
+    Dictionary which can not be changed in place, used for params decoded
+    on access: changes of such a copy would be lost. dict(d) gives a
+    changeable copy.
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("job params are read-only; assign changed copy to job['params']")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (ReadOnlyDict, (dict(self),))
+
+def split_idempotency_key(notes):
+    """
+    Return job notes without the idempotency key line, and the key (None
+    if there is none). Notes which consisted of the key only become None.
+    """
+    if not notes or IDEMPOTENCY_MARKER not in notes:
+        return notes, None
+    key = None
+    lines = []
+    for line in notes.splitlines():
+        if line.startswith(IDEMPOTENCY_MARKER):
+            if key is None:
+                key = line[len(IDEMPOTENCY_MARKER):]
+        else:
+            lines.append(line)
+    return "\n".join(lines) or None, key
+
+_decode_params = json.JSONDecoder(object_pairs_hook=ReadOnlyDict).decode
+
+class _Compressed(bytes):
+    __slots__ = ()
+
+def _encode_output(value):
+    if value is None or len(value) < COMPRESS_THRESHOLD:
+        return value
+    return _Compressed(zlib.compress(value.encode("utf-8"), 1))
+
+def _decode_output(value):
+    if isinstance(value, _Compressed):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+class Job(object):
+    """
+    Compact record of a job, as returned by the manager's job lists.
+
+    Job takes much less memory than the dictionary decoded from JSON: its
+    fields are slots, repeating strings (queue, type, status, host and user
+    names) are shared between jobs, params are kept as JSON text and job
+    output is kept compressed; those are decoded on each access.
+
+    For compatibility, Job behaves as a read-mostly dictionary: job['status'],
+    job.get('params'), 'stdout' in job, dict(job) work as before. Fields
+    unknown to this class are kept in a dictionary too. Params are returned
+    as ReadOnlyDict: to change them, assign a changed copy, e.g.
+    job['params'] = dict(job['params'], frame="10").
+
+    The idempotency key line, which Client.enqueue_job adds to notes of
+    a job, is not shown in its notes; the key is job['idempotency_key'].
+    """
+    __slots__ = FIELDS + ("_params", "_stdout", "_stderr", "_extra")
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            setattr(self, name, None)
+        self._params = None
+        self._stdout = None
+        self._stderr = None
+        self._extra = None
+        for name, value in fields.items():
+            self[name] = value
+
+    @classmethod
+    def from_dict(cls, d):
+        job = cls.__new__(cls)
+        get = d.get
+        strings = _strings
+        for name, slot, interned in _FIELD_SLOTS:
+            value = get(name)
+            if interned and value is not None:
+                value = strings.setdefault(value, value)
+            slot.__set__(job, value)
+        params = d.get('params', None)
+        job._params = None if params is None else _encode_params(params)
+        job._stdout = _encode_output(d.get('stdout', None))
+        job._stderr = _encode_output(d.get('stderr', None))
+        extra = dict((k, v) for k, v in d.items() if k not in _KNOWN)
+        job.notes, key = split_idempotency_key(job.notes)
+        if key is not None:
+            extra['idempotency_key'] = key
+        job._extra = extra or None
+        return job
+
+    @property
+    def params(self):
+        if self._params is None:
+            return None
+        return _decode_params(self._params)
+
+    @params.setter
+    def params(self, value):
+        self._params = None if value is None else _encode_params(value)
+
+    @property
+    def stdout(self):
+        return _decode_output(self._stdout)
+
+    @stdout.setter
+    def stdout(self, value):
+        self._stdout = _encode_output(value)
+
+    @property
+    def stderr(self):
+        return _decode_output(self._stderr)
+
+    @stderr.setter
+    def stderr(self, value):
+        self._stderr = _encode_output(value)
+
+    def keys(self):
+        result = list(FIELDS + LAZY)
+        if self._extra:
+            result.extend(self._extra.keys())
+        return result
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, name):
+        return name in FIELDS or name in LAZY or bool(self._extra and name in self._extra)
+
+    def __getitem__(self, name):
+        if name in FIELDS or name in LAZY:
+            return getattr(self, name)
+        if self._extra and name in self._extra:
+            return self._extra[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        if name in FIELDS or name in LAZY:
+            if name in INTERNED:
+                value = intern_value(value)
+            setattr(self, name, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[name] = value
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in FIELDS) + (self._params, self._stdout, self._stderr, self._extra)
+
+    def __eq__(self, other):
+        if isinstance(other, Job):
+            return self._key() == other._key()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<Job #{} {} {}>".format(self.id, self.queue, self.status)
+
+# Slot descriptors of plain fields, and whether their values are interned
+_FIELD_SLOTS = [(name, getattr(Job, name), name in INTERNED) for name in FIELDS]
@@ -0,0 +1,175 @@
+
+import re
+import json
+import codecs
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+WHITESPACE = re.compile(r'\s*')
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+class _Reader(object):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u""
+        self.pos = 0
+        self.eof = False
+
+    def more(self, need=1):
+        """
+        Append at least `need` characters to the buffer, unless the stream
+        ends earlier. Returns False on end of stream.
+        """
+        if self.eof:
+            return False
+        # drop consumed part, so that buffer holds only one pending item
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        added = 0
+        while added < need:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.buffer += self.decoder.decode(b"", final=True)
+                self.eof = True
+                break
+            text = self.decoder.decode(chunk)
+            self.buffer += text
+            added += len(text)
+        return added > 0 or not self.eof
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.more():
+                return
+
+    def peek(self):
+        self.skip_whitespace()
+        if self.pos < len(self.buffer):
+            return self.buffer[self.pos]
+        return None
+
+    def expect(self, chars):
+        c = self.peek()
+        if c is None or c not in chars:
+            raise ValueError("Expected one of {!r} at position {}, got {!r}".format(chars, self.pos, c))
+        self.pos += 1
+        return c
+
+def _decode_value(reader, decoder):
+    reader.skip_whitespace()
+    while True:
+        try:
+            item, end = decoder.raw_decode(reader.buffer, reader.pos)
+        except ValueError:
+            item, end = None, None
+        # an item which ends exactly at the end of buffer may be
+        # truncated (e.g. a number), so make sure with more data
+        if end is not None and (end < len(reader.buffer) or reader.eof):
+            break
+        pending = len(reader.buffer) - reader.pos
+        if not reader.more(max(pending, 1)):
+            if end is not None:
+                break
+            raise ValueError("Unexpected end of JSON data")
+    reader.pos = end
+    return item
+
+def iter_array(chunks, decoder=None):
+    """
+    Incrementally decode a JSON array from an iterable of byte chunks
+    (for example, requests' Response.iter_content()), yielding its items
+    one by one. Only the item being decoded is kept in memory.
+    """
+    if decoder is None:
+        decoder = json.JSONDecoder()
+    reader = _Reader(chunks)
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield _decode_value(reader, decoder)
+        if reader.expect(",]") == "]":
+            return
+
+STRING_RUN = re.compile(r'[^"\\]*')
+
+ESCAPES = {u'"': u'"', u'\\': u'\\', u'/': u'/', u'b': u'\b', u'f': u'\f', u'n': u'\n', u'r': u'\r', u't': u'\t'}
+
+def _spool_string(reader, output):
+    """
+    Decode JSON string at current position, writing it to binary file
+    `output` in UTF-8 piece by piece.
+    """
+    reader.expect('"')
+    while True:
+        match = STRING_RUN.match(reader.buffer, reader.pos)
+        if match.end() > reader.pos:
+            output.write(match.group().encode("utf-8"))
+            reader.pos = match.end()
+        if reader.pos >= len(reader.buffer):
+            if not reader.more():
+                raise ValueError("Unexpected end of JSON string")
+            continue
+        if reader.buffer[reader.pos] == '"':
+            reader.pos += 1
+            return
+        # backslash escape; longest one is a surrogate pair, \uXXXX\uXXXX
+        if len(reader.buffer) - reader.pos < 12:
+            reader.more(12)
+        escape = reader.buffer[reader.pos+1:reader.pos+2]
+        if escape == u'u':
+            code = int(reader.buffer[reader.pos+2:reader.pos+6], 16)
+            reader.pos += 6
+            if 0xd800 <= code < 0xdc00 and reader.buffer[reader.pos:reader.pos+2] == u'\\u':
+                low = int(reader.buffer[reader.pos+2:reader.pos+6], 16)
+                if 0xdc00 <= low < 0xe000:
+                    code = 0x10000 + ((code - 0xd800) << 10) + (low - 0xdc00)
+                    reader.pos += 6
+            output.write(unichr(code).encode("utf-8", "replace"))
+        elif escape in ESCAPES:
+            output.write(ESCAPES[escape].encode("utf-8"))
+            reader.pos += 2
+        else:
+            raise ValueError("Invalid escape {!r} in JSON string".format(escape))
+
+def spool_object(chunks, outputs, decoder=None):
+    """
+    Incrementally decode a JSON object from an iterable of byte chunks.
+    String values of keys present in `outputs` dictionary are not kept in
+    memory, but written in UTF-8 to binary files outputs[key]; the rest of
+    the object is returned as a dictionary.
+    """
+    if decoder is None:
+        decoder = json.JSONDecoder()
+    reader = _Reader(chunks)
+    result = {}
+    reader.expect("{")
+    if reader.peek() == "}":
+        return result
+    while True:
+        key = _decode_value(reader, decoder)
+        reader.expect(":")
+        if key in outputs and reader.peek() == '"':
+            _spool_string(reader, outputs[key])
+        else:
+            result[key] = _decode_value(reader, decoder)
+        if reader.expect(",}") == "}":
+            return result
+
+def iter_response_array(rs, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield items of JSON array contained in body of streamed requests' Response.
+    """
+    try:
+        for item in iter_array(rs.iter_content(chunk_size)):
+            yield item
+    finally:
+        rs.close()
+
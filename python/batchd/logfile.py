@@ -0,0 +1,139 @@
+
+import os
+import re
+import mmap
+import bisect
+import tempfile
+from array import array
+
+# Lines which "jump to error" stops at
+ERROR_PATTERN = re.compile(br"error|exception|traceback|fatal|failed", re.IGNORECASE)
+
+# Size of window scanned at a time when searching backwards, in bytes
+SEARCH_WINDOW = 1024 * 1024
+
+LOG_NAMES = ("stdout", "stderr")
+
+class LogFile(object):
+    """
+    Read-only view of a possibly big text log stored in a file.
+
+    The file is memory-mapped, so only the parts being looked at are paged
+    in, and lines are decoded one at a time when requested. Line positions
+    are kept in a compact index of line start offsets, built when the log
+    is opened.
+    """
+    def __init__(self, file, encoding="utf-8"):
+        self.file = file
+        self.encoding = encoding
+        file.flush()
+        file.seek(0, os.SEEK_END)
+        self.size = file.tell()
+        if self.size:
+            self.map = mmap.mmap(file.fileno(), self.size, access=mmap.ACCESS_READ)
+        else:
+            # empty files can not be mapped
+            self.map = b""
+        self.offsets = self._index()
+
+    def _index(self):
+        offsets = array('L', [0])
+        find = self.map.find
+        pos = find(b"\n")
+        while pos >= 0:
+            offsets.append(pos + 1)
+            pos = find(b"\n", pos + 1)
+        if len(offsets) > 1 and offsets[-1] == self.size:
+            # no empty line after final newline
+            offsets.pop()
+        return offsets
+
+    @property
+    def line_count(self):
+        if not self.size:
+            return 0
+        return len(self.offsets)
+
+    def line(self, n, max_length=None):
+        """
+        Text of line number n (counting from 0), without line ending.
+        If max_length is given, at most that many bytes of the line are decoded.
+        """
+        start = self.offsets[n]
+        if n + 1 < len(self.offsets):
+            end = self.offsets[n+1] - 1
+        else:
+            end = self.size
+            if end > start and self.map[end-1:end] == b"\n":
+                end -= 1
+        if end > start and self.map[end-1:end] == b"\r":
+            end -= 1
+        if max_length is not None:
+            end = min(end, start + max_length)
+        return self.map[start:end].decode(self.encoding, "replace")
+
+    def line_at(self, offset):
+        """
+        Number of line containing byte offset.
+        """
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def compile(self, text, regex=False, case_sensitive=False):
+        """
+        Turn search text into pattern for find().
+        """
+        pattern = text.encode(self.encoding)
+        if not regex:
+            pattern = re.escape(pattern)
+        return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+    def find(self, pattern, start_line=0, backwards=False):
+        """
+        Return number of first line matching compiled bytes pattern (see
+        compile), starting from start_line, or None. When searching backwards,
+        start_line itself is not included.
+        """
+        if not self.size:
+            return None
+        if not backwards:
+            if start_line >= len(self.offsets):
+                return None
+            match = pattern.search(self.map, self.offsets[start_line])
+            if match is None:
+                return None
+            return self.line_at(match.start())
+        end = self.offsets[start_line] if start_line < len(self.offsets) else self.size
+        while end > 0:
+            # windows start at line boundaries, so that matches do not cross them
+            start = self.offsets[self.line_at(max(end - SEARCH_WINDOW, 0))]
+            last = None
+            for match in pattern.finditer(self.map, start, end):
+                last = match
+            if last is not None:
+                return self.line_at(last.start())
+            end = start
+        return None
+
+    def find_error(self, start_line=0, backwards=False):
+        return self.find(ERROR_PATTERN, start_line, backwards)
+
+    def close(self):
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+def load_logs(client, job_id, names=LOG_NAMES, directory=None):
+    """
+    Download output of last execution of the job into temporary files.
+    Returns a tuple of results dictionary without output fields and
+    a dictionary mapping name ("stdout", "stderr") to LogFile.
+    Temporary files are removed when the logs are closed.
+    """
+    files = dict((name, tempfile.TemporaryFile(dir=directory)) for name in names)
+    try:
+        result = client.download_last_result(job_id, files)
+    except Exception:
+        for f in files.values():
+            f.close()
+        raise
+    return result, dict((name, LogFile(f)) for name, f in files.items())
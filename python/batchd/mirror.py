@@ -0,0 +1,286 @@
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from datetime import datetime
+from os.path import join, dirname
+
+from batchd.parallel import imap_unordered
+from batchd.client import NotFoundException
+
+SCHEMA_VERSION = 2
+
+SCHEMA = [
+    """create table if not exists jobs (
+        id integer primary key,
+        seq integer,
+        queue text not null,
+        type text,
+        status text,
+        host_name text,
+        user_name text,
+        exit_code integer,
+        try_count integer,
+        create_time text,
+        start_time text,
+        result_time text,
+        notes text,
+        params text
+    )""",
+    "create index if not exists jobs_queue on jobs (queue, status)",
+    "create index if not exists jobs_status on jobs (status)",
+    "create index if not exists jobs_type on jobs (type)",
+    "create index if not exists jobs_host_name on jobs (host_name)",
+    "create index if not exists jobs_create_time on jobs (create_time)",
+    """create table if not exists queues (
+        name text primary key,
+        synced real,
+        full_synced real
+    )""",
+]
+
+COLUMNS = ["id", "seq", "queue", "type", "status", "host_name", "user_name", "exit_code", "try_count",
+           "create_time", "start_time", "result_time", "notes", "params"]
+
+# Statuses from which a job can still move on
+ACTIVE_STATUSES = ["new", "waiting", "processing", "postponed"]
+
+# Columns which can be used in filters and in count(group_by=...)
+FILTER_COLUMNS = ["queue", "type", "status", "host_name", "user_name", "exit_code"]
+
+INSERT = "insert or replace into jobs ({}) values ({})".format(", ".join(COLUMNS), ", ".join("?" * len(COLUMNS)))
+
+BATCH_SIZE = 1000
+
+# Seconds after which sync() downloads whole job list of a queue again
+DEFAULT_FULL_SYNC_INTERVAL = 6 * 3600
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+def default_path(manager_url):
+    """
+    Mirror database file for manager URL, in ~/.cache/batchd.
+    """
+    digest = hashlib.sha1(manager_url.encode("utf-8")).hexdigest()[:12]
+    return join(os.path.expanduser("~"), ".cache", "batchd", "jobs-{}.sqlite".format(digest))
+
+def _row(job):
+    return (job['id'], job.get('seq'), job['queue'], job.get('type'), job.get('status'), job.get('host_name'),
+            job.get('user_name'), job.get('exit_code'), job.get('try_count'), job.get('create_time'),
+            job.get('start_time'), job.get('result_time'), job.get('notes'), json.dumps(job.get('params', {})))
+
+def _job(row):
+    job = dict(zip(COLUMNS, row))
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    return job
+
+def _time(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    return value
+
+class _Discard(object):
+    def write(self, data):
+        pass
+
+class SyncStats(object):
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.errors = 0
+
+    def __str__(self):
+        return "{} added, {} updated, {} removed, {} errors".format(self.added, self.updated, self.removed, self.errors)
+
+class JobMirror(object):
+    """
+    Local copy of jobs of a manager in SQLite database, for queries which
+    would otherwise need to download whole job lists. Job output (stdout,
+    stderr) is not stored.
+
+    The first sync of a queue downloads all its jobs. Further syncs only
+    fetch lists of jobs in active statuses (new, waiting, processing,
+    postponed), which include new jobs, and records of jobs which were
+    active locally but are not any more (or remove them from the mirror,
+    if they were deleted). Jobs which were created and finished between
+    two syncs, and jobs removed on the manager in final statuses, are only
+    noticed by a full sync: it is done every `full_sync_interval` seconds,
+    or when sync(full=True) is called.
+
+    Usage:
+
+        mirror = JobMirror(client)
+        mirror.sync()
+        failed = mirror.query(type="blender", status="failed", host_name="render1",
+                              since=datetime.utcnow() - timedelta(days=7))
+    """
+    def __init__(self, client, path=None, concurrency=8, full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL):
+        self.client = client
+        if path is None:
+            path = default_path(client.manager_url)
+        if path != ":memory:" and not os.path.isdir(dirname(path)):
+            os.makedirs(dirname(path))
+        self.path = path
+        self.concurrency = concurrency
+        self.full_sync_interval = full_sync_interval
+        self.db = sqlite3.connect(path)
+        self._create_schema()
+
+    def _create_schema(self):
+        version = self.db.execute("pragma user_version").fetchone()[0]
+        with self.db:
+            if version != SCHEMA_VERSION:
+                self.db.execute("drop table if exists jobs")
+                self.db.execute("drop table if exists queues")
+            for statement in SCHEMA:
+                self.db.execute(statement)
+            self.db.execute("pragma user_version = {}".format(SCHEMA_VERSION))
+
+    def close(self):
+        self.db.close()
+
+    def _store(self, jobs, stats, seen=False):
+        """
+        Insert or update jobs from iterable in batches. With seen=True, IDs
+        are also recorded in temporary table `seen`.
+        """
+        batch = []
+        for job in jobs:
+            batch.append(_row(job))
+            if len(batch) >= BATCH_SIZE:
+                self._store_batch(batch, stats, seen)
+                batch = []
+        if batch:
+            self._store_batch(batch, stats, seen)
+
+    def _store_batch(self, rows, stats, seen):
+        ids = [row[0] for row in rows]
+        if seen:
+            self.db.executemany("insert or ignore into seen (id) values (?)", [(i,) for i in ids])
+        existing = set()
+        for n in range(0, len(ids), 500):
+            chunk = ids[n:n+500]
+            cursor = self.db.execute("select id from jobs where id in ({})".format(", ".join("?" * len(chunk))), chunk)
+            existing.update(r[0] for r in cursor)
+        stats.added += len(rows) - len(existing)
+        stats.updated += len(existing)
+        self.db.executemany(INSERT, rows)
+
+    def _full_sync(self, qname, stats):
+        with self.db:
+            self.db.execute("create temp table if not exists seen (id integer primary key)")
+            self.db.execute("delete from seen")
+            self._store(self.client.iter_jobs(qname, "all"), stats, seen=True)
+            stats.removed += self.db.execute("delete from jobs where queue = ? and id not in (select id from seen)",
+                                             (qname,)).rowcount
+            self.db.execute("delete from seen")
+            now = time.time()
+            self.db.execute("insert or replace into queues (name, synced, full_synced) values (?, ?, ?)",
+                            (qname, now, now))
+
+    def _fetch_job(self, job_id):
+        # job records include output, which may be big and is not needed
+        return self.client.download_job(job_id, dict(stdout=_Discard(), stderr=_Discard()))
+
+    def _incremental_sync(self, qname, stats):
+        seen = set()
+        with self.db:
+            for status in ACTIVE_STATUSES:
+                jobs = list(self.client.iter_jobs(qname, status))
+                seen.update(job['id'] for job in jobs)
+                self._store(jobs, stats)
+
+            placeholders = ", ".join("?" * len(ACTIVE_STATUSES))
+            statuses = [s.capitalize() for s in ACTIVE_STATUSES]
+            cursor = self.db.execute("select id from jobs where queue = ? and status in ({})".format(placeholders),
+                                     [qname] + statuses)
+            finished = [r[0] for r in cursor if r[0] not in seen]
+
+        # jobs which are not active any more were finished, moved to
+        # another queue or deleted
+        updates = []
+        deleted = []
+        for job_id, job, error in imap_unordered(self._fetch_job, finished, self.concurrency):
+            if isinstance(error, NotFoundException):
+                deleted.append((job_id,))
+                continue
+            if error is not None:
+                stats.errors += 1
+                continue
+            updates.append(_row(job))
+        with self.db:
+            self.db.executemany(INSERT, updates)
+            self.db.executemany("delete from jobs where id = ?", deleted)
+            stats.updated += len(updates)
+            stats.removed += len(deleted)
+            self.db.execute("update queues set synced = ? where name = ?", (time.time(), qname))
+
+    def sync(self, queues=None, full=False):
+        """
+        Bring the mirror up to date with the manager, for named queues or
+        all queues. With full=True, whole job lists are downloaded even if
+        full_sync_interval has not passed yet. Returns SyncStats.
+        """
+        if queues is None:
+            queues = [q['name'] for q in self.client.get_queues()]
+        stats = SyncStats()
+        for qname in queues:
+            row = self.db.execute("select full_synced from queues where name = ?", (qname,)).fetchone()
+            if full or row is None or time.time() - row[0] >= self.full_sync_interval:
+                self._full_sync(qname, stats)
+            else:
+                self._incremental_sync(qname, stats)
+        return stats
+
+    def _where(self, filters, since=None, until=None):
+        clauses = []
+        values = []
+        for name, value in sorted(filters.items()):
+            if name not in FILTER_COLUMNS:
+                raise ValueError("Unsupported filter: {}".format(name))
+            if value is None:
+                continue
+            if name == 'status':
+                value = value.capitalize()
+            clauses.append("{} = ?".format(name))
+            values.append(value)
+        if since is not None:
+            clauses.append("create_time >= ?")
+            values.append(_time(since))
+        if until is not None:
+            clauses.append("create_time < ?")
+            values.append(_time(until))
+        if not clauses:
+            return "", values
+        return " where " + " and ".join(clauses), values
+
+    def query(self, since=None, until=None, limit=None, **filters):
+        """
+        Return list of jobs matching filters, in order of ID. Filters are
+        column=value pairs (see FILTER_COLUMNS); since and until limit
+        create_time (datetime in UTC or ISO string).
+        """
+        where, values = self._where(filters, since, until)
+        sql = "select {} from jobs{} order by id".format(", ".join(COLUMNS), where)
+        if limit is not None:
+            sql += " limit ?"
+            values.append(limit)
+        return [_job(row) for row in self.db.execute(sql, values)]
+
+    def count(self, group_by=("queue", "status"), since=None, until=None, **filters):
+        """
+        Count jobs matching filters (see query), grouped by columns.
+        Returns dictionary {tuple of column values: count}.
+        """
+        for name in group_by:
+            if name not in FILTER_COLUMNS:
+                raise ValueError("Unsupported grouping column: {}".format(name))
+        where, values = self._where(filters, since, until)
+        columns = ", ".join(group_by)
+        if not group_by:
+            return {(): self.db.execute("select count(*) from jobs" + where, values).fetchone()[0]}
+        sql = "select {0}, count(*) from jobs{1} group by {0}".format(columns, where)
+        return dict((tuple(row[:-1]), row[-1]) for row in self.db.execute(sql, values))
@@ -0,0 +1,56 @@
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+_STOP = object()
+
+def imap_unordered(func, iterable, concurrency):
+    """
+    Apply func to each item of iterable in `concurrency` worker threads.
+
+    Items are taken from iterable lazily, and no more than `concurrency`
+    of them are in flight at any time, so iterable may be an endless
+    generator. Yields (item, result, error) tuples in order of completion;
+    error is the exception raised by func, or None.
+    """
+    tasks = queue.Queue()
+    results = queue.Queue()
+
+    def worker():
+        while True:
+            item = tasks.get()
+            if item is _STOP:
+                return
+            try:
+                results.put((item, func(item), None))
+            except Exception as e:
+                results.put((item, None, e))
+
+    workers = [threading.Thread(target=worker) for i in range(concurrency)]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+
+    items = iter(iterable)
+    in_flight = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and in_flight < concurrency:
+                try:
+                    tasks.put(next(items))
+                    in_flight += 1
+                except StopIteration:
+                    exhausted = True
+            if in_flight == 0:
+                break
+            yield results.get()
+            in_flight -= 1
+    finally:
+        for thread in workers:
+            tasks.put(_STOP)
+
@@ -0,0 +1,115 @@
+
+import time
+import random
+import threading
+
+class RetryPolicy(object):
+    """
+    Retries of failed calls with exponential backoff and full jitter:
+    before retry number n (counting from 1), a random delay between 0 and
+    min(max_delay, base_delay * 2**(n-1)) seconds is made, so that many
+    clients retrying at once do not hit the manager in lockstep.
+
+    An exception with a `retry_after` attribute which is not None (see
+    CircuitOpenException) means the call was not made at all; it does not
+    use up an attempt, and the next try is made after that many seconds.
+
+    Defaults retry for about half a minute, which outlasts a restart of
+    the manager.
+    """
+    def __init__(self, attempts=8, base_delay=0.5, max_delay=10.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, retry):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (retry - 1))))
+
+    def run(self, func, retryable, deadline=None):
+        """
+        Call func(attempt, timeout) until it succeeds, raises an exception
+        for which retryable(exception) is false, attempts are exhausted or
+        `deadline` seconds pass. attempt is 0 for the first call; timeout is
+        the number of seconds left before the deadline, or None.
+        """
+        start = time.time()
+        attempt = 0
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - (time.time() - start)
+            try:
+                return func(attempt, timeout)
+            except Exception as e:
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after is not None:
+                    # jitter spreads out callers waiting for the same trial call
+                    delay = retry_after + random.uniform(0, self.base_delay)
+                else:
+                    attempt += 1
+                    if attempt >= self.attempts or not retryable(e):
+                        raise
+                    delay = self.backoff(attempt)
+                if deadline is not None and time.time() - start + delay >= deadline:
+                    raise
+                time.sleep(delay)
+
+class CircuitBreaker(object):
+    """
+    Fails calls fast while the manager seems to be down.
+
+    After `failures` consecutive failures the circuit opens, and allow()
+    returns False for `reset_timeout` seconds. Then one trial call is let
+    through; if it succeeds the circuit closes, otherwise it opens again.
+    Every allowed call must be followed by success() or failure(); a trial
+    which is not resolved within `reset_timeout` is given up, so that
+    another one can be made.
+    """
+    def __init__(self, failures=5, reset_timeout=5.0):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._count = 0
+        self._opened = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened is not None
+
+    @property
+    def retry_in(self):
+        """
+        Seconds until the next trial call is allowed.
+        """
+        with self._lock:
+            if self._opened is None or self._trial is not None:
+                # a trial call in flight may close the circuit any moment
+                return 0.0
+            return max(self.reset_timeout - (time.time() - self._opened), 0.0)
+
+    def allow(self):
+        with self._lock:
+            if self._opened is None:
+                return True
+            now = time.time()
+            if self._trial is not None:
+                if now - self._trial < self.reset_timeout:
+                    return False
+            elif now - self._opened < self.reset_timeout:
+                return False
+            self._trial = now
+            return True
+
+    def success(self):
+        with self._lock:
+            self._count = 0
+            self._opened = None
+            self._trial = None
+
+    def failure(self):
+        with self._lock:
+            self._count += 1
+            if self._trial is not None or self._count >= self.failures:
+                self._opened = time.time()
+                self._trial = None
@@ -0,0 +1,99 @@
+
+def job_terms(job):
+    """
+    Searchable terms of a job: its parameters as lower-case "name=value" strings.
+    """
+    params = job.get('params') or {}
+    return frozenset(u"{}={}".format(name, value).lower() for name, value in params.items())
+
+def job_matches(job, query, terms=job_terms):
+    """
+    Whether job would be found by SearchIndex.search(query), without an index.
+    """
+    found = terms(job)
+    return all(any(word in term for term in found) for word in query.lower().split())
+
+class SearchIndex(object):
+    """
+    Inverted index from distinct job terms (see job_terms) to job IDs, for
+    substring search.
+
+    Jobs of one queue share most of their terms, so a search only scans
+    the vocabulary of distinct terms and then takes the jobs of matching
+    ones, instead of looking at every job. The index is updated
+    incrementally when jobs are added, changed or removed; `version` is
+    increased on each change, so that users can tell whether results they
+    keep are still valid.
+    """
+    def __init__(self, terms=job_terms):
+        self.terms = terms
+        self.job_terms = {}
+        self.postings = {}
+        self.version = 0
+
+    def clear(self):
+        self.job_terms = {}
+        self.postings = {}
+        self.version += 1
+
+    def _add(self, job_id, terms):
+        self.job_terms[job_id] = terms
+        for term in terms:
+            ids = self.postings.get(term)
+            if ids is None:
+                self.postings[term] = set([job_id])
+            else:
+                ids.add(job_id)
+
+    def _remove(self, job_id, terms):
+        del self.job_terms[job_id]
+        for term in terms:
+            ids = self.postings[term]
+            ids.discard(job_id)
+            if not ids:
+                del self.postings[term]
+
+    def update(self, jobs):
+        """
+        Add jobs to the index, or re-index them if their terms changed.
+        """
+        for job in jobs:
+            job_id = job['id']
+            terms = self.terms(job)
+            old = self.job_terms.get(job_id)
+            if old == terms:
+                continue
+            if old is not None:
+                self._remove(job_id, old)
+            self._add(job_id, terms)
+        self.version += 1
+
+    def remove(self, job_ids):
+        for job_id in job_ids:
+            old = self.job_terms.get(job_id)
+            if old is not None:
+                self._remove(job_id, old)
+        self.version += 1
+
+    def search(self, query):
+        """
+        Return set of IDs of jobs which, for every whitespace-separated
+        word of query, have a term containing it, ignoring case.
+        """
+        words = query.lower().split()
+        if not words:
+            return set(self.job_terms)
+        result = None
+        # longer words are usually more selective
+        for word in sorted(words, key=len, reverse=True):
+            matching = set()
+            for term, ids in self.postings.items():
+                if word in term:
+                    matching.update(ids)
+            if result is None:
+                result = matching
+            else:
+                result &= matching
+            if not result:
+                break
+        return result
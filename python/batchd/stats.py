@@ -0,0 +1,77 @@
+
+import time
+from collections import deque
+
+# Seconds of history rates are computed over
+DEFAULT_WINDOW = 300
+
+class RollingThroughput(object):
+    """
+    Rates at which job counts grow, per queue and status, over a sliding
+    time window of stats snapshots (as returned by Client.get_all_stats).
+
+    Each snapshot only adds its difference from the previous one to running
+    totals, and differences falling out of the window are subtracted, so
+    the cost of an update does not depend on the length of the window.
+    Decreasing counts (e.g. when jobs are deleted) do not count.
+    """
+    def __init__(self, window=DEFAULT_WINDOW, statuses=("done", "failed")):
+        self.window = window
+        self.statuses = statuses
+        # (time, {(queue, status): increment}) for each snapshot but the first
+        self.history = deque()
+        self.totals = {}
+        self.last = None
+        self.last_time = None
+        self.start = None
+
+    def add(self, stats, now=None):
+        if now is None:
+            now = time.time()
+        if self.last is None:
+            self.start = now
+        else:
+            increments = {}
+            for queue, counts in stats.items():
+                previous = self.last.get(queue, {})
+                for status in self.statuses:
+                    delta = counts.get(status, 0) - previous.get(status, 0)
+                    if delta > 0:
+                        key = (queue, status)
+                        increments[key] = delta
+                        self.totals[key] = self.totals.get(key, 0) + delta
+            self.history.append((now, increments))
+        self.last = stats
+        self.last_time = now
+        while self.history and self.history[0][0] <= now - self.window:
+            self.start, increments = self.history.popleft()
+            for key, delta in increments.items():
+                total = self.totals[key] - delta
+                if total:
+                    self.totals[key] = total
+                else:
+                    del self.totals[key]
+
+    @property
+    def span(self):
+        """
+        Length of time covered by the window, in seconds.
+        """
+        if self.last_time is None:
+            return 0.0
+        return self.last_time - self.start
+
+    def rate(self, queue, status="done"):
+        """
+        Jobs per second which got into status in queue, averaged over the window.
+        """
+        span = self.span
+        if span <= 0:
+            return 0.0
+        return self.totals.get((queue, status), 0) / float(span)
+
+    def total_rate(self, status="done"):
+        span = self.span
+        if span <= 0:
+            return 0.0
+        return sum(n for (queue, s), n in self.totals.items() if s == status) / float(span)
@@ -0,0 +1,22 @@
+
+from datetime import datetime
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+def parse_time(value):
+    """
+    Fast parser for timestamps sent by batchd manager,
+    like 2017-05-01T12:30:00.123456789Z. The fractional part is optional
+    and may have any number of digits.
+    """
+    if len(value) < 20 or value[4] != '-' or value[7] != '-' or value[10] != 'T' or value[13] != ':' or value[16] != ':':
+        return datetime.strptime(value, TIME_FORMAT)
+    microsecond = 0
+    if value[19] == '.':
+        end = 20
+        while end < len(value) and value[end].isdigit():
+            end += 1
+        microsecond = int((value[20:end] + "000000")[:6])
+    return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]), microsecond)
+
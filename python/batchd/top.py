@@ -0,0 +1,274 @@
+
+"""
+Terminal monitor of a batchd manager, for hosts without a browser:
+
+    python -m batchd.top [-m URL] [-i SECONDS] [-n SAMPLES] [--once]
+
+It shows per-queue job counts, done and failed jobs per minute and failure
+rate, and per-host running jobs and status. Each poll makes two small
+requests: /stats, and a monitoring query (/monitor/batchd.host/query) for
+samples since the last one already seen, by the manager's timestamps, so
+the local clock does not matter. The manager reads that time in its local
+time zone; set manager_utc_offset in client config if it differs from
+this host's. History is kept in fixed-size ring buffers, so memory does
+not grow however long it runs.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import calendar
+import argparse
+from datetime import datetime
+from collections import deque
+
+from batchd.cli import add_client_arguments, make_client
+from batchd.times import parse_time
+
+DEFAULT_INTERVAL = 5
+# Samples kept per metric
+DEFAULT_HISTORY = 120
+# Extra seconds asked from the monitoring query before the last sample seen,
+# for samples stored late; repeated samples are skipped
+OVERLAP = 30
+
+STATUSES = ("new", "processing", "done", "failed")
+HOST_PREFIX = "batchd.host"
+
+class Ring(object):
+    """
+    Last `size` (time, value) samples of one metric.
+    """
+    __slots__ = ('samples',)
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+
+    def add(self, t, value):
+        self.samples.append((t, value))
+
+    @property
+    def last(self):
+        return self.samples[-1][1] if self.samples else None
+
+    @property
+    def span(self):
+        if len(self.samples) < 2:
+            return 0.0
+        return self.samples[-1][0] - self.samples[0][0]
+
+    def increase(self):
+        """
+        Sum of increments between samples; decreases (e.g. when jobs are
+        deleted) do not count.
+        """
+        result = 0
+        previous = None
+        for t, value in self.samples:
+            if previous is not None and value > previous:
+                result += value - previous
+            previous = value
+        return result
+
+    def rate(self):
+        """
+        Increase per second over the buffer.
+        """
+        span = self.span
+        if span <= 0:
+            return 0.0
+        return self.increase() / float(span)
+
+    def mean(self):
+        if not self.samples:
+            return None
+        return sum(value for t, value in self.samples) / float(len(self.samples))
+
+def sample_time(value):
+    """
+    Seconds since epoch of a timestamp sent by the manager.
+    """
+    dt = parse_time(value)
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+class Monitor(object):
+    """
+    Polls the manager and keeps recent history of queue counts (from /stats)
+    and of host metrics (batchd.host.NAME.jobs, batchd.host.NAME.status,
+    batchd.hosts.active, batchd.hosts.busy from the monitoring query).
+    """
+    def __init__(self, client, history=DEFAULT_HISTORY, interval=DEFAULT_INTERVAL):
+        self.client = client
+        self.history = history
+        self.interval = interval
+        # (queue, status) -> Ring
+        self.queues = {}
+        # host name -> Ring of running jobs
+        self.hosts = {}
+        self.host_status = {}
+        # "active" / "busy" -> Ring
+        self.host_totals = {}
+        # time of newest monitoring sample seen
+        self.last_sample = None
+        self.last_poll = None
+        self.error = None
+
+    def _ring(self, rings, key):
+        ring = rings.get(key)
+        if ring is None:
+            ring = rings[key] = Ring(self.history)
+        return ring
+
+    def poll(self, now=None):
+        if now is None:
+            now = time.time()
+        try:
+            self._poll_stats(now)
+            self._poll_hosts()
+        except Exception as e:
+            self.error = str(e)
+        else:
+            self.error = None
+            self.last_poll = now
+
+    def _poll_stats(self, now):
+        stats = self.client.get_all_stats()
+        for key in list(self.queues):
+            if key[0] not in stats:
+                del self.queues[key]
+        for queue, counts in stats.items():
+            for status in STATUSES:
+                self._ring(self.queues, (queue, status)).add(now, counts.get(status, 0))
+
+    def _poll_hosts(self):
+        if self.last_sample is None:
+            records = self.client.query_metrics(HOST_PREFIX, last=max(1, int(self.history * self.interval)))
+        else:
+            since = datetime.utcfromtimestamp(self.last_sample - OVERLAP)
+            records = self.client.query_metrics(HOST_PREFIX, since=since)
+        samples = sorted(((sample_time(r['time']), r) for r in records), key=lambda sample: sample[0])
+        for t, record in samples:
+            if self.last_sample is not None and t <= self.last_sample:
+                continue
+            self._add_host_sample(t, record)
+        if samples:
+            self.last_sample = max(self.last_sample or 0, samples[-1][0])
+
+    def _add_host_sample(self, t, record):
+        name = record['name']
+        if name.startswith(HOST_PREFIX + "s."):
+            self._ring(self.host_totals, name[len(HOST_PREFIX) + 2:]).add(t, record.get('value') or 0)
+            return
+        # host names may contain dots
+        host, field = name[len(HOST_PREFIX) + 1:].rsplit(".", 1)
+        if field == "jobs":
+            self._ring(self.hosts, host).add(t, record.get('value') or 0)
+        elif field == "status":
+            self.host_status[host] = record.get('text')
+
+    def queue_rows(self):
+        """
+        List of (queue, new, processing, done/min, failed/min, failure
+        percentage or None) tuples.
+        """
+        rows = []
+        for queue in sorted(set(q for q, s in self.queues)):
+            new = self.queues[(queue, "new")].last
+            processing = self.queues[(queue, "processing")].last
+            done = self.queues[(queue, "done")]
+            failed = self.queues[(queue, "failed")]
+            finished = done.increase() + failed.increase()
+            failure = 100.0 * failed.increase() / finished if finished else None
+            rows.append((queue, new, processing, done.rate() * 60, failed.rate() * 60, failure))
+        return rows
+
+    def host_rows(self):
+        """
+        List of (host, status, running jobs, mean running jobs) tuples.
+        """
+        rows = []
+        for host in sorted(set(self.hosts) | set(self.host_status)):
+            ring = self.hosts.get(host)
+            rows.append((host, self.host_status.get(host) or "-",
+                         ring.last if ring else None, ring.mean() if ring else None))
+        return rows
+
+def _num(value, fmt="{}"):
+    return "-" if value is None else fmt.format(value)
+
+def render(monitor):
+    """
+    Return screen contents as list of lines.
+    """
+    lines = []
+    header = "batchd-top: {}".format(monitor.client.manager_url)
+    if monitor.last_poll is not None:
+        header += "  updated {}".format(time.strftime("%H:%M:%S", time.localtime(monitor.last_poll)))
+    lines.append(header)
+    if monitor.error:
+        lines.append("Error: {}".format(monitor.error))
+    totals = [(name, ring.last) for name, ring in sorted(monitor.host_totals.items())]
+    if totals:
+        lines.append("Hosts: " + ", ".join("{} {}".format(value, name) for name, value in totals))
+    lines.append("")
+    lines.append("{:<24} {:>8} {:>11} {:>9} {:>11} {:>9}".format("QUEUE", "NEW", "PROCESSING", "DONE/MIN",
+                                                             "FAILED/MIN", "FAILED%"))
+    for queue, new, processing, done_rate, failed_rate, failure in monitor.queue_rows():
+        lines.append("{:<24} {:>8} {:>11} {:>9.1f} {:>11.1f} {:>9}".format(queue, _num(new), _num(processing),
+                                                                     done_rate, failed_rate,
+                                                                     _num(failure, "{:.1f}")))
+    lines.append("")
+    lines.append("{:<24} {:<12} {:>8} {:>9}".format("HOST", "STATUS", "JOBS", "AVG JOBS"))
+    for host, status, jobs, mean in monitor.host_rows():
+        lines.append("{:<24} {:<12} {:>8} {:>9}".format(host, status, _num(jobs), _num(mean, "{:.1f}")))
+    return lines
+
+def run_curses(monitor):
+    import curses
+
+    def loop(screen):
+        curses.curs_set(0)
+        screen.timeout(int(monitor.interval * 1000))
+        while True:
+            monitor.poll()
+            screen.erase()
+            height, width = screen.getmaxyx()
+            for y, line in enumerate(render(monitor)[:height]):
+                screen.addnstr(y, 0, line, width - 1)
+            screen.refresh()
+            if screen.getch() in (ord('q'), ord('Q')):
+                return
+
+    curses.wrapper(loop)
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor batchd queues and hosts")
+    parser.add_argument('-i', '--interval', type=float, default=DEFAULT_INTERVAL, help="seconds between polls")
+    parser.add_argument('-n', '--history', type=int, default=DEFAULT_HISTORY,
+                        help="number of samples rates are computed over")
+    parser.add_argument('--once', action='store_true', help="print current state once and exit")
+    add_client_arguments(parser)
+    args = parser.parse_args()
+
+    monitor = Monitor(make_client(args), args.history, args.interval)
+    try:
+        if args.once or not sys.stdout.isatty():
+            while True:
+                monitor.poll()
+                print("\n".join(render(monitor)))
+                if args.once:
+                    break
+                print()
+                time.sleep(args.interval)
+        else:
+            run_curses(monitor)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.client.close()
+    if monitor.error:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+
+"""
+Measure job submission throughput: serial do_enqueue against Client.enqueue_many,
+and deletion throughput: serial delete_job against Client.delete_jobs.
+
+Usage: python -m benchmarks.bench_enqueue [count] [concurrency] [latency]
+"""
+
+import sys
+import time
+
+from batchd.client import Client
+from benchmarks.fakemanager import FakeManager
+
+def run(count=2000, concurrency=16, latency=0.002):
+    with FakeManager(latency=latency) as manager:
+        client = Client(manager.url, pool_size=concurrency)
+        serial_count = max(count // 10, 1)
+        start = time.time()
+        for i in range(serial_count):
+            client.do_enqueue("default", "count", dict(count=str(i)))
+        serial = serial_count / (time.time() - start)
+
+        start = time.time()
+        results = client.enqueue_many("default", "count", (dict(count=str(i)) for i in range(count)),
+                                      concurrency=concurrency)
+        bulk = count / (time.time() - start)
+
+        job_ids = [job['id'] for job in client.iter_jobs("default")]
+        start = time.time()
+        for job_id in job_ids[:serial_count]:
+            client.delete_job(job_id)
+        serial_delete = serial_count / (time.time() - start)
+
+        start = time.time()
+        deleted = client.delete_jobs(job_ids[serial_count:], concurrency=concurrency)
+        bulk_delete = len(job_ids[serial_count:]) / (time.time() - start)
+        client.close()
+    failed = len([r for r in results if not r.ok]) + len(deleted.failed)
+    return dict(serial_jobs_per_s=serial, bulk_jobs_per_s=bulk,
+                serial_deletes_per_s=serial_delete, bulk_deletes_per_s=bulk_delete, failed=failed)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.002
+    result = run(count, concurrency, latency)
+    print("serial do_enqueue: {serial_jobs_per_s:.1f} jobs/s".format(**result))
+    print("enqueue_many:      {bulk_jobs_per_s:.1f} jobs/s".format(**result))
+    print("serial delete_job: {serial_deletes_per_s:.1f} jobs/s".format(**result))
+    print("delete_jobs:       {bulk_deletes_per_s:.1f} jobs/s ({failed} failed)".format(**result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+"""
+Measure time and peak memory of fetching and decoding job lists
+with Client.get_jobs (whole body) and Client.iter_jobs (streaming).
+Each measurement runs in a separate process, so that peak RSS is its own.
+
+Usage: python -m benchmarks.bench_joblist [size ...]
+"""
+
+import sys
+import json
+import time
+import resource
+import subprocess
+
+from benchmarks.fakemanager import FakeManager
+
+METHODS = ["get_jobs", "iter_jobs"]
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss = rss // 1024
+    return rss
+
+def measure(url, method):
+    """
+    Called in child process: fetch all jobs of default queue.
+    """
+    from batchd.client import Client
+    client = Client(url)
+    client.get_queues()
+    base_rss = peak_rss_kb()
+    start = time.time()
+    if method == "get_jobs":
+        count = len(client.get_jobs("default"))
+    else:
+        count = 0
+        for job in client.iter_jobs("default"):
+            count += 1
+    seconds = time.time() - start
+    return dict(count=count, seconds=seconds, peak_kb=peak_rss_kb() - base_rss)
+
+def run(sizes=(10000, 100000, 1000000), output_size=0):
+    result = {}
+    for size in sizes:
+        with FakeManager(output_size=output_size) as manager:
+            manager.store.add_jobs("default", size)
+            for method in METHODS:
+                cmd = [sys.executable, "-m", "benchmarks.bench_joblist", "--child", manager.url, method]
+                out = subprocess.check_output(cmd)
+                measured = json.loads(out.decode("utf-8"))
+                result["{}_{}_seconds".format(method, size)] = measured['seconds']
+                result["{}_{}_peak_kb".format(method, size)] = measured['peak_kb']
+    return result
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(measure(sys.argv[2], sys.argv[3])))
+        return
+    sizes = [int(s) for s in sys.argv[1:]] or [10000, 100000]
+    result = run(sizes)
+    for size in sizes:
+        for method in METHODS:
+            print("{:>9} jobs, {:9}: {:7.2f}s, peak +{} KB".format(size, method,
+                        result["{}_{}_seconds".format(method, size)], result["{}_{}_peak_kb".format(method, size)]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+"""
+Compare memory taken by job lists kept as dictionaries decoded from JSON
+and as batchd.job.Job records.
+
+Usage: python -m benchmarks.bench_memory [count] [output_size]
+"""
+
+import sys
+import gc
+import json
+import time
+import tracemalloc
+
+from batchd.job import Job
+from batchd.jsonstream import iter_array
+from benchmarks.fakemanager import make_jobs
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    result = build()
+    seconds = time.time() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size, seconds
+
+def run(count=100000, output_size=2000):
+    body = json.dumps(make_jobs(count, output_size=output_size)).encode("utf-8")
+    chunks = [body[i:i+65536] for i in range(0, len(body), 65536)]
+    dict_bytes, dict_seconds = measure(lambda: list(iter_array(chunks)))
+    job_bytes, job_seconds = measure(lambda: [Job.from_dict(item) for item in iter_array(chunks)])
+    return dict(dict_bytes_per_job=dict_bytes / float(count), job_bytes_per_job=job_bytes / float(count),
+                dict_decode_seconds=dict_seconds, job_decode_seconds=job_seconds)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    output_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    result = run(count, output_size)
+    print("dicts: {dict_bytes_per_job:.0f} bytes/job, decoded in {dict_decode_seconds:.2f}s".format(**result))
+    print("Jobs:  {job_bytes_per_job:.0f} bytes/job, decoded in {job_decode_seconds:.2f}s".format(**result))
+
+if __name__ == "__main__":
+    main()
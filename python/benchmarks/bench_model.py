@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+"""
+Measure cost of queuetable.Model.data() when repainting the whole table,
+compared to the previous implementation which formatted values on each call.
+
+Usage: python -m benchmarks.bench_model [jobs] [repaints]
+"""
+
+import sys
+import time
+from datetime import datetime
+from PyQt4 import QtGui, QtCore
+
+import common
+import queuetable
+from benchmarks.fakemanager import make_jobs
+
+def old_format_time(value):
+    if value:
+        d = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
+        return datetime.strftime(d, "%c")
+    else:
+        return "<undefined>"
+
+def old_data(model, row, column):
+    job = model.jobs[row]
+    names = [f.name for f in model.fields]
+    value = job[names[column]]
+    field = model.fields[column]
+    if isinstance(field, queuetable.TimeField):
+        return old_format_time(value)
+    return field.show(value)
+
+def repaint(model, get):
+    start = time.time()
+    for row in range(model.rowCount(None)):
+        for column in range(model.columnCount(None)):
+            get(row, column)
+    return time.time() - start
+
+def run(count=50000, repaints=3):
+    table = queuetable.Table()
+    model = table.model
+    model.setupModelData(make_jobs(count))
+    role = QtCore.Qt.DisplayRole
+
+    before = [repaint(model, lambda r, c: old_data(model, r, c)) for i in range(repaints)]
+    after = [repaint(model, lambda r, c: model.data(model.index(r, c), role)) for i in range(repaints)]
+
+    stamps = [job['create_time'] for job in model.jobs]
+    start = time.time()
+    for stamp in stamps:
+        datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+    strptime_seconds = time.time() - start
+    start = time.time()
+    for stamp in stamps:
+        common.parse_time(stamp)
+    parse_time_seconds = time.time() - start
+
+    # refresh with 1% of jobs changed
+    jobs = [dict(job) for job in model.jobs]
+    for job in jobs[::100]:
+        job['status'] = 'Done'
+    start = time.time()
+    model.updateJobs(jobs)
+    refresh_seconds = time.time() - start
+
+    return dict(cells=count * model.columnCount(None),
+                old_repaint_seconds=min(before), old_first_repaint_seconds=before[0],
+                repaint_seconds=min(after), first_repaint_seconds=after[0],
+                strptime_seconds=strptime_seconds, parse_time_seconds=parse_time_seconds,
+                refresh_seconds=refresh_seconds)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repaints = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    result = run(count, repaints)
+    print("jobs: {}, cells: {}".format(count, result['cells']))
+    print("repaint before: first {old_first_repaint_seconds:.3f}s, best {old_repaint_seconds:.3f}s".format(**result))
+    print("repaint after:  first {first_repaint_seconds:.3f}s, best {repaint_seconds:.3f}s".format(**result))
+    print("strptime: {strptime_seconds:.3f}s, common.parse_time: {parse_time_seconds:.3f}s".format(**result))
+    print("refresh with 1% changed: {refresh_seconds:.3f}s".format(**result))
+
+if __name__ == "__main__":
+    app = QtGui.QApplication(sys.argv)
+    main()
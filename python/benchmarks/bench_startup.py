@@ -0,0 +1,76 @@
+#!/usr/bin/python
+
+"""
+Measure cold start time of client scripts and modules, as a median of
+several runs in fresh interpreter processes, and check it against
+startup budgets.
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("python", ["-c", "pass"]),
+    ("import_batchd_client", ["-c", "import batchd.client"]),
+    ("enqueue_help", ["enqueue.py", "--help"]),
+    ("import_batch", ["-c", "import batch"]),
+]
+
+# Allowed time on top of bare interpreter startup, in seconds
+BUDGETS = {
+    "import_batchd_client": 0.05,
+    "enqueue_help": 0.1,
+    "import_batch": 0.3,
+}
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run(runs=5):
+    result = {}
+    with open(os.devnull, 'w') as devnull:
+        for name, args in CASES:
+            times = []
+            for i in range(runs):
+                start = time.time()
+                code = subprocess.call([sys.executable] + args, cwd=PYTHON_DIR, stdout=devnull, stderr=devnull)
+                times.append(time.time() - start)
+                if code != 0:
+                    # e.g. PyQt4 is not installed
+                    break
+            if code == 0:
+                result[name + "_seconds"] = median(times)
+    return result
+
+def check_budgets(result):
+    """
+    Return list of (case name, overhead, budget) for cases over budget.
+    """
+    base = result.get("python_seconds", 0.0)
+    exceeded = []
+    for name, budget in sorted(BUDGETS.items()):
+        seconds = result.get(name + "_seconds")
+        if seconds is not None and seconds - base > budget:
+            exceeded.append((name, seconds - base, budget))
+    return exceeded
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    result = run(runs)
+    for name, seconds in sorted(result.items()):
+        print("{:32} {:.3f}s".format(name, seconds))
+    exceeded = check_budgets(result)
+    for name, overhead, budget in exceeded:
+        print("{} is over budget: {:.3f}s > {:.3f}s".format(name, overhead, budget))
+    if exceeded:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+
+"""
+Compare request rate of per-call requests.get() against pooled Client transport.
+
+Usage: python -m benchmarks.bench_transport [count] [threads]
+"""
+
+import sys
+import time
+import threading
+import requests
+
+from batchd.client import Client
+from benchmarks.fakemanager import FakeManager
+
+def run_threads(func, count, threads):
+    per_thread = count // threads
+    workers = [threading.Thread(target=lambda: [func() for i in range(per_thread)]) for t in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.time() - start)
+
+def run(count=2000, threads=4):
+    with FakeManager() as manager:
+        url = manager.url + "/stats/default"
+
+        def unpooled():
+            rs = requests.get(url, auth=(None, None), verify=False, cert=None)
+            rs.raise_for_status()
+
+        client = Client(manager.url, pool_size=threads)
+        before = run_threads(unpooled, count, threads)
+        after = run_threads(lambda: client.get_queue_stats("default"), count, threads)
+        client.close()
+    return dict(unpooled_requests_per_s=before, pooled_requests_per_s=after)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    result = run(count, threads)
+    before, after = result['unpooled_requests_per_s'], result['pooled_requests_per_s']
+    print("requests.get per call: {:.1f} req/s".format(before))
+    print("pooled Client:         {:.1f} req/s".format(after))
+    print("speedup:               {:.2f}x".format(after / before))
+
+if __name__ == "__main__":
+    main()
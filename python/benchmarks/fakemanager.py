@@ -0,0 +1,487 @@
+
+"""
+In-process stand-in for batchd manager, used by benchmarks.
+
+It implements the client-facing part of the REST API (see REST.API): /queue,
+/queue/:name, /queue/:name/jobs, /stats, /stats/:name, /type, /type/:name,
+/jobs, /job/:id (GET, PUT, DELETE), /job/:id/results, /job/:id/results/last,
+/host, /schedule, /monitor/:prefix/query (with ?last= or ?from=&to= in local
+time, like the real manager).
+Authentication is not checked. It speaks HTTP/1.1, so that keep-alive
+connections work, and streams job lists with chunked encoding.
+
+Response latency, size of job output and rate of failed (HTTP 500) responses
+are configurable, and restarts of the manager can be simulated with outage(). Large queues can be created with Store.add_jobs(), which
+generates jobs on the fly instead of keeping them in memory.
+"""
+
+import json
+import time
+import random
+import socket
+import threading
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+STATUSES = ["New", "Processing", "Done", "Failed"]
+
+CHUNK_SIZE = 64 * 1024
+
+def make_job(job_id, queue="default", type="count", params=None, status="New", host_name=None, notes=None,
+             output_size=0):
+    """
+    Job record in the same format as returned by /queue/:name/jobs.
+    """
+    finished = status in ("Done", "Failed")
+    stdout = None
+    if finished:
+        stdout = "output of job %d\n" % job_id
+        if output_size > len(stdout):
+            stdout += "x" * (output_size - len(stdout))
+    return dict(id=job_id, seq=job_id, queue=queue, type=type,
+                params=params if params is not None else dict(count=str(job_id)),
+                status=status, exit_code=(0 if status == "Done" else 1) if finished else None,
+                host_name=host_name, user_name="bench", try_count=0, notes=notes,
+                create_time="2017-05-01T12:%02d:%02d.%06dZ" % (job_id // 60 % 60, job_id % 60, job_id % 1000000),
+                start_time=None,
+                result_time="2017-05-01T13:%02d:%02d.123456Z" % (job_id // 60 % 60, job_id % 60) if finished else None,
+                stdout=stdout,
+                stderr="" if finished else None)
+
+def make_jobs(count, queue="default", first_id=1, output_size=0):
+    return [make_job(i, queue, status=STATUSES[i % len(STATUSES)], output_size=output_size)
+            for i in range(first_id, first_id + count)]
+
+class Store(object):
+    """
+    Data of fake manager. All jobs are kept in `jobs`, except for generated
+    ones (see add_jobs).
+    """
+    def __init__(self, output_size=0):
+        self.lock = threading.Lock()
+        self.output_size = output_size
+        self.types = OrderedDict()
+        self.queues = OrderedDict()
+        self.schedules = OrderedDict()
+        self.hosts = ["localhost"]
+        self.jobs = OrderedDict()
+        # queue name -> list of (first id, count) of generated jobs
+        self.generated = {}
+        # monitoring samples as (seconds since epoch, record)
+        self.metrics = []
+        self.last_id = 0
+        self.add_type(dict(name="count", title="count", template="./test.sh $count",
+                           host_name=None, on_fail=None,
+                           params=[dict(name="count", title="count", type="Integer", default="")]))
+        self.add_schedule(dict(name="anytime", weekdays=None, time=None))
+        self.add_queue(dict(name="default", title="Default queue", enabled=True,
+                            schedule_name="anytime", host_name=None))
+
+    def add_type(self, jobtype):
+        self.types[jobtype['name']] = jobtype
+
+    def add_schedule(self, schedule):
+        self.schedules[schedule['name']] = schedule
+
+    def add_queue(self, queue):
+        queue = dict(queue)
+        queue.setdefault('title', queue['name'])
+        queue.setdefault('enabled', True)
+        queue.setdefault('host_name', None)
+        self.queues[queue['name']] = queue
+
+    def add_jobs(self, qname, count):
+        """
+        Add `count` generated jobs with all statuses to the queue.
+        """
+        with self.lock:
+            self.generated.setdefault(qname, []).append((self.last_id + 1, count))
+            self.last_id += count
+
+    def add_metric(self, name, t, value=None, text=None, kind="Gauge"):
+        """
+        Record monitoring sample taken at `t` seconds since epoch.
+        """
+        record = dict(name=name, time=time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)) + ".%06dZ" % (t % 1 * 1e6),
+                      daemon="Manager", kind=kind, value=value, text=text)
+        with self.lock:
+            self.metrics.append((t, record))
+
+    def query_metrics(self, prefix, start, end):
+        return [record for t, record in sorted(self.metrics, key=lambda m: m[0])
+                if record['name'].startswith(prefix) and start <= t <= end]
+
+    def iter_jobs(self, qname=None, status=None):
+        """
+        Iterate over jobs of queue (or all queues) in order of ID,
+        filtering by lower-case status name.
+        """
+        ranges = []
+        for name, generated in self.generated.items():
+            if qname is None or name == qname:
+                ranges.extend((first, count, name) for first, count in generated)
+        stored = [job for job in list(self.jobs.values()) if qname is None or job['queue'] == qname]
+        ranges.sort()
+        # generated ranges and stored jobs do not overlap, merge them by ID
+        pos = 0
+        for first, count, name in ranges:
+            while pos < len(stored) and stored[pos]['id'] < first:
+                job = stored[pos]
+                pos += 1
+                if status is None or job['status'].lower() == status:
+                    yield job
+            for i in range(first, first + count):
+                job_status = STATUSES[i % len(STATUSES)]
+                if status is None or job_status.lower() == status:
+                    yield make_job(i, name, status=job_status, output_size=self.output_size)
+        for job in stored[pos:]:
+            if status is None or job['status'].lower() == status:
+                yield job
+
+    def get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        for name, generated in self.generated.items():
+            for first, count in generated:
+                if first <= job_id < first + count:
+                    return make_job(job_id, name, status=STATUSES[job_id % len(STATUSES)],
+                                    output_size=self.output_size)
+        return None
+
+    def stats(self, qname):
+        result = {}
+        for name, generated in self.generated.items():
+            if name != qname:
+                continue
+            for first, count in generated:
+                for n, status in enumerate(STATUSES):
+                    # number of i in [first, first+count) with i % 4 == n
+                    k = (first + count - 1 - n) // len(STATUSES) - (first - 1 - n) // len(STATUSES)
+                    if k:
+                        result[status.lower()] = result.get(status.lower(), 0) + k
+        for job in list(self.jobs.values()):
+            if job['queue'] == qname:
+                status = job['status'].lower()
+                result[status] = result.get(status, 0) + 1
+        return result
+
+    def enqueue(self, qname, rq):
+        with self.lock:
+            self.last_id += 1
+            job = make_job(self.last_id, qname, rq.get('type'), rq.get('params', {}),
+                           host_name=rq.get('host_name'), notes=rq.get('notes'))
+            self.jobs[self.last_id] = job
+            return self.last_id
+
+    def update_job(self, job_id, changes):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if 'queue_name' in changes:
+                job['queue'] = changes.pop('queue_name')
+            job.update(changes)
+            return True
+
+    def delete_job(self, job_id):
+        with self.lock:
+            return self.jobs.pop(job_id, None) is not None
+
+class NotFound(Exception):
+    pass
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, value, code=200):
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_list(self, items):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = ["["]
+        size = 1
+        first = True
+        for item in items:
+            text = json.dumps(item)
+            if not first:
+                text = "," + text
+            first = False
+            chunk.append(text)
+            size += len(text)
+            if size >= CHUNK_SIZE:
+                self._write_chunk("".join(chunk))
+                chunk, size = [], 0
+        chunk.append("]")
+        self._write_chunk("".join(chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(("%x\r\n" % len(data)).encode("ascii") + data + b"\r\n")
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        return None
+
+    def _parse(self):
+        url = urlparse(self.path)
+        path = [p for p in url.path.split("/") if p]
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        return path, query
+
+    def _handle(self, method):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            # request body must be consumed for the connection to stay usable
+            self._read_body()
+            self._reply("fake manager error", 500)
+            return
+        path, query = self._parse()
+        try:
+            method(path, query)
+        except NotFound:
+            self._reply("not found", 404)
+
+    def _get_job_list(self, qname, query):
+        status = query.get('status', 'new')
+        if status == 'all':
+            status = None
+        jobs = self.server.store.iter_jobs(qname, status)
+        if self.server.paging:
+            after = int(query.get('after', 0))
+            limit = int(query.get('limit', 0)) or None
+            jobs = (job for job in jobs if job['id'] > after)
+            if limit is not None:
+                jobs = (job for n, job in zip(range(limit), jobs))
+        self._reply_list(jobs)
+
+    def _period(self, query):
+        def parse(value):
+            return time.mktime(time.strptime(value, "%Y-%m-%dT%H:%M:%S"))
+
+        now = time.time()
+        if 'from' in query:
+            return parse(query['from']), parse(query['to']) if 'to' in query else now
+        return now - int(query['last']), now
+
+    def _get(self, path, query):
+        store = self.server.store
+        if path == ["type"]:
+            self._reply(list(store.types.values()))
+        elif len(path) == 2 and path[0] == "type" and path[1] in store.types:
+            self._reply(store.types[path[1]])
+        elif path == ["queue"]:
+            self._reply(list(store.queues.values()))
+        elif len(path) == 2 and path[0] == "queue" and path[1] in store.queues:
+            self._reply(store.queues[path[1]])
+        elif len(path) == 3 and path[0] == "queue" and path[2] == "jobs" and path[1] in store.queues:
+            self._get_job_list(path[1], query)
+        elif path == ["jobs"]:
+            self._get_job_list(None, query)
+        elif path == ["stats"]:
+            self._reply(dict((name, store.stats(name)) for name in store.queues))
+        elif len(path) == 2 and path[0] == "stats" and path[1] in store.queues:
+            self._reply(store.stats(path[1]))
+        elif len(path) >= 2 and path[0] == "job":
+            job = store.get_job(int(path[1]))
+            if job is None:
+                raise NotFound()
+            if path[2:] == []:
+                # like the real manager, unlike REST.API: the job record
+                self._reply(job)
+                return
+            if job['result_time'] is None:
+                raise NotFound()
+            result = dict(job_id=job['id'], exit_code=job['exit_code'], stdout=job['stdout'],
+                          stderr=job['stderr'], time=job['result_time'])
+            if path[2:] == ["results"]:
+                self._reply([result])
+            elif path[2:] == ["results", "last"]:
+                self._reply(result)
+            else:
+                raise NotFound()
+        elif path == ["host"]:
+            self._reply(store.hosts)
+        elif len(path) == 3 and path[0] == "monitor" and path[2] == "query":
+            self._reply(store.query_metrics(path[1], *self._period(query)))
+        elif path == ["schedule"]:
+            self._reply(list(store.schedules.values()))
+        else:
+            raise NotFound()
+
+    def _post(self, path, query):
+        store = self.server.store
+        rq = self._read_body()
+        if path == ["queue"]:
+            store.add_queue(rq)
+            self._reply("done")
+        elif len(path) == 2 and path[0] == "queue" and path[1] in store.queues:
+            self._reply(store.enqueue(path[1], rq))
+        elif path == ["schedule"]:
+            store.add_schedule(rq)
+            self._reply("done")
+        else:
+            raise NotFound()
+
+    def _put(self, path, query):
+        store = self.server.store
+        rq = self._read_body()
+        if len(path) == 2 and path[0] == "job":
+            if not store.update_job(int(path[1]), rq):
+                raise NotFound()
+            self._reply("done")
+        else:
+            raise NotFound()
+
+    def _delete(self, path, query):
+        store = self.server.store
+        if len(path) == 2 and path[0] == "job":
+            if not store.delete_job(int(path[1])):
+                raise NotFound()
+            self._reply("done")
+        else:
+            raise NotFound()
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def do_PUT(self):
+        self._handle(self._put)
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler):
+        HTTPServer.__init__(self, address, handler)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        with self.connections_lock:
+            self.connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self):
+        """
+        Drop open keep-alive connections, as a stopped manager would.
+        """
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+class FakeManager(object):
+    """
+    Fake manager running in a background thread.
+
+    latency - delay before each response, in seconds;
+    error_rate - fraction of requests answered with HTTP 500;
+    output_size - size of stdout of finished generated jobs, in bytes;
+    paging - whether to honour ?after= and ?limit= parameters of job lists
+             (real manager does not).
+
+    Usage:
+
+        with FakeManager(latency=0.005) as manager:
+            manager.store.add_jobs("default", 100000)
+            client = Client(manager.url)
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0, error_rate=0, output_size=0, paging=False):
+        self.server = self._make_server((host, port), Store(output_size), latency, error_rate, paging)
+        self.thread = None
+
+    @staticmethod
+    def _make_server(address, store, latency, error_rate, paging):
+        server = Server(address, Handler)
+        server.store = store
+        server.latency = latency
+        server.error_rate = error_rate
+        server.paging = paging
+        return server
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def outage(self, seconds):
+        """
+        Simulate a restart: stop listening for `seconds` (connections are
+        refused meanwhile), then serve again on the same port with the same
+        data. Returns at once; the restart happens in background thread.
+        """
+        old = self.server
+        old.shutdown()
+        old.server_close()
+        old.close_connections()
+
+        def restart():
+            time.sleep(seconds)
+            self.server = self._make_server(old.server_address, old.store, old.latency,
+                                            old.error_rate, old.paging)
+            self.start()
+
+        thread = threading.Thread(target=restart)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
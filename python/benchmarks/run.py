@@ -0,0 +1,133 @@
+#!/usr/bin/python
+
+"""
+Run client benchmark suite and write results as JSON.
+
+    python -m benchmarks.run [--quick] [--output results.json] [--baseline old.json]
+
+With --baseline, results are compared to previously saved ones, and the
+exit code is 1 if any metric regressed by more than --tolerance. Metrics
+named *_per_s are better when higher, all others when lower. The exit code
+is also 1 if startup time exceeds budgets from bench_startup.BUDGETS.
+"""
+
+from __future__ import print_function
+
+import sys
+import json
+import time
+import platform
+import argparse
+import traceback
+
+def suite(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+    benchmarks = []
+
+    def transport():
+        from benchmarks import bench_transport
+        return bench_transport.run(args.requests, 4)
+    benchmarks.append(("transport", transport))
+
+    def enqueue():
+        from benchmarks import bench_enqueue
+        return bench_enqueue.run(args.requests, 16)
+    benchmarks.append(("enqueue", enqueue))
+
+    def joblist():
+        from benchmarks import bench_joblist
+        return bench_joblist.run(sizes)
+    benchmarks.append(("joblist", joblist))
+
+    def memory():
+        from benchmarks import bench_memory
+        return bench_memory.run(sizes[0])
+    benchmarks.append(("memory", memory))
+
+    def model():
+        from PyQt4 import QtGui
+        from benchmarks import bench_model
+        app = QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+        return bench_model.run(sizes[0])
+    benchmarks.append(("model", model))
+
+    def startup():
+        from benchmarks import bench_startup
+        return bench_startup.run()
+    benchmarks.append(("startup", startup))
+
+    return benchmarks
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results['benchmarks'].items():
+        old_metrics = baseline.get('benchmarks', {}).get(name) or {}
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            if metric.endswith("_per_s"):
+                change = (old - value) / float(old)
+            else:
+                change = (value - old) / float(old)
+            if change > tolerance:
+                regressions.append((name, metric, old, value, change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="batchd python client benchmarks")
+    parser.add_argument('--quick', action='store_true', help="small sizes only")
+    parser.add_argument('--sizes', default=None, help="comma-separated job list sizes (default: 10000,100000,1000000)")
+    parser.add_argument('--requests', type=int, default=None, help="number of requests for throughput benchmarks")
+    parser.add_argument('--only', default=None, help="comma-separated names of benchmarks to run")
+    parser.add_argument('-o', '--output', default=None, help="file to write JSON results to (default: stdout)")
+    parser.add_argument('--baseline', default=None, help="JSON results to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+    if args.sizes is None:
+        args.sizes = "10000" if args.quick else "10000,100000,1000000"
+    if args.requests is None:
+        args.requests = 500 if args.quick else 2000
+
+    only = args.only.split(",") if args.only else None
+    results = dict(meta=dict(time=time.strftime("%Y-%m-%dT%H:%M:%S"), python=platform.python_version(),
+                             platform=platform.platform(), sizes=args.sizes, requests=args.requests),
+                   benchmarks={}, errors={})
+    for name, benchmark in suite(args):
+        if only and name not in only:
+            continue
+        print("Running {}...".format(name), file=sys.stderr)
+        try:
+            results['benchmarks'][name] = benchmark()
+        except Exception as e:
+            traceback.print_exc()
+            results['errors'][name] = str(e)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failed = False
+    if 'startup' in results['benchmarks']:
+        from benchmarks import bench_startup
+        for name, overhead, budget in bench_startup.check_budgets(results['benchmarks']['startup']):
+            print("OVER BUDGET {}: {:.3f}s > {:.3f}s".format(name, overhead, budget), file=sys.stderr)
+            failed = True
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, old, value, change in regressions:
+            print("REGRESSION {}.{}: {} -> {} ({:+.0%})".format(name, metric, old, value, change), file=sys.stderr)
+        if regressions:
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
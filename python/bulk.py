@@ -0,0 +1,84 @@
+
+import time
+from PyQt4 import QtGui, QtCore
+
+from batchd.client import BulkResult
+
+# Minimal interval between progress updates, in seconds
+PROGRESS_INTERVAL = 0.1
+
+class BulkThread(QtCore.QThread):
+    """
+    Runs func(job_id) for many jobs in background, with bounded concurrency
+    (see Client.iter_bulk). IDs are obtained by calling select() in the
+    thread too, since listing a big queue takes time. The operation can be
+    cancelled; jobs in flight are still finished then.
+    """
+    selected = QtCore.pyqtSignal(int)
+    progress = QtCore.pyqtSignal(int)
+    done = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(object)
+
+    def __init__(self, client, func, select, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.client = client
+        self.func = func
+        self.select = select
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _job_ids(self, job_ids):
+        for job_id in job_ids:
+            if self.cancelled:
+                return
+            yield job_id
+
+    def run(self):
+        try:
+            job_ids = self.select()
+        except Exception as e:
+            self.error.emit(e)
+            return
+        self.selected.emit(len(job_ids))
+        result = BulkResult()
+        last_report = 0
+        count = 0
+        for job_id, error in self.client.iter_bulk(self.func, self._job_ids(job_ids)):
+            result.add(job_id, error)
+            count += 1
+            now = time.time()
+            if now - last_report >= PROGRESS_INTERVAL:
+                self.progress.emit(count)
+                last_report = now
+        self.progress.emit(count)
+        self.done.emit(result)
+
+class BulkProgress(QtGui.QProgressDialog):
+    """
+    Progress dialog of BulkThread; Cancel button cancels the operation.
+    """
+    def __init__(self, thread, label, parent=None):
+        QtGui.QProgressDialog.__init__(self, label, "Cancel", 0, 0, parent)
+        self.setWindowModality(QtCore.Qt.WindowModal)
+        self.setMinimumDuration(500)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        thread.selected.connect(self.setMaximum)
+        thread.progress.connect(self.setValue)
+        thread.finished.connect(self.close)
+        self.canceled.connect(thread.cancel)
+
+def summary(result, action="deleted"):
+    """
+    Text describing BulkResult for message boxes.
+    """
+    text = "{} jobs {}.".format(len(result.done), action)
+    if result.missing:
+        text += "\n{} jobs did not exist.".format(len(result.missing))
+    if result.failed:
+        errors = sorted(set(str(e) for e in result.failed.values()))
+        text += "\n{} jobs failed: {}".format(len(result.failed), "; ".join(errors[:3]))
+    return text
@@ -1,9 +1,11 @@
 from PyQt4 import QtGui, QtCore
 from datetime import datetime
 
+from batchd.times import parse_time
+
 def format_time(value):
     if value:
-        d = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
+        d = parse_time(value)
         return unicode(datetime.strftime(d, "%c"), "utf-8")
     else:
         return "<undefined>"
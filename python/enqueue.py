@@ -1,34 +1,255 @@
 #!/usr/bin/python
 
+"""
+Put jobs into batchd queues.
+
+Single job:
+
+    enqueue.py QUEUE TYPE name=value ...
+
+Bulk ingestion of job specifications from JSONL or CSV file (or stdin):
+
+    enqueue.py -q QUEUE -t TYPE -i jobs.jsonl --checkpoint jobs.ckpt
+
+Each JSONL line is either a job dictionary (with queue, type, params and
+optionally host_name keys) or just a dictionary of params. Each CSV row is a
+dictionary of params, except that queue, type and host_name columns set job
+fields. -q and -t provide defaults for jobs which do not specify them.
+
+With --checkpoint, numbers of processed input records are saved periodically,
+and running the same command again continues after the last saved record.
+Each job gets an idempotency key made of the checkpoint's run ID and the
+record number, so records which were submitted after the last save are
+found in the queue instead of being submitted again.
+Jobs which could not be submitted are written to FILE.failed (with --checkpoint)
+or reported to stderr.
+"""
+
+from __future__ import print_function
+
+import os
 import sys
-import requests
+import csv
 import json
+import time
+import uuid
+import argparse
+from collections import deque
 
-URL='http://localhost:9681/queue'
+from batchd.cli import add_client_arguments, make_client
 
-def do_enqueue(qname, typename, params):
-    rq = dict(queue = qname, type=typename, params=params)
-    url = URL + "/" + qname
-    print(url)
-    print(rq)
-    rs = requests.put(url, data=json.dumps(rq))
-    print(rs.text)
+CHECKPOINT_INTERVAL = 5
+REPORT_INTERVAL = 1
+LATENCY_WINDOW = 1000
 
 def parse_params(strs):
     result = {}
     for string in strs:
-        name, value = string.split("=")
+        name, value = string.split("=", 1)
         result[name] = value
     return result
 
+def read_jsonl(stream):
+    # lines are decoded in to_job, so that malformed ones are reported as failed
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield row
+
+JOB_FIELDS = ('queue', 'type', 'host_name')
+
+def to_job(record, queue, type):
+    if not isinstance(record, dict):
+        record = json.loads(record)
+        if not isinstance(record, dict):
+            raise ValueError("Job specification is not a JSON object: {}".format(json.dumps(record)))
+    job = dict((k, record[k]) for k in JOB_FIELDS if record.get(k))
+    if 'params' in record:
+        job['params'] = record['params']
+    else:
+        job['params'] = dict((k, v) for k, v in record.items() if k not in JOB_FIELDS)
+    job.setdefault('queue', queue)
+    job.setdefault('type', type)
+    if not job['queue'] or not job['type']:
+        raise ValueError("Queue or job type is not specified for job: {}".format(record))
+    return job
+
+class Checkpoint(object):
+    """
+    Set of processed input record numbers, stored as the number of records
+    processed without gaps plus the numbers of records processed after the gap,
+    and a random ID of the run, which stays the same when it is resumed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = 0
+        self.extra = set()
+        self.saved = time.time()
+        self.resumed = False
+        self.run_id = uuid.uuid4().hex
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.done = data['done']
+            self.extra = set(data['extra'])
+            # checkpoints of older versions have no run ID
+            if 'run_id' in data:
+                self.run_id = data['run_id']
+                self.resumed = True
+
+    def key(self, index):
+        """
+        Idempotency key of job made from input record number index.
+        """
+        return "{}:{}".format(self.run_id, index)
+
+    def is_done(self, index):
+        return index < self.done or index in self.extra
+
+    def add(self, index):
+        self.extra.add(index)
+        while self.done in self.extra:
+            self.extra.remove(self.done)
+            self.done += 1
+        if time.time() - self.saved >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.saved = time.time()
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(dict(run_id=self.run_id, done=self.done, extra=sorted(self.extra)), f)
+        os.rename(tmp, self.path)
+
+class Reporter(object):
+    """
+    Live throughput and latency report to stderr.
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.reported = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.done = 0
+        self.failed = 0
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        values = sorted(self.latencies)
+        return values[min(int(len(values) * p), len(values)-1)] * 1000
+
+    def add(self, ok, latency):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        self.latencies.append(latency)
+        if time.time() - self.reported >= REPORT_INTERVAL:
+            self.report()
+
+    def report(self, end="\r"):
+        self.reported = time.time()
+        elapsed = self.reported - self.start
+        rate = (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+        msg = "{} submitted, {} failed, {:.1f} jobs/s, latency p50 {:.0f} ms, p95 {:.0f} ms".format(
+                self.done, self.failed, rate, self.percentile(0.5), self.percentile(0.95))
+        print(msg, end=end, file=sys.stderr)
+        sys.stderr.flush()
+
+def ingest(client, records, args):
+    checkpoint = Checkpoint(args.checkpoint)
+    if not checkpoint.resumed:
+        # keep the run ID even if the run is interrupted before the first save
+        checkpoint.save()
+    failed_file = None
+    if args.checkpoint:
+        failed_file = open(args.checkpoint + ".failed", 'a')
+    reporter = Reporter()
+
+    def fail(index, job, error):
+        failure = dict(record=index, job=job, error=str(error))
+        if failed_file:
+            failed_file.write(json.dumps(failure) + "\n")
+        else:
+            print("\nFailed: {}".format(json.dumps(failure)), file=sys.stderr)
+
+    # results are indexed by position among submitted jobs,
+    # map them back to input record numbers
+    pending = {}
+
+    def jobs():
+        position = 0
+        for index, record in enumerate(records):
+            if checkpoint.is_done(index):
+                continue
+            try:
+                job = to_job(record, args.queue, args.type)
+            except ValueError as e:
+                fail(index, record, e)
+                reporter.add(False, 0.0)
+                checkpoint.add(index)
+                continue
+            pending[position] = index
+            position += 1
+            yield job
+
+    try:
+        results = client.iter_enqueue_jobs(jobs(), concurrency=args.concurrency,
+                                           key=lambda position, job: checkpoint.key(pending[position]),
+                                           check_existing=checkpoint.resumed)
+        for result in results:
+            index = pending.pop(result.index)
+            if not result.ok:
+                fail(index, result.job, result.error)
+            reporter.add(result.ok, result.latency)
+            checkpoint.add(index)
+    finally:
+        checkpoint.save()
+        if failed_file:
+            failed_file.close()
+        reporter.report(end="\n")
+    return reporter.failed == 0
+
 def main():
-    print(sys.argv)
-    qname = sys.argv[1]
-    typename = sys.argv[2]
-    params = sys.argv[3:]
-    params = parse_params(params)
+    parser = argparse.ArgumentParser(description="Put jobs into batchd queues")
+    parser.add_argument('job', nargs='*', help="QUEUE TYPE name=value ... for single job")
+    parser.add_argument('-q', '--queue', help="default queue name")
+    parser.add_argument('-t', '--type', help="default job type name")
+    parser.add_argument('-i', '--input', help="file with job specifications, - for stdin")
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], help="input format (default: by file extension, jsonl for stdin)")
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help="maximum number of requests in flight")
+    parser.add_argument('--checkpoint', help="checkpoint file for resuming interrupted ingestion")
+    add_client_arguments(parser)
+    args = parser.parse_args()
+
+    client = make_client(args)
+    client.pool_size = max(client.pool_size, args.concurrency)
+
+    if args.input is None:
+        if len(args.job) < 2:
+            parser.error("either QUEUE TYPE arguments or --input must be provided")
+        qname, typename = args.job[0], args.job[1]
+        print(client.do_enqueue(qname, typename, parse_params(args.job[2:])))
+        return
 
-    do_enqueue(qname, typename, params)
+    fmt = args.format
+    if fmt is None:
+        fmt = 'csv' if args.input.endswith(".csv") else 'jsonl'
+    reader = read_csv if fmt == 'csv' else read_jsonl
+    if args.input == "-":
+        ok = ingest(client, reader(sys.stdin), args)
+    else:
+        with open(args.input) as stream:
+            ok = ingest(client, reader(stream), args)
+    client.close()
+    if not ok:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,6 @@
 
+import json
+import hashlib
 from PyQt4 import QtGui, QtCore
 
 class InputFileWidget(QtGui.QWidget):
@@ -74,14 +76,20 @@ def create_widget(param, parent=None, readonly=False):
     else:
         raise Exception("Unknown parameter type: " + param_type)
 
-    dflt = param['default']
-    if dflt:
-        widget.setText(dflt)
-
+    reset_widget(param, widget)
     widget.setReadOnly(readonly)
     
     return title, widget
 
+def reset_widget(param, widget):
+    dflt = param['default']
+    if dflt:
+        widget.setText(dflt)
+    elif isinstance(widget, IntEditor):
+        widget.setValue(widget.minimum())
+    else:
+        widget.setText("")
+
 def create_form(params, widgets_dict, parent=None, readonly=False):
     result = QtGui.QWidget(parent)
     layout = QtGui.QFormLayout()
@@ -94,3 +102,57 @@ def create_form(params, widgets_dict, parent=None, readonly=False):
 
     return result
 
+
+def schema_hash(jobtype):
+    """
+    Hash of job type parameters description, which changes when parameters
+    are added, removed or changed on the manager.
+    """
+    text = json.dumps(jobtype['params'], sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class FormCache(object):
+    """
+    Parameter forms of job types, built once and reused. Forms are keyed by
+    job type name, schema_hash() of its parameters and readonly flag, so
+    a form is built again after the type is changed on the manager.
+    A form can be used by one window at a time.
+    """
+    def __init__(self):
+        # (name, readonly) -> (hash, form, widgets dict)
+        self._forms = {}
+
+    def form(self, jobtype, parent=None, readonly=False):
+        """
+        Return (form, widgets dict) for job type, with values reset to
+        defaults. A cached form is reparented to parent.
+        """
+        key = (jobtype['name'], readonly)
+        digest = schema_hash(jobtype)
+        cached = self._forms.get(key)
+        if cached is not None and cached[0] == digest:
+            _, form, widgets = cached
+            for param in jobtype['params']:
+                reset_widget(param, widgets[param['name']])
+            if form.parent() is not parent:
+                form.setParent(parent)
+            return form, widgets
+        if cached is not None:
+            cached[1].deleteLater()
+        widgets = {}
+        form = create_form(jobtype['params'], widgets, parent, readonly)
+        self._forms[key] = (digest, form, widgets)
+        return form, widgets
+
+    def retain(self, jobtypes):
+        """
+        Drop forms of job types which are not in the list or changed.
+        """
+        current = dict((t['name'], schema_hash(t)) for t in jobtypes)
+        for key, (digest, form, widgets) in list(self._forms.items()):
+            if current.get(key[0]) != digest:
+                del self._forms[key]
+                form.deleteLater()
+
+    def clear(self):
+        self.retain([])
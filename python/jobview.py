@@ -3,12 +3,20 @@ from PyQt4 import QtGui, QtCore
 
 import common
 import jobedit
+import logview
+
+# Output downloads still running, possibly for already closed dialogs
+_fetching = set()
 
 class JobView(QtGui.QDialog):
-    def __init__(self, job, jobtype, parent=None):
+    def __init__(self, job, jobtype, client, parent=None, forms=None):
         QtGui.QDialog.__init__(self, parent)
         self.job = job
         self.jobtype = jobtype
+        self.client = client
+        self.logs = {}
+        self._thread = None
+        self.form = None
         self.layout = QtGui.QFormLayout()
         self.setLayout(self.layout)
 
@@ -19,19 +27,27 @@ class JobView(QtGui.QDialog):
         self.status_editor = self._line_editor('status', "Status:")
 
         job_params = job['params']
-        print job_params
-        for param in jobtype['params']:
-            title, widget = jobedit.create_widget(param, parent=self, readonly=True)
-            name = param['name']
-            widget.setText(job_params.get(name, ""))
-            self.layout.addRow(title, widget)
+        if forms is not None:
+            # forms cache keeps the form after the dialog is closed
+            self.form, widgets = forms.form(jobtype, self, readonly=True)
+            for name, widget in widgets.iteritems():
+                widget.setText(job_params.get(name, ""))
+            self.layout.addRow(self.form)
+            self.form.show()
+        else:
+            for param in jobtype['params']:
+                title, widget = jobedit.create_widget(param, parent=self, readonly=True)
+                name = param['name']
+                widget.setText(job_params.get(name, ""))
+                self.layout.addRow(title, widget)
 
         self.create_time_editor = self._time_editor('create_time', "Created:")
         self.result_time_editor = self._time_editor('result_time', "Finished:")
         self.exitcode_editor = self._line_editor('exit_code', "Exit code:")
 
-        self.stdout_editor = self._text_editor('stdout', "Output:")
-        self.stderr_editor = self._text_editor('stderr', "Errors:")
+        self.stdout_view = self._log_view("Output:")
+        self.stderr_view = self._log_view("Errors:")
+        self._fetch_logs()
 
     def _line_editor(self, name, title):
         return common.mk_line_editor(self, name, title, self.job[name], readonly=True)
@@ -43,14 +59,55 @@ class JobView(QtGui.QDialog):
         editor.setReadOnly(True)
         return editor
 
-    def _text_editor(self, name, title):
-        editor = QtGui.QTextEdit(self)
-        self.layout.addRow(title, editor)
-        value = self.job[name]
-        if isinstance(value, str):
-            value = unicode(value, "utf-8")
-        if value:
-            editor.setText(value)
-        editor.setReadOnly(True)
-        return editor
+    def _log_view(self, title):
+        view = logview.LogView(self)
+        self.layout.addRow(title, view)
+        return view
+
+    def _fetch_logs(self):
+        # output is downloaded on demand, as it may be huge
+        if not self.job['result_time']:
+            self.stdout_view.setMessage("Job was not executed yet")
+            self.stderr_view.setMessage("Job was not executed yet")
+            return
+        self.stdout_view.setMessage("Loading...")
+        self.stderr_view.setMessage("Loading...")
+        thread = logview.LogFetchThread(self.client, self.job['id'])
+        thread.fetched.connect(self._on_logs_fetched)
+        thread.error.connect(self._on_logs_error)
+        thread.finished.connect(lambda: _fetching.discard(thread))
+        _fetching.add(thread)
+        self._thread = thread
+        thread.start()
+
+    def _on_logs_fetched(self, result, logs):
+        self.logs = logs
+        self.stdout_view.setLog(logs['stdout'])
+        self.stderr_view.setLog(logs['stderr'])
+
+    def _on_logs_error(self, error):
+        message = "Can't load output: {}".format(error)
+        self.stdout_view.setMessage(message)
+        self.stderr_view.setMessage(message)
+
+    def done(self, result):
+        if self._thread is not None and self._thread.isRunning():
+            # let the download finish, and close what it fetched
+            self._thread.fetched.disconnect(self._on_logs_fetched)
+            self._thread.error.disconnect(self._on_logs_error)
+            self._thread.fetched.connect(_close_logs)
+        self.stdout_view.clear()
+        self.stderr_view.clear()
+        for log in self.logs.values():
+            log.close()
+        self.logs = {}
+        if self.form is not None:
+            self.form.hide()
+            self.layout.removeWidget(self.form)
+            self.form.setParent(None)
+            self.form = None
+        QtGui.QDialog.done(self, result)
 
+def _close_logs(result, logs):
+    for log in logs.values():
+        log.close()
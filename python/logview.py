@@ -0,0 +1,146 @@
+
+from PyQt4 import QtGui, QtCore
+
+from batchd.logfile import load_logs
+
+# Longest part of a line shown, in bytes
+MAX_LINE_LENGTH = 4096
+
+class LogModel(QtCore.QAbstractListModel):
+    """
+    List model over batchd.logfile.LogFile. Views only ask for lines
+    which are visible, so only those are read and decoded.
+    """
+    def __init__(self, log, parent=None):
+        QtCore.QAbstractListModel.__init__(self, parent)
+        self.log = log
+
+    def rowCount(self, parent):
+        if self.log is None:
+            return 0
+        return self.log.line_count
+
+    def data(self, index, role):
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self.log.line(index.row(), MAX_LINE_LENGTH)
+
+class LogView(QtGui.QWidget):
+    """
+    Viewer of job output with search, jump to error and jump to end.
+    """
+    def __init__(self, parent=None):
+        QtGui.QWidget.__init__(self, parent)
+        self.log = None
+        layout = QtGui.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+        tools = QtGui.QHBoxLayout()
+        self.search = QtGui.QLineEdit(self)
+        self.search.setPlaceholderText("Search")
+        self.search.returnPressed.connect(self._on_next)
+        tools.addWidget(self.search)
+        self.regex = QtGui.QCheckBox("Regex", self)
+        tools.addWidget(self.regex)
+        for title, handler in [("Previous", self._on_previous), ("Next", self._on_next),
+                               ("Next error", self._on_error), ("Tail", self._on_tail)]:
+            button = QtGui.QPushButton(title, self)
+            button.clicked.connect(handler)
+            tools.addWidget(button)
+        layout.addLayout(tools)
+
+        self.list = QtGui.QListView(self)
+        # with uniform item sizes, the view does not measure every line
+        self.list.setUniformItemSizes(True)
+        self.list.setFont(QtGui.QFont("Monospace"))
+        self.list.setSelectionMode(QtGui.QAbstractItemView.SingleSelection)
+        self.model = LogModel(None, self)
+        self.list.setModel(self.model)
+        layout.addWidget(self.list)
+
+        self.status = QtGui.QLabel(self)
+        layout.addWidget(self.status)
+
+    def setLog(self, log):
+        self.log = log
+        self.model = LogModel(log, self)
+        self.list.setModel(self.model)
+        if log.line_count:
+            self.status.setText("{} lines, {} bytes".format(log.line_count, log.size))
+        else:
+            self.status.setText("No output")
+
+    def clear(self):
+        self.log = None
+        self.model = LogModel(None, self)
+        self.list.setModel(self.model)
+
+    def setMessage(self, text):
+        self.status.setText(text)
+
+    def _current_line(self):
+        index = self.list.currentIndex()
+        if index.isValid():
+            return index.row()
+        return -1
+
+    def _select(self, line, not_found):
+        if line is None:
+            self.status.setText(not_found)
+            return
+        index = self.model.index(line)
+        self.list.setCurrentIndex(index)
+        self.list.scrollTo(index, QtGui.QAbstractItemView.PositionAtCenter)
+        self.status.setText("Line {} of {}".format(line + 1, self.log.line_count))
+
+    def _pattern(self):
+        text = unicode(self.search.text())
+        if not text or self.log is None:
+            return None
+        try:
+            return self.log.compile(text, regex=self.regex.isChecked())
+        except Exception as e:
+            self.status.setText("Invalid search pattern: {}".format(e))
+            return None
+
+    def _on_next(self):
+        pattern = self._pattern()
+        if pattern is not None:
+            self._select(self.log.find(pattern, self._current_line() + 1), "Not found")
+
+    def _on_previous(self):
+        pattern = self._pattern()
+        if pattern is not None:
+            start = self._current_line()
+            if start < 0:
+                start = self.log.line_count
+            self._select(self.log.find(pattern, start, backwards=True), "Not found")
+
+    def _on_error(self):
+        if self.log is not None:
+            self._select(self.log.find_error(self._current_line() + 1), "No more errors")
+
+    def _on_tail(self):
+        if self.log is not None and self.log.line_count:
+            self._select(self.log.line_count - 1, None)
+
+class LogFetchThread(QtCore.QThread):
+    """
+    Downloads output of last execution of a job into temporary files,
+    and indexes them, in background.
+    """
+    fetched = QtCore.pyqtSignal(object, object)
+    error = QtCore.pyqtSignal(object)
+
+    def __init__(self, client, job_id):
+        QtCore.QThread.__init__(self)
+        self.client = client
+        self.job_id = job_id
+
+    def run(self):
+        try:
+            result, logs = load_logs(self.client, self.job_id)
+        except Exception as e:
+            self.error.emit(e)
+        else:
+            self.fetched.emit(result, logs)
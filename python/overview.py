@@ -0,0 +1,113 @@
+
+from PyQt4 import QtGui, QtCore
+
+import refresh
+from batchd.stats import RollingThroughput
+
+STATUS_COLUMNS = ["new", "processing", "done", "failed"]
+
+HEADERS = ["Queue", "New", "Processing", "Done", "Failed", "Done/min", "Failed/min"]
+
+class OverviewModel(QtCore.QAbstractTableModel):
+    """
+    Job counts and throughput of all queues, one row per queue.
+    """
+    def __init__(self, parent=None):
+        QtCore.QAbstractTableModel.__init__(self, parent)
+        self.queues = []
+        self.rows = []
+        self.throughput = RollingThroughput()
+
+    def rowCount(self, parent):
+        return len(self.rows)
+
+    def columnCount(self, parent):
+        return len(HEADERS)
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return self.rows[index.row()][index.column()]
+        if role == QtCore.Qt.TextAlignmentRole and index.column() > 0:
+            return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
+
+    def headerData(self, section, orientation, role):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return HEADERS[section]
+
+    def _row(self, name, counts):
+        row = [name]
+        row.extend(counts.get(status, 0) for status in STATUS_COLUMNS)
+        for status in ("done", "failed"):
+            row.append("{:.1f}".format(self.throughput.rate(name, status) * 60))
+        return row
+
+    def updateStats(self, stats):
+        """
+        Take a new snapshot of all queues' stats. Views are notified only
+        about rows which changed.
+        """
+        self.throughput.add(stats)
+        queues = sorted(stats.keys())
+        rows = [self._row(name, stats[name]) for name in queues]
+        if queues != self.queues:
+            self.beginResetModel()
+            self.queues = queues
+            self.rows = rows
+            self.endResetModel()
+            return
+        last_column = len(HEADERS) - 1
+        for n, row in enumerate(rows):
+            if row != self.rows[n]:
+                self.rows[n] = row
+                self.dataChanged.emit(self.index(n, 0), self.index(n, last_column))
+
+    def totals(self):
+        result = dict((status, sum(row[i+1] for row in self.rows)) for i, status in enumerate(STATUS_COLUMNS))
+        result['done_rate'] = self.throughput.total_rate("done") * 60
+        result['failed_rate'] = self.throughput.total_rate("failed") * 60
+        return result
+
+class OverviewWindow(QtGui.QDialog):
+    """
+    Non-modal window with stats of all queues, refreshed with a single
+    request to the manager each time.
+    """
+    def __init__(self, client, parent=None):
+        QtGui.QDialog.__init__(self, parent)
+        self.setWindowTitle("Queues overview")
+        self.client = client
+        layout = QtGui.QVBoxLayout()
+        self.setLayout(layout)
+
+        self.model = OverviewModel(self)
+        self.table = QtGui.QTableView(self)
+        self.table.setModel(self.model)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.summary = QtGui.QLabel(self)
+        layout.addWidget(self.summary)
+
+        self.poller = refresh.StatsPoller(client, self)
+        self.poller.refreshed.connect(self._on_refreshed)
+        self.poller.failed.connect(self._on_failed)
+
+    def showEvent(self, event):
+        QtGui.QDialog.showEvent(self, event)
+        self.poller.refresh()
+
+    def hideEvent(self, event):
+        QtGui.QDialog.hideEvent(self, event)
+        self.poller.stop()
+
+    def _on_refreshed(self, stats):
+        self.model.updateStats(stats)
+        totals = self.model.totals()
+        self.summary.setText("Total: {new} new, {processing} processing, {done} done, {failed} failed; "
+                             "{done_rate:.1f} done/min, {failed_rate:.1f} failed/min".format(**totals))
+
+    def _on_failed(self, error):
+        self.summary.setText("Can't refresh stats: {}".format(error))
@@ -0,0 +1,311 @@
+
+"""
+Opt-in profiling of the GUI (batch.py --profile): timings of hot code
+paths, per-refresh breakdown of queue refreshes and detection of event loop
+stalls. Collected data is shown in ProfilePanel and can be saved as a JSON
+trace file to attach to bug reports.
+"""
+
+import sys
+import json
+import time
+import threading
+import traceback
+import functools
+from collections import deque
+
+from PyQt4 import QtGui, QtCore
+
+# Main thread blocked longer than this, in seconds, is recorded as a stall
+DEFAULT_STALL_THRESHOLD = 0.2
+# Interval of the main thread heartbeat, in milliseconds
+HEARTBEAT_INTERVAL = 20
+# Number of stalls and refreshes kept
+HISTORY_SIZE = 200
+
+class _Timer(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        return dict(count=self.count, total=self.total, max=self.max,
+                    mean=self.total / self.count if self.count else None)
+
+class StallWatchdog(object):
+    """
+    Detects stalls of the Qt event loop. A timer in the main thread updates
+    a heartbeat; a background thread checks it, and when the heartbeat is
+    older than `threshold` seconds, records the stack of the main thread.
+    Duration of the stall is recorded when the event loop runs again.
+    """
+    def __init__(self, threshold=DEFAULT_STALL_THRESHOLD, parent=None):
+        self.threshold = threshold
+        self.stalls = deque(maxlen=HISTORY_SIZE)
+        self._main_ident = threading.current_thread().ident
+        self._beat = time.time()
+        self._current = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.timer = QtCore.QTimer(parent)
+        self.timer.setInterval(HEARTBEAT_INTERVAL)
+        self.timer.timeout.connect(self._on_heartbeat)
+
+    def start(self):
+        self._beat = time.time()
+        self._stopped.clear()
+        self.timer.start()
+        self._thread = threading.Thread(target=self._watch, name="stall-watchdog")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.timer.stop()
+        self._stopped.set()
+
+    def _on_heartbeat(self):
+        now = time.time()
+        with self._lock:
+            if self._current is not None:
+                self._current['duration'] = now - self._current['start']
+                self._current = None
+            self._beat = now
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 4):
+            now = time.time()
+            with self._lock:
+                if self._current is not None or now - self._beat < self.threshold:
+                    continue
+                frame = sys._current_frames().get(self._main_ident)
+                stack = traceback.format_stack(frame) if frame is not None else []
+                self._current = dict(start=self._beat, duration=None, stack=stack)
+                self.stalls.append(self._current)
+
+    def to_json(self):
+        with self._lock:
+            return [dict(stall) for stall in self.stalls]
+
+    def reset(self):
+        with self._lock:
+            self.stalls.clear()
+
+class Profiler(object):
+    """
+    Collects timings of named code paths (see timed and instrument),
+    per-refresh counters of the queue view and stalls of the event loop.
+
+    Per refresh it records: `network` - time until response headers of the
+    job list request; `decode` - remaining time of fetching the job list,
+    i.e. reading and decoding the body; `model_update` - time of updating
+    the job table in the GUI thread.
+    """
+    def __init__(self, stall_threshold=DEFAULT_STALL_THRESHOLD):
+        self.started = time.time()
+        self.timers = {}
+        self.refreshes = deque(maxlen=HISTORY_SIZE)
+        self.watchdog = StallWatchdog(stall_threshold)
+        self.client = None
+        # queue name -> (network, decode) of last refresh's job list fetch
+        self._fetches = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = _Timer()
+            timer.add(seconds)
+
+    def timed(self, name, func):
+        """
+        Wrap func so that its calls are timed under name.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_time(name, time.time() - start)
+        return wrapper
+
+    def instrument(self, owner, attr, name=None):
+        """
+        Replace function or method `attr` of class or module `owner` with
+        its timed version. Classes must be instrumented before their
+        methods are connected to signals.
+        """
+        if name is None:
+            name = "{}.{}".format(owner.__name__, attr)
+        setattr(owner, attr, self.timed(name, getattr(owner, attr)))
+
+    def install(self, client, window_class):
+        """
+        Instrument hot paths of main window class, job table, forms and
+        client, and start the stall watchdog. Must be called before the
+        main window is created.
+        """
+        import queuetable
+        import jobedit
+        import refresh
+        self.instrument(window_class, '_refresh_queue')
+        self.instrument(window_class, '_on_refreshed')
+        self.instrument(queuetable.Table, 'setJobs')
+        self.instrument(queuetable.Model, 'data')
+        self.instrument(jobedit, 'create_form')
+        self.instrument(jobedit.FormCache, 'form', "FormCache.form")
+        self.client = client
+        client.instrumentation.add_hook(self._on_request)
+        client.get_jobs_page = self.timed("Client.get_jobs_page", client.get_jobs_page)
+        refresh.RefreshThread.fetch_jobs = self._fetch_jobs(refresh.RefreshThread.fetch_jobs)
+        self.watchdog.start()
+
+    def _on_request(self, event):
+        # called in the thread which made the request
+        if getattr(self._local, 'network', None) is not None and event.endpoint == "/queue/:name/jobs":
+            self._local.network += event.latency
+
+    def _fetch_jobs(self, fetch_jobs):
+        # pages loaded by scrolling are fetched by other threads and
+        # are not part of refreshes
+        @functools.wraps(fetch_jobs)
+        def wrapper(thread):
+            self._local.network = 0.0
+            start = time.time()
+            try:
+                return fetch_jobs(thread)
+            finally:
+                total = time.time() - start
+                network = self._local.network
+                self._local.network = None
+                with self._lock:
+                    self._fetches[thread.queue_name] = (network, total - network)
+        return wrapper
+
+    def refreshed(self, queue_name, jobs, model_update):
+        """
+        Record one refresh of the queue view; network and decode times are
+        taken from the last background fetch of the queue's job list.
+        """
+        with self._lock:
+            network, decode = self._fetches.pop(queue_name, (None, None))
+            self.refreshes.append(dict(time=time.time(), queue=queue_name, jobs=len(jobs), network=network,
+                                       decode=decode, model_update=model_update))
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.refreshes.clear()
+            self._fetches.clear()
+        self.watchdog.reset()
+        if self.client is not None:
+            self.client.instrumentation.stats.reset()
+
+    def to_json(self):
+        with self._lock:
+            timers = dict((name, timer.as_dict()) for name, timer in self.timers.items())
+            refreshes = list(self.refreshes)
+        result = dict(started=self.started, time=time.time(), stall_threshold=self.watchdog.threshold,
+                      timers=timers, refreshes=refreshes, stalls=self.watchdog.to_json())
+        if self.client is not None:
+            result['requests'] = self.client.instrumentation.stats.to_json()
+        return result
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+def _ms(seconds):
+    if seconds is None:
+        return "-"
+    return "{:.1f}".format(seconds * 1000)
+
+class ProfilePanel(QtGui.QDialog):
+    """
+    Non-modal debug window showing data collected by Profiler, updated
+    every second while visible.
+    """
+    def __init__(self, profiler, parent=None):
+        QtGui.QDialog.__init__(self, parent)
+        self.setWindowTitle("Profiling")
+        self.profiler = profiler
+        layout = QtGui.QVBoxLayout()
+        self.setLayout(layout)
+
+        self.text = QtGui.QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QtGui.QPlainTextEdit.NoWrap)
+        font = QtGui.QFont("Monospace")
+        font.setStyleHint(QtGui.QFont.TypeWriter)
+        self.text.setFont(font)
+        layout.addWidget(self.text)
+
+        buttons = QtGui.QHBoxLayout()
+        reset = QtGui.QPushButton("Reset", self)
+        reset.clicked.connect(self._on_reset)
+        buttons.addWidget(reset)
+        save = QtGui.QPushButton("Save trace...", self)
+        save.clicked.connect(self._on_save)
+        buttons.addWidget(save)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self._update)
+        self.resize(700, 500)
+
+    def showEvent(self, event):
+        QtGui.QDialog.showEvent(self, event)
+        self._update()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        QtGui.QDialog.hideEvent(self, event)
+        self.timer.stop()
+
+    def _update(self):
+        data = self.profiler.to_json()
+        lines = ["{:<28} {:>8} {:>10} {:>10} {:>10}".format("Timer", "Count", "Total ms", "Mean ms", "Max ms")]
+        for name, timer in sorted(data['timers'].items()):
+            lines.append("{:<28} {:>8} {:>10} {:>10} {:>10}".format(name, timer['count'], _ms(timer['total']),
+                                                                  _ms(timer['mean']), _ms(timer['max'])))
+        lines.append("")
+        lines.append("{:<20} {:>8} {:>12} {:>10} {:>14}".format("Refresh", "Jobs", "Network ms", "Decode ms",
+                                                             "Model ms"))
+        for refresh in list(data['refreshes'])[-10:]:
+            lines.append("{:<20} {:>8} {:>12} {:>10} {:>14}".format(refresh['queue'], refresh['jobs'],
+                                                                 _ms(refresh['network']), _ms(refresh['decode']),
+                                                                 _ms(refresh['model_update'])))
+        lines.append("")
+        stalls = data['stalls']
+        lines.append("Stalls over {}: {}".format(_ms(data['stall_threshold']) + " ms", len(stalls)))
+        for stall in stalls[-5:]:
+            lines.append("")
+            lines.append("{} lasted {} ms, at:".format(time.strftime("%H:%M:%S", time.localtime(stall['start'])),
+                                                     _ms(stall['duration'])))
+            lines.extend(line.rstrip("\n") for line in stall['stack'][-6:])
+        self.text.setPlainText("\n".join(lines))
+
+    def _on_reset(self):
+        self.profiler.reset()
+        self._update()
+
+    def _on_save(self):
+        path = QtGui.QFileDialog.getSaveFileName(self, "Save trace", "batchd-trace.json", "JSON files (*.json)")
+        if not path:
+            return
+        try:
+            self.profiler.dump(unicode(path))
+        except Exception as e:
+            QtGui.QMessageBox.warning(self, "Save trace", "Can't save trace: {}".format(e))
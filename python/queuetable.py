@@ -2,6 +2,10 @@
 from PyQt4 import QtGui, QtCore
 
 import common
+from batchd.search import SearchIndex
+
+# Role of raw values which the proxy model sorts by
+SORT_ROLE = QtCore.Qt.UserRole
 
 class Field(object):
     def __init__(self, name, title):
@@ -11,15 +15,57 @@ class Field(object):
     def show(self, value):
         return value
 
+    def sort_key(self, value):
+        if value is None:
+            return ""
+        return value
+
 class TimeField(Field):
     def show(self, value):
         return common.format_time(value)
 
+    # ISO 8601 strings sort in time order as they are
+
+STATUS_COLORS = {
+    'Failed': QtGui.QColor(228, 122, 122),
+    'Done': QtGui.QColor(132, 181, 97)
+}
+
+def row_ranges(rows):
+    """
+    Group sorted row numbers into (first, last) ranges of consecutive rows.
+    """
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row-1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return ranges
+
 class Model(QtCore.QAbstractTableModel):
+    """
+    Jobs of the table. Further pages of jobs are loaded as the view is
+    scrolled down: `moreRequested(after)` is emitted with ID of the last
+    loaded job (None if there are none), and the page is expected to be
+    passed to appendPage(), normally from a background thread's signal.
+    """
+    moreRequested = QtCore.pyqtSignal(object)
+
     def __init__(self, parent, *fields):
         QtCore.QAbstractTableModel.__init__(self)
         self.jobs = []
+        # Display values of each row, rendered on first access;
+        # None means that the row is not rendered yet.
+        self.rendered = []
+        self.row_by_id = {}
+        # Whether the queue has jobs after the loaded ones
+        self.more = False
+        # Whether a page requested by moreRequested is being loaded
+        self.loading = False
         self.fields = fields
+        # Built on first search, then kept up to date with jobs
+        self.search_index = None
 
     def rowCount(self, parent):
         return len(self.jobs)
@@ -27,19 +73,25 @@ class Model(QtCore.QAbstractTableModel):
     def columnCount(self, parent):
         return len(self.fields)
     
+    def _render(self, row):
+        job = self.jobs[row]
+        cells = [field.show(job[field.name]) for field in self.fields]
+        rendered = (cells, STATUS_COLORS.get(job['status'], None))
+        self.rendered[row] = rendered
+        return rendered
+
     def data(self, index, role):
         if role == QtCore.Qt.DisplayRole and index.isValid():
-            job = self.jobs[index.row()]
-            names = [f.name for f in self.fields]
-            #columns = ['id', 'seq', 'type', 'status']
-            value = job[names[index.column()]]
-            return self.fields[index.column()].show(value)
+            row = index.row()
+            rendered = self.rendered[row] or self._render(row)
+            return rendered[0][index.column()]
         if role == QtCore.Qt.BackgroundColorRole:
-            job = self.jobs[index.row()]
-            if job['status'] == 'Failed':
-                return QtGui.QColor(228, 122, 122)
-            elif job['status'] == 'Done':
-                return QtGui.QColor(132, 181, 97)
+            row = index.row()
+            rendered = self.rendered[row] or self._render(row)
+            return rendered[1]
+        if role == SORT_ROLE and index.isValid():
+            field = self.fields[index.column()]
+            return field.sort_key(self.jobs[index.row()][field.name])
     
     def headerData(self, section, orientation, role):
         if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
@@ -49,9 +101,269 @@ class Model(QtCore.QAbstractTableModel):
     
     def setupModelData(self, jobs):
         self.beginResetModel()
-        self.jobs = jobs
+        self.jobs = list(jobs)
+        self.rendered = [None] * len(self.jobs)
+        self._reindex()
+        if self.search_index is not None:
+            self.search_index.clear()
+            self.search_index.update(self.jobs)
         self.endResetModel()
 
+    def clear(self):
+        """
+        Remove all jobs, e.g. when another queue is selected; pages requested
+        before are not accepted anymore.
+        """
+        self.setupModelData([])
+        self.more = False
+        self.loading = False
+
+    def lastId(self):
+        return self.jobs[-1]['id'] if self.jobs else None
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self.more and not self.loading
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        self.loading = True
+        self.moreRequested.emit(self.lastId())
+
+    def appendPage(self, after, page, complete):
+        """
+        Add page of jobs requested by moreRequested(after). The page is
+        dropped if jobs after `after` were loaded otherwise meanwhile.
+        """
+        if not self.loading:
+            return
+        self.loading = False
+        if after != self.lastId():
+            return
+        self.more = not complete
+        if not page:
+            return
+        first = len(self.jobs)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first+len(page)-1)
+        self.jobs.extend(page)
+        self.rendered.extend([None] * len(page))
+        for row, job in enumerate(page, first):
+            self.row_by_id[job['id']] = row
+        if self.search_index is not None:
+            self.search_index.update(page)
+        self.endInsertRows()
+
+    def loadFailed(self):
+        """
+        Requested page could not be loaded; it will be requested again when
+        the view needs more rows.
+        """
+        self.loading = False
+
+    def _reindex(self):
+        self.row_by_id = dict((job['id'], row) for row, job in enumerate(self.jobs))
+
+    def rowById(self, job_id):
+        return self.row_by_id.get(job_id, None)
+
+    def searchIndex(self):
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+            self.search_index.update(self.jobs)
+        return self.search_index
+
+    def updateJobs(self, jobs):
+        """
+        Replace the list of jobs, notifying views only about rows which were
+        actually removed, inserted or changed, so that selection and scroll
+        position are kept.
+        """
+        old_ids = self.row_by_id
+        new_ids = set(job['id'] for job in jobs)
+
+        removed = [row for row, job in enumerate(self.jobs) if job['id'] not in new_ids]
+        if self.search_index is not None:
+            self.search_index.remove([self.jobs[row]['id'] for row in removed])
+        for first, last in reversed(row_ranges(removed)):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self.jobs[first:last+1]
+            del self.rendered[first:last+1]
+            self.endRemoveRows()
+
+        survivors = [job['id'] for job in jobs if job['id'] in old_ids]
+        if [job['id'] for job in self.jobs] != survivors:
+            # jobs were reordered, it is not worth to track moves
+            self.setupModelData(jobs)
+            return
+
+        changed = []
+        row = 0
+        while row < len(jobs):
+            job = jobs[row]
+            if job['id'] not in old_ids:
+                last = row
+                while last+1 < len(jobs) and jobs[last+1]['id'] not in old_ids:
+                    last += 1
+                self.beginInsertRows(QtCore.QModelIndex(), row, last)
+                self.jobs[row:row] = jobs[row:last+1]
+                self.rendered[row:row] = [None] * (last+1-row)
+                if self.search_index is not None:
+                    self.search_index.update(jobs[row:last+1])
+                self.endInsertRows()
+                row = last+1
+            else:
+                if self.jobs[row] != job:
+                    self.jobs[row] = job
+                    self.rendered[row] = None
+                    changed.append(row)
+                    if self.search_index is not None:
+                        self.search_index.update([job])
+                row += 1
+
+        self._reindex()
+        last_column = len(self.fields)-1
+        for first, last in row_ranges(changed):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+class FilterProxy(QtGui.QSortFilterProxyModel):
+    """
+    Sorting and filtering of Model rows. Sorting is done by Qt on raw
+    values (SORT_ROLE); filters are exact values of job fields (type,
+    host_name) plus a free-text search in job parameters, answered
+    by the model's SearchIndex.
+    """
+    def __init__(self, parent=None):
+        QtGui.QSortFilterProxyModel.__init__(self, parent)
+        self.setSortRole(SORT_ROLE)
+        self.setDynamicSortFilter(True)
+        self.filters = {}
+        self.query = u""
+        self._matches = None
+        self._matches_version = None
+
+    def setFilter(self, name, value):
+        """
+        Show only jobs with job[name] == value; value None removes the filter.
+        """
+        if value is None:
+            self.filters.pop(name, None)
+        else:
+            self.filters[name] = value
+        self.invalidateFilter()
+
+    def setQuery(self, query):
+        self.query = query.strip()
+        self._matches = None
+        self.invalidateFilter()
+
+    def _search(self):
+        index = self.sourceModel().searchIndex()
+        if self._matches is None or self._matches_version != index.version:
+            self._matches = index.search(self.query)
+            self._matches_version = index.version
+        return self._matches
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        job = self.sourceModel().jobs[source_row]
+        for name, value in self.filters.items():
+            if job.get(name) != value:
+                return False
+        if self.query:
+            return job['id'] in self._search()
+        return True
+
+class _Popup(QtGui.QComboBox):
+    """
+    Combo box which emits aboutToShow before showing its list.
+    """
+    aboutToShow = QtCore.pyqtSignal()
+
+    def showPopup(self):
+        self.aboutToShow.emit()
+        QtGui.QComboBox.showPopup(self)
+
+class FilterBar(QtGui.QWidget):
+    """
+    Search box and filter popups for FilterProxy. Search is started after
+    a short pause in typing. There is no status filter: the main window's
+    status popup selects which jobs are fetched at all.
+    """
+    SEARCH_DELAY = 200
+
+    def __init__(self, proxy, parent=None):
+        QtGui.QWidget.__init__(self, parent)
+        self.proxy = proxy
+        layout = QtGui.QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+        self.search = QtGui.QLineEdit(self)
+        self.search.setPlaceholderText("Search in parameters")
+        layout.addWidget(self.search, stretch=1)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self._on_search)
+        self.search.textChanged.connect(lambda text: self.search_timer.start(self.SEARCH_DELAY))
+
+        self.popups = {}
+        # name -> function returning choices, called when the popup is opened
+        self.loaders = {}
+        for name, title in [('type', "Type:"), ('host_name', "Host:")]:
+            layout.addWidget(QtGui.QLabel(title, self))
+            popup = _Popup(self)
+            popup.addItem("Any", None)
+            popup.currentIndexChanged.connect(lambda idx, name=name: self._on_filter(name))
+            popup.aboutToShow.connect(lambda name=name: self._on_show(name))
+            layout.addWidget(popup)
+            self.popups[name] = popup
+
+    def setChoices(self, name, values):
+        """
+        Set values (list of (value, title)) to choose from in filter popup.
+        """
+        popup = self.popups[name]
+        popup.blockSignals(True)
+        popup.clear()
+        popup.addItem("Any", None)
+        for value, title in values:
+            popup.addItem(title, value)
+        popup.blockSignals(False)
+        self.proxy.setFilter(name, None)
+        self.loaders.pop(name, None)
+
+    def setChoicesLoader(self, name, loader):
+        """
+        Set function returning values to choose from (as for setChoices),
+        to be called when filter popup is opened for the first time.
+        """
+        self.loaders[name] = loader
+
+    def _on_show(self, name):
+        loader = self.loaders.get(name)
+        if loader is None:
+            return
+        try:
+            values = loader()
+        except Exception as e:
+            # try again when the popup is opened next time
+            print("Can't load {} filter choices: {}".format(name, e))
+            return
+        self.setChoices(name, values)
+
+    def _on_filter(self, name):
+        popup = self.popups[name]
+        value = popup.itemData(popup.currentIndex())
+        if hasattr(value, 'toPyObject'):
+            value = value.toPyObject()
+        if value is not None:
+            value = unicode(value)
+        self.proxy.setFilter(name, value)
+
+    def _on_search(self):
+        self.proxy.setQuery(unicode(self.search.text()))
+
 class Table(QtGui.QTableView):
     def __init__(self, jobs=None, parent=None):
         QtGui.QTableView.__init__(self, parent)
@@ -62,16 +374,28 @@ class Table(QtGui.QTableView):
                            Field('status', "Status"),
                            TimeField('create_time', "Created"),
                            TimeField('result_time', "Finished"))
-        self.setModel(self.model)
+        self.proxy = FilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.setModel(self.proxy)
+        self.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
+        self.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)
+        self.setSortingEnabled(True)
+        # keep the order of the manager until a column is clicked
+        self.sortByColumn(-1, QtCore.Qt.AscendingOrder)
         if jobs is None:
             jobs = []
         self.model.setupModelData(jobs)
 
     def currentJob(self):
-        idx = self.currentIndex()
+        idx = self.proxy.mapToSource(self.currentIndex())
         return self.model.jobs[idx.row()]
 
-    def setJobs(self, jobs):
-        self.model.setupModelData(jobs)
+    def selectedJobs(self):
+        rows = self.selectionModel().selectedRows()
+        return [self.model.jobs[self.proxy.mapToSource(idx).row()] for idx in rows]
 
+    def setJobs(self, jobs):
+        self.model.updateJobs(jobs)
 
+    def clear(self):
+        self.model.clear()
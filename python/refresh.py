@@ -0,0 +1,278 @@
+
+import threading
+from PyQt4 import QtCore
+
+class RefreshThread(QtCore.QThread):
+    fetched = QtCore.pyqtSignal(object, object, object)
+    error = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, client, queue_name, status, limit, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.client = client
+        self.queue_name = queue_name
+        self.status = status
+        self.limit = limit
+        self.types = None
+
+    def fetch_jobs(self):
+        return self.client.get_jobs_page(self.queue_name, self.status, limit=self.limit)
+
+    def run(self):
+        result = {}
+
+        def fetch_stats():
+            try:
+                result['stats'] = self.client.get_queue_stats(self.queue_name)
+            except Exception as e:
+                result['error'] = e
+
+        # fetch stats and jobs in parallel
+        stats_thread = threading.Thread(target=fetch_stats)
+        stats_thread.start()
+        try:
+            jobs = self.fetch_jobs()
+        except Exception as e:
+            result['error'] = e
+        stats_thread.join()
+
+        try:
+            # normally served from client's metadata cache
+            self.types = self.client.get_job_types()
+        except Exception:
+            pass
+
+        if 'error' in result:
+            self.error.emit(self.queue_name, result['error'])
+        else:
+            self.fetched.emit(self.queue_name, result['stats'], jobs)
+
+class PageThread(QtCore.QThread):
+    fetched = QtCore.pyqtSignal(object, object)
+    error = QtCore.pyqtSignal(object)
+
+    def __init__(self, client, queue_name, status, after, limit, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.client = client
+        self.queue_name = queue_name
+        self.status = status
+        self.after = after
+        self.limit = limit
+
+    def run(self):
+        try:
+            jobs = self.client.get_jobs_page(self.queue_name, self.status, self.after, self.limit)
+        except Exception as e:
+            self.error.emit(e)
+        else:
+            self.fetched.emit(self.after, jobs)
+
+class PageLoader(QtCore.QObject):
+    """
+    Fetches pages of `page_size` jobs of a queue in background thread, for
+    the job table being scrolled down, and emits `loaded(after, jobs,
+    complete)` in the GUI thread; `complete` is True if there are no jobs
+    after the page. Pages of a previously selected queue or status are not
+    emitted.
+    """
+    loaded = QtCore.pyqtSignal(object, object, bool)
+    failed = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, client, page_size, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.client = client
+        self.page_size = page_size
+        self.queue_name = None
+        self.status = None
+        self._threads = set()
+
+    def setQueue(self, queue_name, status="all"):
+        self.queue_name = queue_name
+        self.status = status
+
+    def load(self, after):
+        if self.queue_name is None:
+            return
+        thread = PageThread(self.client, self.queue_name, self.status, after, self.page_size)
+        thread.fetched.connect(lambda after, jobs: self._on_fetched(thread, after, jobs))
+        thread.error.connect(lambda error: self._on_error(thread, error))
+        thread.finished.connect(lambda: self._on_finished(thread))
+        self._threads.add(thread)
+        thread.start()
+
+    def _is_current(self, thread):
+        return thread.queue_name == self.queue_name and thread.status == self.status
+
+    def _on_fetched(self, thread, after, jobs):
+        if self._is_current(thread):
+            self.loaded.emit(after, jobs, len(jobs) < thread.limit)
+
+    def _on_error(self, thread, error):
+        if self._is_current(thread):
+            self.failed.emit(thread.queue_name, error)
+
+    def _on_finished(self, thread):
+        thread.wait()
+        self._threads.discard(thread)
+
+class StatsThread(QtCore.QThread):
+    fetched = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(object)
+
+    def __init__(self, client, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.client = client
+
+    def run(self):
+        try:
+            stats = self.client.get_all_stats()
+        except Exception as e:
+            self.error.emit(e)
+        else:
+            self.fetched.emit(stats)
+
+class PollerBase(QtCore.QObject):
+    """
+    Runs fetch threads made by _make_thread() periodically, one at a time.
+    Refresh requests made while a fetch is in progress are coalesced into one.
+    The interval depends on activity (see _is_busy) and on whether the
+    window is visible.
+    """
+    BUSY_INTERVAL = 2*1000
+    IDLE_INTERVAL = 15*1000
+    HIDDEN_INTERVAL = 60*1000
+
+    def __init__(self, client, window):
+        QtCore.QObject.__init__(self, window)
+        self.client = client
+        self.window = window
+        self._thread = None
+        self._pending = False
+        self._stopped = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.refresh)
+
+    def _make_thread(self):
+        """
+        Return a thread to run, or None if there is nothing to fetch.
+        """
+        raise NotImplementedError
+
+    def _is_busy(self):
+        return False
+
+    def refresh(self):
+        self._stopped = False
+        if self._thread is not None:
+            self._pending = True
+            return
+        thread = self._make_thread()
+        if thread is None:
+            return
+        self.timer.stop()
+        thread.finished.connect(self._on_finished)
+        self._thread = thread
+        thread.start()
+
+    def stop(self):
+        """
+        Stop polling until next refresh() call.
+        """
+        self._stopped = True
+        self._pending = False
+        self.timer.stop()
+
+    def interval(self):
+        if not self.window.isVisible() or self.window.isMinimized():
+            return self.HIDDEN_INTERVAL
+        if self._is_busy():
+            return self.BUSY_INTERVAL
+        return self.IDLE_INTERVAL
+
+    def _on_finished(self):
+        self._thread.wait()
+        self._thread = None
+        if self._pending:
+            self._pending = False
+            self.refresh()
+        elif not self._stopped:
+            self.timer.start(self.interval())
+
+class Poller(PollerBase):
+    """
+    Periodically fetches stats and first `limit()` jobs of current queue in
+    background thread, and emits `refreshed(queue_name, stats, jobs, complete)`
+    in the GUI thread; `complete` is True if jobs are all jobs of the queue.
+    When job types list changes on the manager, `typesChanged(types)` is
+    emitted.
+    """
+    refreshed = QtCore.pyqtSignal(object, object, object, bool)
+    failed = QtCore.pyqtSignal(object, object)
+    typesChanged = QtCore.pyqtSignal(object)
+
+    def __init__(self, client, window, limit, types=None):
+        PollerBase.__init__(self, client, window)
+        self.limit = limit
+        self.queue_name = None
+        self.status = None
+        self.stats = None
+        self.types = types
+
+    def setQueue(self, queue_name, status="all"):
+        if queue_name != self.queue_name:
+            self.stats = None
+        self.queue_name = queue_name
+        self.status = status
+        self.refresh()
+
+    def _make_thread(self):
+        if self.queue_name is None:
+            return None
+        thread = RefreshThread(self.client, self.queue_name, self.status, self.limit())
+        thread.fetched.connect(self._on_fetched)
+        thread.error.connect(self._on_error)
+        return thread
+
+    def _is_busy(self):
+        return bool(self.stats and self.stats.get('processing', 0) > 0)
+
+    def _on_fetched(self, queue_name, stats, jobs):
+        thread = self._thread
+        # the cache returns the same list while /type is not changed
+        if thread.types is not None and thread.types is not self.types:
+            self.types = thread.types
+            self.typesChanged.emit(thread.types)
+        # results for previously selected queue or status are of no interest
+        if queue_name == self.queue_name and thread.status == self.status:
+            self.stats = stats
+            self.refreshed.emit(queue_name, stats, jobs, len(jobs) < thread.limit)
+
+    def _on_error(self, queue_name, error):
+        self.failed.emit(queue_name, error)
+
+class StatsPoller(PollerBase):
+    """
+    Periodically fetches job counts of all queues with a single /stats
+    request, and emits `refreshed(stats)` in the GUI thread.
+    """
+    refreshed = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(object)
+
+    def __init__(self, client, window):
+        PollerBase.__init__(self, client, window)
+        self.stats = None
+
+    def _make_thread(self):
+        thread = StatsThread(self.client)
+        thread.fetched.connect(self._on_fetched)
+        thread.error.connect(self.failed.emit)
+        return thread
+
+    def _is_busy(self):
+        if not self.stats:
+            return False
+        return any(counts.get('processing', 0) > 0 for counts in self.stats.values())
+
+    def _on_fetched(self, stats):
+        self.stats = stats
+        self.refreshed.emit(stats)
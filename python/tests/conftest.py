@@ -0,0 +1,5 @@
+import sys
+from os.path import dirname, abspath
+
+# batchd and benchmarks packages live next to this directory
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
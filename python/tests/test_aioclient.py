@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from batchd.aioclient import AsyncClient
+from batchd.client import (ManagerException, InsufficientRightsException, NotFoundException,
+        ServerException, CircuitOpenException)
+from batchd.job import Job
+from batchd.resilience import RetryPolicy, CircuitBreaker
+from benchmarks.fakemanager import FakeManager
+
+@pytest.fixture
+def manager():
+    with FakeManager() as manager:
+        manager.store.add_jobs("default", 100)
+        yield manager
+
+def run(func, url, **settings):
+    """
+    Run func(client) on an AsyncClient for `url` with attributes `settings`
+    in a new event loop.
+    """
+    async def main():
+        async with AsyncClient(url) as client:
+            for name, value in settings.items():
+                setattr(client, name, value)
+            return await func(client)
+
+    return asyncio.run(main())
+
+async def serve(status, hits):
+    """
+    Start a server answering every request with HTTP `status`, counting
+    requests in `hits`. Returns its runner and URL.
+    """
+    async def handler(request):
+        hits.append(request.path)
+        return web.Response(status=status, text="status {}".format(status))
+
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, "http://127.0.0.1:{}".format(port)
+
+@pytest.mark.parametrize("status, error, requests", [
+        (401, InsufficientRightsException, 1),
+        (403, InsufficientRightsException, 1),
+        (404, NotFoundException, 1),
+        (400, ManagerException, 1),
+        (500, ServerException, 3),
+        (503, ServerException, 3)])
+def test_status_errors(status, error, requests):
+    hits = []
+
+    async def main():
+        runner, url = await serve(status, hits)
+        try:
+            async with AsyncClient(url) as client:
+                client.retry_policy = RetryPolicy(attempts=3, base_delay=0.01)
+                with pytest.raises(error) as info:
+                    await client.get_queues()
+                assert type(info.value) is error
+                assert info.value.status_code == status
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+    # only internal errors of the manager are retried
+    assert len(hits) == requests
+
+def test_get_jobs(manager):
+    async def get_jobs(client):
+        return await client.get_jobs("default", "failed"), await client.get_jobs("default")
+
+    failed, jobs = run(get_jobs, manager.url)
+    assert all(isinstance(job, Job) and job['status'] == "Failed" for job in failed)
+    assert len(failed) == 25
+    assert len(jobs) == 100
+    with pytest.raises(NotFoundException):
+        run(lambda client: client.get_jobs("missing"), manager.url)
+
+def test_outage_is_retried(manager):
+    async def get_queues(client):
+        manager.outage(1)
+        return await client.get_queues()
+
+    queues = run(get_queues, manager.url, retry_policy=RetryPolicy(base_delay=0.2, max_delay=1.0))
+    assert [q['name'] for q in queues] == ["default"]
+
+def test_open_circuit_fails_fast():
+    hits = []
+
+    async def main():
+        runner, url = await serve(500, hits)
+        try:
+            async with AsyncClient(url) as client:
+                client.retry_policy = RetryPolicy(attempts=1)
+                client.circuit_breaker = CircuitBreaker(failures=2, reset_timeout=60)
+                client.deadline = 5
+                for i in range(2):
+                    with pytest.raises(ServerException):
+                        await client.get_queues()
+                # the circuit will not close before the deadline
+                with pytest.raises(CircuitOpenException):
+                    await client.get_queues()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+    assert len(hits) == 2
@@ -0,0 +1,69 @@
+import json
+import time
+import threading
+
+from batchd.cache import MetadataCache
+
+class Fetcher(object):
+    """
+    fetch() for MetadataCache, serving `text` with an ETag if `etag` is set.
+    """
+    def __init__(self, value, etag=None, delay=0):
+        self.text = json.dumps(value)
+        self.etag = etag
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, headers):
+        self.calls.append(dict(headers))
+        time.sleep(self.delay)
+        if self.etag is not None and headers.get('If-None-Match') == self.etag:
+            return 304, {}, None
+        rs_headers = {'ETag': self.etag} if self.etag else {}
+        return 200, rs_headers, self.text
+
+def test_value_is_cached_for_ttl():
+    cache = MetadataCache({"/type": 60})
+    fetch = Fetcher([1, 2])
+    assert cache.get("/type", fetch) == [1, 2]
+    assert cache.get("/type", fetch) == [1, 2]
+    assert len(fetch.calls) == 1
+
+def test_revalidation():
+    cache = MetadataCache(default_ttl=0)
+    fetch = Fetcher(dict(a=1), etag='"v1"')
+    first = cache.get("/queue", fetch)
+    assert cache.get("/queue", fetch) is first
+    assert fetch.calls == [{}, {'If-None-Match': '"v1"'}]
+
+    # without validators, an unchanged body is not decoded again
+    fetch = Fetcher(dict(a=1))
+    cache.invalidate()
+    first = cache.get("/queue", fetch)
+    assert cache.get("/queue", fetch) is first
+    fetch.text = json.dumps(dict(a=2))
+    assert cache.get("/queue", fetch) == dict(a=2)
+
+def test_concurrent_requests_share_one_fetch():
+    cache = MetadataCache(default_ttl=60)
+    fetch = Fetcher([1], delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("/type", fetch))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[1]] * 8
+    assert len(fetch.calls) == 1
+
+def test_invalidate_during_fetch():
+    cache = MetadataCache(default_ttl=60)
+    fetch = Fetcher([1], delay=0.2)
+    thread = threading.Thread(target=cache.get, args=("/queue", fetch))
+    thread.start()
+    time.sleep(0.05)
+    cache.invalidate("/queue")
+    thread.join()
+    # the response may predate the change which caused invalidation
+    cache.get("/queue", fetch)
+    assert len(fetch.calls) == 2
@@ -0,0 +1,133 @@
+import gc
+import threading
+
+import pytest
+
+from batchd.client import Client
+from batchd.job import Job
+from benchmarks.fakemanager import FakeManager
+
+@pytest.fixture(params=[False, True], ids=["no-paging", "paging"])
+def manager(request):
+    with FakeManager(paging=request.param) as manager:
+        manager.store.add_jobs("default", 1000)
+        yield manager
+
+@pytest.fixture
+def client(manager):
+    client = Client(manager.url)
+    yield client
+    client.close()
+
+def ids(jobs):
+    return [job['id'] for job in jobs]
+
+def record_responses(client):
+    """
+    Keep responses to client's requests in the returned list; their
+    `bytes_read` is the size of body read so far (rs.text is read through
+    iter_content too).
+    """
+    responses = []
+    request = client._request
+
+    def wrapper(*args, **kwargs):
+        rs = request(*args, **kwargs)
+        rs.bytes_read = 0
+        iter_content = rs.iter_content
+
+        def counting(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                rs.bytes_read += len(chunk)
+                yield chunk
+
+        rs.iter_content = counting
+        responses.append(rs)
+        return rs
+
+    client._request = wrapper
+    return responses
+
+def test_iter_jobs(client):
+    jobs = list(client.iter_jobs("default", "failed"))
+    assert all(isinstance(job, Job) and job['status'] == "Failed" for job in jobs)
+    assert len(jobs) == 250
+    assert ids(client.iter_jobs("default", after=990)) == list(range(991, 1001))
+    assert ids(client.get_jobs("default", "new")) == list(range(4, 1001, 4))
+
+def test_job_list_is_streamed(client, manager):
+    manager.store.output_size = 10000
+    responses = record_responses(client)
+    jobs = client.iter_jobs("default")
+    assert next(jobs)['id'] == 1
+    # the list is about 5 MB
+    assert responses[0].bytes_read < 1024 * 1024
+    assert len(list(jobs)) == 999
+    assert responses[0].bytes_read > 4 * 1024 * 1024
+
+def test_get_jobs_page(client):
+    # whether or not the manager supports ?after=&limit=
+    assert ids(client.get_jobs_page("default", limit=10)) == list(range(1, 11))
+    assert ids(client.get_jobs_page("default", after=995, limit=10)) == list(range(996, 1001))
+    assert ids(client.get_jobs_page("default", "done", after=10, limit=3)) == [14, 18, 22]
+    assert client.get_jobs_page("default", after=1000) == []
+
+def test_iter_job_pages(client):
+    pages = list(client.iter_job_pages("default", after=100, page_size=300))
+    assert [len(page) for page in pages] == [300, 300, 300]
+    assert sum((ids(page) for page in pages), []) == list(range(101, 1001))
+
+def test_page_reads_only_part_of_listing(client, manager):
+    manager.store.output_size = 10000
+    responses = record_responses(client)
+    assert ids(client.get_jobs_page("default", limit=10)) == list(range(1, 11))
+    assert ids(client.get_jobs_page("default", after=100, limit=10)) == list(range(101, 111))
+    # the whole list is about 5 MB; a manager ignoring ?after= sends jobs
+    # from the start, which are skipped up to the page
+    assert [rs.bytes_read < 1024 * 1024 for rs in responses] == [True, True]
+
+def test_metadata_is_cached(client):
+    requests = []
+    client.instrumentation.add_hook(lambda e: requests.append(e.path))
+    types = client.get_job_types()
+    assert client.get_job_types() is types
+    client.new_queue(dict(name="other", title="Other", enabled=True, schedule_name="anytime", host_name=None))
+    assert "other" in [q['name'] for q in client.get_queues()]
+    assert requests.count("/type") == 1
+
+class Output(object):
+    """
+    Output file which records how much of the response was read when it
+    was first written to.
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.size = 0
+        self.first_write = None
+
+    def write(self, data):
+        if self.first_write is None:
+            self.first_write = self.responses[-1].bytes_read
+        self.size += len(data)
+
+@pytest.mark.parametrize("download", ["download_last_result", "download_job"])
+def test_job_output_is_spooled(client, manager, download):
+    manager.store.output_size = 5 * 1024 * 1024
+    responses = record_responses(client)
+    stdout, stderr = Output(responses), Output(responses)
+    result = getattr(client, download)(2, dict(stdout=stdout, stderr=stderr))
+    assert result['exit_code'] == 0
+    assert 'stdout' not in result
+    assert stdout.size == manager.store.output_size
+    assert stdout.first_write < 1024 * 1024
+
+def test_sessions_of_finished_threads_are_released(client):
+    def work():
+        client.get_all_stats()
+
+    for i in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    gc.collect()
+    assert len(client.transport._sessions) <= 1
@@ -0,0 +1,75 @@
+import json
+import argparse
+
+import pytest
+
+import enqueue
+from batchd.client import Client
+from benchmarks.fakemanager import FakeManager
+
+@pytest.fixture
+def manager():
+    with FakeManager() as manager:
+        yield manager
+
+def ingest(manager, lines, tmpdir):
+    path = tmpdir.join("jobs.jsonl")
+    path.write("\n".join(lines) + "\n")
+    args = argparse.Namespace(queue="default", type="count", concurrency=4,
+                              checkpoint=str(tmpdir.join("jobs.ckpt")))
+    client = Client(manager.url)
+    try:
+        with open(str(path)) as stream:
+            return enqueue.ingest(client, enqueue.read_jsonl(stream), args)
+    finally:
+        client.close()
+
+def counts(manager):
+    return sorted(int(job['params']['count']) for job in manager.store.iter_jobs("default"))
+
+def test_resume_does_not_duplicate_jobs(manager, tmpdir):
+    lines = [json.dumps(dict(count=str(i))) for i in range(50)]
+    assert ingest(manager, lines, tmpdir)
+    assert counts(manager) == list(range(50))
+
+    # interrupted before the progress of the last 30 records was saved
+    checkpoint = tmpdir.join("jobs.ckpt")
+    data = json.loads(checkpoint.read())
+    data['done'] = 20
+    data['extra'] = []
+    checkpoint.write(json.dumps(data))
+
+    assert ingest(manager, lines, tmpdir)
+    assert counts(manager) == list(range(50))
+    assert json.loads(checkpoint.read())['done'] == 50
+
+def test_non_object_records_are_reported(manager, tmpdir):
+    lines = [json.dumps(dict(count="1")), "[1, 2]", '"text"', "5", "{broken", json.dumps(dict(count="2"))]
+    assert not ingest(manager, lines, tmpdir)
+    assert counts(manager) == [1, 2]
+    failed = [json.loads(line) for line in tmpdir.join("jobs.ckpt.failed").readlines()]
+    assert sorted(f['record'] for f in failed) == [1, 2, 3, 4]
+
+def test_idempotency_key_is_not_shown_in_notes(manager):
+    client = Client(manager.url)
+    try:
+        first = client.enqueue_job(dict(queue="default", type="count", params=dict(count="1"),
+                                        notes="frame range 1-10"), idempotency_key="k1")
+        second = client.enqueue_job(dict(queue="default", type="count", params=dict(count="2")))
+        jobs = client.get_jobs("default")
+        assert [job['notes'] for job in jobs] == ["frame range 1-10", None]
+        assert jobs[0]['idempotency_key'] == "k1"
+        assert [job['notes'] for job in client.iter_jobs("default")] == ["frame range 1-10", None]
+        record = client.download_job(first, {})
+        assert record['notes'] == "frame range 1-10"
+        # the keys are still found by scans of the queue
+        assert client.recent_keys("default", None, 0) == {"k1": first, jobs[1]['idempotency_key']: second}
+        assert client.find_job_by_key("default", "k1")['id'] == first
+
+        # a job read back is submitted again with a new key
+        third = client.enqueue_job(dict(jobs[0]))
+        assert client.find_job_by_key("default", "k1")['id'] == first
+        assert client.get_jobs("default")[2]['notes'] == "frame range 1-10"
+        assert manager.store.jobs[third]['notes'].count("batchd-idempotency-key:") == 1
+    finally:
+        client.close()
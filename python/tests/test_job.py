@@ -0,0 +1,51 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from batchd.job import Job, split_idempotency_key
+from benchmarks.fakemanager import make_job
+
+def test_roundtrip():
+    d = make_job(7, status="Done", output_size=1000)
+    job = Job.from_dict(d)
+    assert job == d
+    assert dict(job) == d
+    assert job['stdout'] == d['stdout']
+    assert Job(**d) == job
+
+def test_unknown_fields_are_kept():
+    # fewer fields than Job knows of, plus some it does not
+    job = Job.from_dict(dict(id=1, status="New", priority=5, tags=["a"]))
+    assert job['priority'] == 5
+    assert job.get('tags') == ["a"]
+    assert 'priority' in job
+    assert job['queue'] is None
+    assert Job.from_dict(dict(id=1))._extra is None
+
+def test_params_are_read_only():
+    job = Job.from_dict(make_job(1, params=dict(count="1", frame="2")))
+    params = job['params']
+    with pytest.raises(TypeError):
+        params['count'] = "5"
+    with pytest.raises(TypeError):
+        params.update(count="5")
+    assert job['params'] == dict(count="1", frame="2")
+
+    job['params'] = dict(params, count="5")
+    assert job['params'] == dict(count="5", frame="2")
+    assert json.loads(json.dumps(job['params'])) == dict(count="5", frame="2")
+
+    changed = dict(job['params'])
+    changed['count'] = "6"
+    assert job['params']['count'] == "5"
+    assert copy.deepcopy(job['params']) == pickle.loads(pickle.dumps(job['params'])) == job['params']
+
+def test_idempotency_key_is_split_from_notes():
+    assert split_idempotency_key("note\nbatchd-idempotency-key:k1") == ("note", "k1")
+    assert split_idempotency_key("batchd-idempotency-key:k1") == (None, "k1")
+    assert split_idempotency_key("note") == ("note", None)
+    job = Job.from_dict(dict(make_job(7), notes="a\nbatchd-idempotency-key:k1\nb"))
+    assert job['notes'] == "a\nb"
+    assert job['idempotency_key'] == "k1"
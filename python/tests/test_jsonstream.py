@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+
+import pytest
+
+from batchd.jsonstream import iter_array, spool_object
+
+def chunked(text, size):
+    data = text.encode("utf-8")
+    return [data[i:i+size] for i in range(0, len(data), size)]
+
+ITEMS = [1, -2.5e10, 1234567890, u"café \U0001f600 \"quoted\" \\ /", None, True, [], {},
+         dict(id=3, params=dict(a=u"б", b=[1, 2]), notes=None)]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64 * 1024])
+def test_iter_array(size):
+    text = json.dumps(ITEMS)
+    assert list(iter_array(chunked(text, size))) == ITEMS
+    assert list(iter_array(chunked(" [ ] ", size))) == []
+
+def test_iter_array_errors():
+    with pytest.raises(ValueError):
+        list(iter_array(chunked('[1, 2', 1)))
+    with pytest.raises(ValueError):
+        list(iter_array(chunked('{"a": 1}', 1)))
+
+@pytest.mark.parametrize("size", [1, 5, 64 * 1024])
+def test_spool_object(size):
+    stdout = u"line 1\nline \"2\"\té \U0001f600 \\ end" * 10
+    text = json.dumps(dict(job_id=5, exit_code=0, stdout=stdout, stderr="", time="2017-05-01T12:00:00Z"))
+    out, err = io.BytesIO(), io.BytesIO()
+    result = spool_object(chunked(text, size), dict(stdout=out, stderr=err))
+    assert result == dict(job_id=5, exit_code=0, time="2017-05-01T12:00:00Z")
+    assert out.getvalue().decode("utf-8") == stdout
+    assert err.getvalue() == b""
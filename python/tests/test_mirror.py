@@ -0,0 +1,65 @@
+import pytest
+
+from batchd.client import Client
+from batchd.mirror import JobMirror
+from benchmarks.fakemanager import FakeManager
+
+@pytest.fixture(params=[False, True], ids=["no-paging", "paging"])
+def manager(request):
+    with FakeManager(paging=request.param) as manager:
+        yield manager
+
+@pytest.fixture
+def client(manager):
+    client = Client(manager.url)
+    yield client
+    client.close()
+
+def enqueue(manager, count):
+    return [manager.store.enqueue("default", dict(type="count", params=dict(count=str(i)))) for i in range(count)]
+
+def statuses(mirror):
+    return dict((job['id'], job['status']) for job in mirror.query())
+
+def test_incremental_sync(manager, client):
+    manager.store.add_jobs("default", 1000)
+    ids = enqueue(manager, 5)
+    mirror = JobMirror(client, ":memory:", full_sync_interval=3600)
+    assert mirror.sync().added == 1005
+
+    store = manager.store
+    store.update_job(ids[0], dict(status="Done", exit_code=0, result_time="2017-05-02T10:00:00Z"))
+    # done in spite of failed last execution (on_fail: continue)
+    store.update_job(ids[1], dict(status="Done", exit_code=1, result_time="2017-05-02T10:00:00Z"))
+    # failed without being executed: there is no result
+    store.update_job(ids[2], dict(status="Failed"))
+    store.delete_job(ids[3])
+    new_ids = enqueue(manager, 2)
+    # created and finished between syncs
+    quick_id = enqueue(manager, 1)[0]
+    store.update_job(quick_id, dict(status="Done", exit_code=0, result_time="2017-05-02T10:00:00Z"))
+
+    requests = []
+    client.instrumentation.add_hook(lambda e: requests.append(e.endpoint))
+    stats = mirror.sync()
+    assert (stats.added, stats.removed, stats.errors) == (2, 1, 0)
+    # one request per active status, one per finished job
+    assert requests.count("/queue/:name/jobs") == 4
+    assert requests.count("/job/:id") == 4
+
+    result = statuses(mirror)
+    assert ids[3] not in result
+    assert [result[i] for i in ids[:3] + [ids[4]] + new_ids] == ["Done", "Done", "Failed", "New", "New", "New"]
+    assert mirror.query(status="done", exit_code=1)[0]['id'] == ids[1]
+
+    assert quick_id not in result
+
+    # nothing changed
+    assert mirror.sync().added == 0
+    assert len(mirror.query()) == 1006
+
+    mirror.full_sync_interval = 0
+    del requests[:]
+    assert mirror.sync().added == 1
+    assert requests.count("/queue/:name/jobs") == 1
+    assert statuses(mirror)[quick_id] == "Done"
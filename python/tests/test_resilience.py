@@ -0,0 +1,125 @@
+import os
+import re
+import time
+
+import pytest
+
+from batchd.client import Client, CircuitOpenException, DeadlineExceededException, ManagerUnavailableException
+from batchd.resilience import RetryPolicy, CircuitBreaker
+from benchmarks.fakemanager import FakeManager
+
+@pytest.fixture
+def manager():
+    with FakeManager(latency=0.002) as manager:
+        yield manager
+
+def test_enqueue_many_survives_restart(manager):
+    client = Client(manager.url, pool_size=16)
+    scans = []
+    client.instrumentation.add_hook(lambda e: scans.append(e)
+                                    if e.method == "GET" and e.endpoint == "/queue/:name/jobs" else None)
+    outages = []
+
+    def progress(stats):
+        if stats.done + stats.failed == 100 and not outages:
+            outages.append(manager.outage(2))
+
+    results = client.enqueue_many("default", "count", (dict(count=str(i)) for i in range(600)),
+                                  concurrency=16, progress=progress)
+    client.close()
+    assert outages
+    assert [r.error for r in results if not r.ok] == []
+    # no duplicates: each submitted job exists exactly once
+    jobs = list(manager.store.iter_jobs("default"))
+    assert sorted(job['params']['count'] for job in jobs) == sorted(str(i) for i in range(600))
+    # retrying submissions share queue scans
+    assert len(scans) <= 5
+
+def test_retry_waits_for_open_circuit_without_using_attempts():
+    calls = []
+
+    def func(attempt, timeout):
+        calls.append(attempt)
+        if len(calls) < 10:
+            raise CircuitOpenException("open", retry_after=0.001)
+        return "ok"
+
+    policy = RetryPolicy(attempts=2, base_delay=0.001)
+    assert policy.run(func, lambda e: False, deadline=5) == "ok"
+    assert calls == [0] * 10
+
+def test_open_circuit_respects_deadline():
+    def func(attempt, timeout):
+        raise CircuitOpenException("open", retry_after=10)
+
+    start = time.time()
+    with pytest.raises(CircuitOpenException):
+        RetryPolicy().run(func, lambda e: True, deadline=0.5)
+    assert time.time() - start < 1
+
+class FailingTransport(object):
+    def __init__(self, error):
+        self.error = error
+        self.requests = 0
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+        raise self.error
+
+    def close(self):
+        pass
+
+def test_failed_trial_does_not_block_circuit():
+    client = Client("http://127.0.0.1:1")
+    client.circuit_breaker = breaker = CircuitBreaker(failures=1, reset_timeout=0.05)
+    client._transport = FailingTransport(ValueError("unexpected"))
+    breaker.failure()
+    time.sleep(0.06)
+    # trial call fails with an error which is not a connection error
+    with pytest.raises(ValueError):
+        client._send("GET", "/queue", 0, None)
+    with pytest.raises(CircuitOpenException):
+        client._send("GET", "/queue", 0, None)
+    time.sleep(0.06)
+    assert breaker.allow()
+
+def test_trial_which_never_resolves_expires():
+    breaker = CircuitBreaker(failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+def test_expired_deadline_does_not_send():
+    client = Client("http://127.0.0.1:1")
+    client._transport = transport = FailingTransport(AssertionError("must not be called"))
+    with pytest.raises(DeadlineExceededException):
+        client._send("GET", "/queue", 1, 0)
+    assert transport.requests == 0
+
+def test_unreachable_manager_fails_within_deadline():
+    client = Client("http://127.0.0.1:1")
+    client.deadline = 1
+    start = time.time()
+    with pytest.raises(ManagerUnavailableException):
+        client.get_all_stats()
+    assert time.time() - start < 2
+
+def test_sample_config_documents_defaults():
+    yaml = pytest.importorskip("yaml")
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "sample-configs", "client.yaml")
+    with open(path) as f:
+        # settings are commented out in the sample
+        text = "\n".join(line[2:] for line in f.read().splitlines() if line.startswith("# "))
+    sample = {}
+    for name in ("deadline", "retry", "circuit_breaker"):
+        match = re.search(r"^{}:.*\n(?:  .*\n)*".format(name), text + "\n", re.M)
+        sample.update(yaml.safe_load(match.group()))
+    client = Client()
+    assert sample['deadline'] == client.deadline
+    policy = client.retry_policy
+    assert sample['retry'] == dict(attempts=policy.attempts, base_delay=policy.base_delay, max_delay=policy.max_delay)
+    breaker = client.circuit_breaker
+    assert sample['circuit_breaker'] == dict(failures=breaker.failures, reset_timeout=breaker.reset_timeout)
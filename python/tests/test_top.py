@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from batchd.client import Client
+from batchd.top import Monitor, render
+from benchmarks.fakemanager import FakeManager
+
+@pytest.fixture
+def manager():
+    with FakeManager() as manager:
+        yield manager
+
+@pytest.fixture
+def client(manager):
+    client = Client(manager.url)
+    yield client
+    client.close()
+
+def record_queries(client):
+    queries = []
+    query_metrics = client.query_metrics
+
+    def wrapper(prefix, last=None, since=None):
+        queries.append((last, since))
+        return query_metrics(prefix, last, since)
+
+    client.query_metrics = wrapper
+    return queries
+
+def test_host_samples(manager, client):
+    store = manager.store
+    start = time.time() - 100
+    for n in range(3):
+        store.add_metric("batchd.host.render1.jobs", start + n * 10, value=n)
+    store.add_metric("batchd.host.render1.status", start, text="Active")
+    store.add_metric("batchd.hosts.active", start, value=1)
+    queries = record_queries(client)
+
+    monitor = Monitor(client)
+    monitor.poll()
+    assert monitor.error is None
+    assert monitor.host_rows() == [("render1", "Active", 2, 1.0)]
+    assert monitor.host_totals['active'].last == 1
+
+    # samples are asked for by the manager's timestamps: a client clock
+    # far behind the manager's does not lose them
+    store.add_metric("batchd.host.render1.jobs", time.time() - 5, value=5)
+    monitor.poll(now=time.time() - 1000)
+    assert monitor.error is None
+    assert [value for t, value in monitor.hosts["render1"].samples] == [0, 1, 2, 5]
+    assert queries[0][0] is not None
+    assert queries[1][1] is not None
+
+    # samples seen already are skipped
+    monitor.poll()
+    assert len(monitor.hosts["render1"].samples) == 4
+
+def test_queue_rates(manager, client):
+    manager.store.add_jobs("default", 100)
+    monitor = Monitor(client)
+    now = time.time()
+    monitor.poll(now)
+    manager.store.enqueue("default", dict(type="count", params=dict(count="1")))
+    job_id = manager.store.last_id
+    manager.store.update_job(job_id, dict(status="Done"))
+    monitor.poll(now + 60)
+    assert monitor.queue_rows() == [("default", 25, 25, 1.0, 0.0, 0.0)]
+    lines = render(monitor)
+    assert any(line.startswith("default ") for line in lines)